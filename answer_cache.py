@@ -0,0 +1,205 @@
+"""
+Opt-in semantic cache for /chat answers (LETSLEARN_ANSWER_CACHE=1, or "cache": true per request).
+
+A question hits when its bge embedding is within SIMILARITY_THRESHOLD cosine of a cached question that was
+answered against the same documents (corpus_key: project name + blob digests) with the same retrieval settings.
+Re-loading a project keeps its entries; uploading a document changes the key. Hits are replayed as a stream
+without touching the LLM. Entries expire after TTL_SECONDS; the least recently used go first when full.
+
+    python answer_cache.py calibrate            # paraphrase vs near-miss similarities -> threshold report
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import datetime
+import threading
+
+import numpy as np
+
+from logs import get_logger
+
+log = get_logger("answer_cache")
+
+ENABLED = os.environ.get("LETSLEARN_ANSWER_CACHE", "0").lower() in ("1", "true", "yes", "on")
+# A false hit serves the answer to a different question, so err high. `python answer_cache.py calibrate` measures
+# the embedder on CALIBRATION_PAIRS and reports the lowest threshold at which no near-miss pair
+# ("what is OLAP" vs "what is OLTP") hits; set this to that value
+SIMILARITY_THRESHOLD = float(os.environ.get("LETSLEARN_ANSWER_CACHE_THRESHOLD", "0.92"))
+TTL_SECONDS = int(os.environ.get("LETSLEARN_ANSWER_CACHE_TTL", str(24 * 3600)))
+MAX_ENTRIES = int(os.environ.get("LETSLEARN_ANSWER_CACHE_SIZE", "500"))
+
+_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+
+def corpus_key(project_name: str, project: dict) -> str:
+    """Content identity of a project's document set: its name plus the sorted blob digests of its documents."""
+    documents = project.get("documents", {})
+    digests = sorted(documents[n]["blob"] for n in project.get("loaded_files", []) if n in documents)
+    return hashlib.sha256("\n".join([project_name, *digests]).encode("utf-8")).hexdigest()[:16]
+
+
+class AnswerCache:
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, ttl_seconds=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = []   # dicts: query, answer, corpus, params, created, last_hit, hits
+        self._vectors = None  # (n, dim) float32, row i belongs to _entries[i]
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def _drop(self, keep):
+        self._entries = [e for e, k in zip(self._entries, keep) if k]
+        self._vectors = self._vectors[np.asarray(keep, dtype=bool)] if self._entries else None
+
+    def _expire(self, now):
+        keep = [now - e["created"] < self.ttl_seconds for e in self._entries]
+        dropped = keep.count(False)
+        if dropped:
+            self.stats["expired"] += dropped
+            self._drop(keep)
+
+    def lookup(self, query_vector, params: dict, corpus: str):
+        """Cached answer for a semantically equivalent question asked against the same corpus, or None."""
+        vector = np.asarray(query_vector, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            best = None
+            if self._entries:
+                scores = self._vectors @ vector
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    if self._entries[i]["corpus"] == corpus and self._entries[i]["params"] == params:
+                        best = self._entries[i]
+                        similarity = float(scores[i])
+                        break
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            best["hits"] += 1
+            best["last_hit"] = now
+        log.info(f"⚡ [ANSWER CACHE] Hit ({similarity:.3f}) for '{best['query']}'")
+        return best["answer"]
+
+    def store(self, query, query_vector, params: dict, answer: str, corpus: str):
+        """Caches a complete answer. `corpus` is the corpus_key of the documents it was retrieved from."""
+        if not answer.strip():
+            return
+        vector = np.asarray(query_vector, dtype=np.float32)[None, :]
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if len(self._entries) >= self.max_entries:
+                # Least recently used (or stored) entry goes first
+                oldest = min(range(len(self._entries)), key=lambda i: self._entries[i]["last_hit"])
+                keep = [i != oldest for i in range(len(self._entries))]
+                self._drop(keep)
+                self.stats["evictions"] += 1
+            self._entries.append({"query": query, "answer": answer, "corpus": corpus, "params": params,
+                                  "created": now, "last_hit": now, "hits": 0})
+            self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+            self.stats["stores"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._vectors = None
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "enabled": ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
+
+
+def replay(answer: str):
+    """Yields a cached answer in word-sized pieces, so clients consume it like a live stream."""
+    for match in _TOKEN_RE.finditer(answer):
+        yield match.group(0)
+
+
+# ---- Threshold calibration ----
+
+# Rewordings that should share an answer, and questions on the same topic that must not
+CALIBRATION_PAIRS = {
+    "paraphrase": [
+        ("what is OLAP", "explain OLAP"), ("what is OLAP?", "What is OLAP"),
+        ("define normalization", "what is normalization"), ("what is a primary key", "explain primary keys"),
+        ("how does the TCP handshake work", "explain the TCP handshake"), ("what is photosynthesis", "explain photosynthesis"),
+        ("what are the phases of mitosis", "list the phases of mitosis"), ("difference between OLAP and OLTP", "OLAP vs OLTP"),
+        ("what is a foreign key?", "define foreign key"), ("explain the water cycle", "what is the water cycle"),
+        ("what is gradient descent", "explain gradient descent"), ("what is a star schema", "explain the star schema"),
+        ("what does the mitochondria do", "what is the function of the mitochondria"), ("what is recursion", "define recursion"),
+    ],
+    "near_miss": [
+        ("what is OLAP", "what is OLTP"), ("what is a primary key", "what is a foreign key"),
+        ("what is a star schema", "what is a snowflake schema"), ("explain mitosis", "explain meiosis"),
+        ("what is photosynthesis", "what is cellular respiration"), ("how does TCP work", "how does UDP work"),
+        ("what is first normal form", "what is third normal form"), ("what is a data warehouse", "what is a data lake"),
+        ("explain gradient descent", "explain backpropagation"), ("what is a stack", "what is a queue"),
+        ("what is OLAP", "what are the advantages of OLAP"), ("what is a fact table", "what is a dimension table"),
+        ("what is DNA", "what is RNA"), ("what does the mitochondria do", "what does the ribosome do"),
+    ],
+}
+
+
+def calibrate(out=None) -> dict:
+    """Cosine of every CALIBRATION_PAIRS pair under the configured embedder, and hit rates per threshold."""
+    from rag_core import embed
+    similarities = {}
+    for label, pairs in CALIBRATION_PAIRS.items():
+        a = np.asarray(embed([p[0] for p in pairs]), dtype=np.float32)
+        b = np.asarray(embed([p[1] for p in pairs]), dtype=np.float32)
+        similarities[label] = [round(float(x), 4) for x in (a * b).sum(axis=1)]
+        for (q1, q2), sim in zip(pairs, similarities[label]):
+            print(f"   {label:<10} {sim:.3f}  '{q1}' / '{q2}'")
+
+    thresholds = {}
+    for t in np.arange(0.80, 0.991, 0.01):
+        t = round(float(t), 2)
+        thresholds[t] = {
+            "paraphrase_hits": sum(s >= t for s in similarities["paraphrase"]) / len(similarities["paraphrase"]),
+            "false_hits": sum(s >= t for s in similarities["near_miss"]) / len(similarities["near_miss"]),
+        }
+        print(f"📊 [ANSWER CACHE] {t:.2f}: {thresholds[t]['paraphrase_hits']:.0%} paraphrase hits, "
+              f"{thresholds[t]['false_hits']:.0%} false hits")
+    # Lowest threshold that serves no near-miss a wrong answer
+    safe = min((t for t, r in thresholds.items() if r["false_hits"] == 0), default=None)
+    print(f"\n✅ [ANSWER CACHE] Lowest threshold without false hits: {safe} (current: {SIMILARITY_THRESHOLD})")
+
+    report = {"created_at": datetime.datetime.now().isoformat(), "current_threshold": SIMILARITY_THRESHOLD,
+              "recommended_threshold": safe, "similarities": similarities,
+              "thresholds": {str(t): r for t, r in thresholds.items()}}
+    out = out or os.path.join("bench_results", f"answer_cache_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"💾 [ANSWER CACHE] Calibration written to {out}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="answer_cache.py", description="Semantic answer cache tools.")
+    parser.add_argument("command", choices=["calibrate"])
+    parser.add_argument("--out", default=None, help="JSON output path (default: bench_results/answer_cache_<timestamp>.json)")
+    args = parser.parse_args(argv)
+    calibrate(args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,451 @@
+"""
+End-to-end benchmarks: ingest, retrieval at scale, and generation.
+
+    python bench.py ingest                      # parse / chunk / embed / add_docs throughput on the bundled PDFs
+    python bench.py retrieval --sizes 1000,100000,1000000
+    python bench.py generate --model models/bench.gguf
+    python bench.py all --model models/bench.gguf
+    python bench.py compare bench_results/a.json bench_results/b.json
+
+Every run writes one JSON report (default bench_results/bench_<timestamp>.json) tagged with the git commit,
+so `compare` can flag regressions between two commits. Benchmarks use a throwaway Chroma store, never the server's.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+import tempfile
+
+FIXTURES = ["test.pdf", "test2.pdf", "Syllabus-Data Sciences Data Warehousing & Data Mining.pdf"]
+DEFAULT_MODEL = os.environ.get("LETSLEARN_BENCH_MODEL", os.path.join("models", "bench.gguf"))
+DEFAULT_QUERY = "What is data mining?"
+DEFAULT_TOPIC = "data warehousing"
+# Chroma rejects larger add() calls on most builds
+INSERT_BATCH = 5000
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile (pct in 0-100) of a list, or None when it is empty. Shared by the benchmark tools."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else None
+
+
+def _latency(values_ms) -> dict:
+    return {
+        "p50": round(percentile(values_ms, 50), 2),
+        "p95": round(percentile(values_ms, 95), 2),
+        "p99": round(percentile(values_ms, 99), 2),
+        "mean": round(statistics.fmean(values_ms), 2),
+    }
+
+
+def _timed(fn, repeat=1):
+    """(result of the last run, median seconds over `repeat` runs)"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return result, statistics.median(times)
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 1) if seconds > 0 else None
+
+
+def _fresh_store(prefix="bench_"):
+    """Points rag_core at an empty temporary Chroma store, keyword index and embedding cache."""
+    import rag_core
+    import embedding_cache
+    from bm25_index import BM25Index
+    rag_core.db_path = tempfile.mkdtemp(prefix=prefix)
+    # A warm embedding cache would turn add_docs into a lookup
+    embedding_cache.CACHE_DIR = os.path.join(rag_core.db_path, "embedding_cache")
+    rag_core._embedding_cache = None
+    rag_core.client = None
+    rag_core.collection = None
+    rag_core.keyword_index = BM25Index()
+    rag_core._bump_collection_version()
+    return rag_core
+
+
+def _environment() -> dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _existing(files):
+    found = [f for f in files if os.path.exists(f)]
+    for f in files:
+        if f not in found:
+            print(f"⚠️ [BENCH] Fixture not found, skipping: {f}")
+    return found
+
+
+# ---- Ingest: parse, chunk, embed, add_docs ----
+
+def bench_ingest(files, repeat=3) -> dict:
+    from doc_parser import parse_document
+    rag_core = _fresh_store("bench_ingest_")
+    rag_core.embed(["warm up"])
+
+    report = {"files": {}}
+    totals = {"bytes": 0, "chars": 0, "chunks": 0, "parse_s": 0.0, "chunk_s": 0.0, "embed_s": 0.0, "add_docs_s": 0.0}
+    for path in files:
+        size = os.path.getsize(path)
+        text, parse_s = _timed(lambda: parse_document(path), repeat)
+        if not text:
+            print(f"⚠️ [BENCH] No text extracted from {path}, skipping.")
+            continue
+        chunks, chunk_s = _timed(lambda: rag_core.chunk_text(text), repeat)
+        _, embed_s = _timed(lambda: rag_core.embed(chunks), repeat)
+        # add_docs is measured once per file: a repeat would only hit the unchanged-source shortcut in BM25
+        _, add_s = _timed(lambda: rag_core.add_docs(chunks, source=os.path.basename(path)))
+        result = {
+            "bytes": size,
+            "chars": len(text),
+            "chunks": len(chunks),
+            "parse_ms": round(parse_s * 1000, 2),
+            "parse_mb_per_s": _rate(size / 1e6, parse_s),
+            "parse_chars_per_s": _rate(len(text), parse_s),
+            "chunk_ms": round(chunk_s * 1000, 3),
+            "chunk_chunks_per_s": _rate(len(chunks), chunk_s),
+            "embed_ms": round(embed_s * 1000, 2),
+            "embed_chunks_per_s": _rate(len(chunks), embed_s),
+            "add_docs_ms": round(add_s * 1000, 2),
+            "add_docs_chunks_per_s": _rate(len(chunks), add_s),
+        }
+        report["files"][os.path.basename(path)] = result
+        for key, value in (("bytes", size), ("chars", len(text)), ("chunks", len(chunks)), ("parse_s", parse_s),
+                           ("chunk_s", chunk_s), ("embed_s", embed_s), ("add_docs_s", add_s)):
+            totals[key] += value
+        print(f"📊 [BENCH] {os.path.basename(path)}: parse {result['parse_ms']} ms ({result['parse_mb_per_s']} MB/s), "
+              f"{len(chunks)} chunks, embed {result['embed_chunks_per_s']} chunks/s, add_docs {result['add_docs_chunks_per_s']} chunks/s")
+
+    report["total"] = {
+        "bytes": totals["bytes"],
+        "chars": totals["chars"],
+        "chunks": totals["chunks"],
+        "parse_mb_per_s": _rate(totals["bytes"] / 1e6, totals["parse_s"]),
+        "chunk_chunks_per_s": _rate(totals["chunks"], totals["chunk_s"]),
+        "embed_chunks_per_s": _rate(totals["chunks"], totals["embed_s"]),
+        "add_docs_chunks_per_s": _rate(totals["chunks"], totals["add_docs_s"]),
+    }
+    return report
+
+
+# ---- Retrieval latency at scale ----
+
+def _synthetic_batch(rng, np_rng, fixture_chunks, fixture_vectors, vocab, count, noise):
+    """
+    Distractor chunks shaped like the fixtures: word soup drawn from a real chunk plus corpus vocabulary, with
+    that chunk's embedding jittered and re-normalized. Embedding a million real chunks would take hours on CPU.
+    `noise` is the norm of the jitter; 0.5 keeps distractors at roughly 0.9 cosine to their source chunk.
+    """
+    import numpy as np
+    picks = np_rng.integers(0, len(fixture_chunks), size=count)
+    dim = fixture_vectors.shape[1]
+    vectors = fixture_vectors[picks] + np_rng.normal(0.0, noise / np.sqrt(dim), size=(count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    texts = []
+    for i in picks:
+        words = fixture_chunks[i].split()
+        sample = rng.sample(words, min(len(words), 50)) + rng.choices(vocab, k=30)
+        rng.shuffle(sample)
+        texts.append(" ".join(sample))
+    return texts, vectors.tolist()
+
+
+def bench_retrieval(files, sizes, queries=200, k=5, modes=("vector", "hybrid"), noise=0.5, seed=0) -> dict:
+    import numpy as np
+    from doc_parser import parse_document
+    from bm25_index import build_eval_set, _hit
+
+    rag_core = _fresh_store("bench_retrieval_")
+    fixture_chunks = []
+    for path in files:
+        text = parse_document(path)
+        if text:
+            chunks = rag_core.chunk_text(text)
+            rag_core.add_docs(chunks, source=os.path.basename(path))
+            fixture_chunks.extend(chunks)
+    if not fixture_chunks:
+        print("❌ [BENCH] No fixture text to build the retrieval corpus from.")
+        return {}
+
+    # Queries target fixture chunks, so recall shows whether the real answer survives the distractors
+    rng = random.Random(seed)
+    eval_set = build_eval_set(rag_core.keyword_index)
+    eval_set = rng.sample(eval_set, min(queries, len(eval_set)))
+    if not eval_set:
+        print("❌ [BENCH] No eval queries (were the documents parsed?).")
+        return {}
+    fixture_vectors = np.asarray(rag_core.embed(fixture_chunks), dtype=np.float32)
+    vocab = sorted(rag_core.keyword_index.postings)
+    np_rng = np.random.default_rng(seed)
+    index_bm25 = "hybrid" in modes
+
+    collection = rag_core.get_collection()
+    batch_limit = min(INSERT_BATCH, getattr(rag_core.client, "get_max_batch_size", lambda: INSERT_BATCH)())
+    report = {"fixture_chunks": len(fixture_chunks), "queries": len(eval_set), "k": k, "noise": noise, "sizes": {}}
+    added = 0
+    for size in sorted(sizes):
+        to_add = size - collection.count()
+        step_added = max(0, to_add)
+        t0 = time.perf_counter()
+        while to_add > 0:
+            n = min(batch_limit, to_add)
+            texts, vectors = _synthetic_batch(rng, np_rng, fixture_chunks, fixture_vectors, vocab, n, noise)
+            ids = [f"synthetic_{added + i}" for i in range(n)]
+            metadatas = [{"source": f"synthetic_{added // batch_limit}", "chunk": i} for i in range(n)]
+            collection.add(documents=texts, embeddings=vectors, metadatas=metadatas, ids=ids)
+            if index_bm25:
+                rag_core.keyword_index.add_source(f"synthetic_{added // batch_limit}", texts)
+            added += n
+            to_add -= n
+        build_s = time.perf_counter() - t0
+        rag_core._bump_collection_version()
+        actual = collection.count()
+        print(f"🏗️ [BENCH] Corpus at {actual} chunks (built in {build_s:.1f}s)")
+
+        result = {"chunks": actual, "insert_chunks_per_s": _rate(step_added, build_s) if step_added else None, "modes": {}}
+        query_vectors = rag_core.embed([item["query"] for item in eval_set])
+        # Stage timings: vector search and BM25 on their own, without the query embedding
+        vector_ms, bm25_ms = [], []
+        for item, q_emb in zip(eval_set, query_vectors):
+            t0 = time.perf_counter()
+            collection.query(query_embeddings=[q_emb], n_results=min(actual, max(k, rag_core.HYBRID_CANDIDATES)))
+            vector_ms.append((time.perf_counter() - t0) * 1000)
+            if index_bm25:
+                t0 = time.perf_counter()
+                rag_core.keyword_index.search(item["query"], k=rag_core.HYBRID_CANDIDATES)
+                bm25_ms.append((time.perf_counter() - t0) * 1000)
+        result["vector_query_ms"] = _latency(vector_ms)
+        if bm25_ms:
+            result["bm25_ms"] = _latency(bm25_ms)
+
+        # End to end through retrieve_records (query embedding, search, fusion)
+        for mode in modes:
+            rag_core.RETRIEVAL_MODE = mode
+            latencies, hits = [], 0
+            for item in eval_set:
+                t0 = time.perf_counter()
+                records = rag_core.retrieve_records(item["query"], k=k, rerank_results=False)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                hits += _hit({"kind": "", **item}, records)
+            result["modes"][mode] = {"latency_ms": _latency(latencies), "recall": round(hits / len(eval_set), 3)}
+            lat = result["modes"][mode]["latency_ms"]
+            print(f"📊 [BENCH] {actual:>8} chunks {mode:<7} p50 {lat['p50']} ms, p95 {lat['p95']} ms, p99 {lat['p99']} ms, "
+                  f"recall@{k} {result['modes'][mode]['recall']}")
+        report["sizes"][str(size)] = result
+    return report
+
+
+# ---- Generation: TTFT and tokens/sec per generator ----
+
+def _stream_stats(stream) -> dict:
+    t0 = time.perf_counter()
+    first = last = None
+    tokens = 0
+    chars = 0
+    for chunk in stream:
+        text = chunk["choices"][0].get("text", "")
+        now = time.perf_counter()
+        if first is None and text:
+            first = now
+        if text:
+            last = now
+            tokens += 1
+            chars += len(text)
+    end = time.perf_counter()
+    decode = (last - first) if first is not None and last is not None else 0
+    return {
+        "ttft_ms": round((first - t0) * 1000, 2) if first is not None else None,
+        "total_ms": round((end - t0) * 1000, 2),
+        "tokens": tokens,
+        "chars": chars,
+        "tokens_per_s": round((tokens - 1) / decode, 2) if tokens > 1 and decode > 0 else None,
+    }
+
+
+def _median_stats(runs) -> dict:
+    merged = {}
+    for key in runs[0]:
+        values = [r[key] for r in runs if r[key] is not None]
+        merged[key] = round(statistics.median(values), 2) if values else None
+    merged["runs"] = len(runs)
+    return merged
+
+
+def bench_generate(files, model_path, profile=None, repeat=1, query=DEFAULT_QUERY, topic=DEFAULT_TOPIC, only=None) -> dict:
+    from doc_parser import parse_document
+    if not os.path.exists(model_path):
+        print(f"❌ [BENCH] Model not found at '{model_path}'. Put a small GGUF there or pass --model.")
+        return {}
+
+    rag_core = _fresh_store("bench_generate_")
+    sample_text = ""
+    for path in files:
+        text = parse_document(path)
+        if text:
+            rag_core.add_docs(rag_core.chunk_text(text), source=os.path.basename(path))
+            sample_text = sample_text or text[:1500]
+    llm = rag_core.load_llm(model_path, profile=profile)
+    if llm is None:
+        print("❌ [BENCH] Failed to load the model.")
+        return {}
+    # Warm-up so the first measured generator doesn't pay for graph setup
+    for _ in llm.create_completion("Hello", max_tokens=4, stream=True):
+        pass
+
+    selection = sample_text[:400]
+    streaming = {
+        "generate_answer": lambda: rag_core.generate_answer(llm, query),
+        "generate_flashcards": lambda: rag_core.generate_flashcards(llm, count=3, topic=topic),
+        "generate_quiz": lambda: rag_core.generate_quiz(llm, count=3, fmt="json", topic=topic),
+        "generate_notes": lambda: rag_core.generate_notes(llm, topic),
+        "generate_topics": lambda: rag_core.generate_topics(llm),
+        "generate_summary": lambda: rag_core.generate_summary(llm),
+        "generate_section_summary": lambda: rag_core.generate_section_summary(llm, sample_text),
+        "generate_contextual_answer": lambda: rag_core.generate_contextual_answer(llm, selection, "Explain this in simple terms."),
+    }
+    # These return a finished string, so only their wall time is measurable
+    blocking = {
+        "route_visual": lambda: rag_core.route_visual(llm, query),
+        "generate_mermaid": lambda: rag_core.generate_mermaid(llm, query),
+        "create_sd_prompt": lambda: rag_core.create_sd_prompt(llm, query),
+    }
+
+    report = {"model": os.path.basename(model_path), "model_bytes": os.path.getsize(model_path),
+              "n_ctx": llm.n_ctx(), "query": query, "topic": topic, "generators": {}}
+    for name, make_stream in streaming.items():
+        if only and name not in only:
+            continue
+        stats = _median_stats([_stream_stats(make_stream()) for _ in range(repeat)])
+        report["generators"][name] = stats
+        print(f"📊 [BENCH] {name:<27} TTFT {stats['ttft_ms']} ms, {stats['tokens_per_s']} tok/s, {stats['tokens']} tokens")
+    for name, call in blocking.items():
+        if only and name not in only:
+            continue
+        _, seconds = _timed(call, repeat)
+        report["generators"][name] = {"total_ms": round(seconds * 1000, 2), "runs": repeat}
+        print(f"📊 [BENCH] {name:<27} {report['generators'][name]['total_ms']} ms")
+    return report
+
+
+# ---- Comparing two reports ----
+
+def _flatten(data, prefix=""):
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def _direction(path):
+    """+1 if higher is better, -1 if lower is better, 0 for counts and settings."""
+    leaf = path.rsplit(".", 1)[-1]
+    if leaf.endswith("_per_s") or leaf == "recall":
+        return 1
+    if leaf.endswith("_ms") or ".latency_ms." in path or "_ms." in path:
+        return -1
+    return 0
+
+
+def compare(old_path, new_path, threshold=0.10) -> int:
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"🔎 [BENCH] {old.get('environment', {}).get('commit')} -> {new.get('environment', {}).get('commit')} "
+          f"(flagging changes worse than {threshold:.0%})")
+    before = dict(_flatten({k: v for k, v in old.items() if k != "environment"}))
+    regressions = 0
+    for path, value in _flatten({k: v for k, v in new.items() if k != "environment"}):
+        direction = _direction(path)
+        if not direction or path not in before or not before[path]:
+            continue
+        change = (value - before[path]) / abs(before[path])
+        worse = change * direction < -threshold
+        regressions += worse
+        if worse or abs(change) > threshold:
+            print(f"{'❌' if worse else '✅'} {path}: {before[path]} -> {value} ({change:+.1%})")
+    print(f"\n{'❌' if regressions else '✅'} [BENCH] {regressions} regression(s)")
+    return 1 if regressions else 0
+
+
+# ---- CLI ----
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bench.py", description="LetsLearn ingest / retrieval / generation benchmarks.")
+    parser.add_argument("suite", choices=["ingest", "retrieval", "generate", "all", "compare"])
+    parser.add_argument("files", nargs="*", help="Documents to use (default: the bundled PDFs); for compare: OLD.json NEW.json")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per ingest measurement (median is reported)")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Corpus sizes (chunks) for the retrieval benchmark")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per corpus size")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--modes", default="vector,hybrid", help="Retrieval modes to measure")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Small GGUF for the generation benchmark")
+    parser.add_argument("--profile", default=None, help="llm_profile preset for the generation benchmark")
+    parser.add_argument("--gen-repeat", type=int, default=1, help="Runs per generator (median is reported)")
+    parser.add_argument("--only", default=None, help="Comma-separated generator names to run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="compare: relative change counted as a regression")
+    parser.add_argument("--out", default=None, help="JSON output path (default: bench_results/bench_<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    if args.suite == "compare":
+        if len(args.files) != 2:
+            parser.error("compare takes exactly two report files")
+        return compare(args.files[0], args.files[1], args.threshold)
+
+    files = _existing(args.files or FIXTURES)
+    if not files:
+        print("❌ [BENCH] No input documents.")
+        return 1
+    report = {
+        "created_at": datetime.datetime.now().isoformat(),
+        "environment": _environment(),
+        "files": [os.path.basename(f) for f in files],
+    }
+    if args.suite in ("ingest", "all"):
+        print("\n⏱️ [BENCH] Ingest")
+        report["ingest"] = bench_ingest(files, repeat=args.repeat)
+    if args.suite in ("retrieval", "all"):
+        print("\n⏱️ [BENCH] Retrieval")
+        sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+        modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+        report["retrieval"] = bench_retrieval(files, sizes, queries=args.queries, k=args.k, modes=modes)
+    if args.suite in ("generate", "all"):
+        print("\n⏱️ [BENCH] Generation")
+        only = {n.strip() for n in args.only.split(",")} if args.only else None
+        report["generate"] = bench_generate(files, args.model, profile=args.profile, repeat=args.gen_repeat, only=only)
+
+    out = args.out or os.path.join("bench_results", f"bench_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n💾 [BENCH] Results written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
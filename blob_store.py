@@ -0,0 +1,135 @@
+"""
+Content-addressed storage for uploaded documents.
+
+Uploads are streamed into data/blobs/tmp while their SHA-256 is computed, then moved to
+data/blobs/<first 2 hex>/<sha256><ext>. Identical files uploaded to several projects are stored once.
+Projects reference blobs by name:
+
+    "loaded_files": ["notes.pdf"],
+    "documents": {"notes.pdf": {"blob": "<sha256>", "ext": ".pdf", "size": 12345, "uploaded_at": "..."}}
+
+The file extension is part of the blob name because doc_parser routes by extension. Anything derived from a
+document's content (parsed text, chunk embeddings) can be cached by the blob digest.
+"""
+import os
+import hashlib
+import datetime
+import tempfile
+
+from logs import get_logger
+
+log = get_logger("blobs")
+
+BLOBS_DIR = os.path.join("data", "blobs")
+READ_SIZE = 1024 * 1024
+
+
+def blob_path(digest: str, ext: str) -> str:
+    return os.path.join(BLOBS_DIR, digest[:2], f"{digest}{ext}")
+
+
+def _ext(filename: str) -> str:
+    return os.path.splitext(filename)[1].lower()
+
+
+def _commit(tmp_path: str, digest: str, ext: str, size: int) -> dict:
+    path = blob_path(digest, ext)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+        log.info(f"♻️ [BLOBS] {digest[:12]} already stored, skipping the copy.")
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return {"blob": digest, "ext": ext, "size": size, "uploaded_at": datetime.datetime.now().isoformat()}
+
+
+def _tmp_file():
+    tmp_dir = os.path.join(BLOBS_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    return os.fdopen(fd, "wb"), tmp_path
+
+
+async def save_upload(upload, filename: str) -> dict:
+    """Streams a FastAPI UploadFile into the store, hashing as it goes. Returns the blob record."""
+    hasher = hashlib.sha256()
+    size = 0
+    out, tmp_path = _tmp_file()
+    try:
+        with out:
+            while True:
+                block = await upload.read(READ_SIZE)
+                if not block:
+                    break
+                hasher.update(block)
+                out.write(block)
+                size += len(block)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return _commit(tmp_path, hasher.hexdigest(), _ext(filename), size)
+
+
+def add_file(path: str) -> dict:
+    """Copies a file on disk into the store (used to migrate pre-blob projects)."""
+    hasher = hashlib.sha256()
+    size = 0
+    out, tmp_path = _tmp_file()
+    try:
+        with out, open(path, "rb") as src:
+            while True:
+                block = src.read(READ_SIZE)
+                if not block:
+                    break
+                hasher.update(block)
+                out.write(block)
+                size += len(block)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return _commit(tmp_path, hasher.hexdigest(), _ext(path), size)
+
+
+def document_path(record: dict) -> str:
+    return blob_path(record["blob"], record["ext"])
+
+
+def document_name(project: dict, filename: str, digest: str) -> str:
+    """
+    Name a new upload is listed under. Re-uploading identical content keeps its name; a different file with a
+    taken name becomes "name (2).ext" instead of replacing the existing document.
+    """
+    documents = project.get("documents", {})
+    base, ext = os.path.splitext(os.path.basename(filename.replace("\\", "/")) or "document")
+    name, n = f"{base}{ext}", 1
+    while name in documents and documents[name]["blob"] != digest:
+        n += 1
+        name = f"{base} ({n}){ext}"
+    return name
+
+
+def migrate_project_files(project: dict) -> bool:
+    """
+    Moves a project's legacy loaded_files paths ("data\\Biology\\notes.pdf") into the blob store.
+    Entries whose file is gone are left untouched. Returns True if the project changed.
+    """
+    changed = "documents" not in project
+    documents = project.setdefault("documents", {})
+    migrated = []
+    for entry in project.get("loaded_files", []):
+        if entry in documents:
+            migrated.append(entry)
+            continue
+        path = entry.replace("\\", os.sep).replace("/", os.sep)
+        if not os.path.isfile(path):
+            migrated.append(entry)
+            continue
+        record = add_file(path)
+        name = document_name(project, path, record["blob"])
+        documents[name] = record
+        migrated.append(name)
+        changed = True
+        log.info(f"📦 [BLOBS] Migrated {entry} -> blob {record['blob'][:12]}")
+    project["loaded_files"] = migrated
+    return changed
+
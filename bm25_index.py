@@ -0,0 +1,330 @@
+"""
+In-process BM25 keyword index that runs alongside the Chroma vector store.
+
+Vector search misses exact-term lookups (acronyms, syllabus codes, formula names); BM25 catches them.
+rag_core fuses both rankings with reciprocal-rank fusion.
+
+The index is persisted per project (data/<project>/bm25_index.json) and updated per source:
+re-adding an unchanged document reuses its stored postings instead of re-tokenizing it.
+
+Benchmark:  python bm25_index.py bench test.pdf test2.pdf --k 2,5 [--rerank]
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import hashlib
+import argparse
+import datetime
+import threading
+from collections import Counter
+
+from logs import get_logger
+
+log = get_logger("bm25")
+
+INDEX_FILE = "bm25_index.json"
+INDEX_VERSION = 1
+
+# Standard Okapi BM25 parameters
+K1 = 1.5
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were "
+    "what when where which who why how with will can do does did not no".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """Lowercased alphanumeric terms. Codes like 'CS-301' index as 'cs' + '301', and queries split the same way."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def source_hash(chunks: list) -> str:
+    h = hashlib.sha1()
+    for chunk in chunks:
+        h.update(chunk.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class BM25Index:
+    """
+    Inverted index over chunks, keyed by "<source>#<chunk>" so keys survive Chroma being rebuilt.
+    Postings are term -> {key: term frequency}; each doc keeps its term list so a source can be removed cheaply.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.sources = {}   # source -> {"hash": str, "keys": [key, ...]}
+        self.docs = {}      # key -> {"source", "chunk", "text", "len", "terms"}
+        self.postings = {}  # term -> {key: tf}
+        self.total_len = 0
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.docs)
+
+    # ---- Persistence ----
+
+    @classmethod
+    def open(cls, project_dir: str) -> "BM25Index":
+        """Loads a project's persisted index, or returns an empty one bound to that path."""
+        index = cls(os.path.join(project_dir, INDEX_FILE))
+        if not os.path.exists(index.path):
+            return index
+        try:
+            with open(index.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            if raw.get("version") != INDEX_VERSION:
+                log.info(f"🔁 [BM25] Index format changed, rebuilding {index.path}")
+                return index
+            index.sources = raw["sources"]
+            index.docs = raw["docs"]
+            index.postings = raw["postings"]
+            index.total_len = sum(d["len"] for d in index.docs.values())
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            log.warning(f"⚠️ [BM25] Could not read {index.path}, rebuilding: {e}")
+            return cls(index.path)
+        log.info(f"📇 [BM25] Loaded keyword index: {len(index.docs)} chunks from {len(index.sources)} source(s).")
+        return index
+
+    def save(self):
+        """Writes the index atomically if it changed. In-memory indexes (no path) are never written."""
+        if not self.path or not self.dirty:
+            return
+        with self._lock:
+            payload = json.dumps({
+                "version": INDEX_VERSION,
+                "sources": self.sources,
+                "docs": self.docs,
+                "postings": self.postings,
+            }, ensure_ascii=False)
+            self.dirty = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+
+    # ---- Updates ----
+
+    def add_source(self, source: str, chunks: list) -> bool:
+        """
+        Indexes a document's chunks, replacing any older version of the same source.
+        Returns False (and does nothing) when the source is already indexed with identical content.
+        """
+        digest = source_hash(chunks)
+        with self._lock:
+            existing = self.sources.get(source)
+            if existing and existing["hash"] == digest:
+                return False
+            if existing:
+                self._remove_locked(source)
+            keys = []
+            for i, text in enumerate(chunks):
+                key = f"{source}#{i}"
+                terms = Counter(tokenize(text))
+                length = sum(terms.values())
+                self.docs[key] = {"source": source, "chunk": i, "text": text, "len": length, "terms": list(terms)}
+                for term, tf in terms.items():
+                    self.postings.setdefault(term, {})[key] = tf
+                self.total_len += length
+                keys.append(key)
+            self.sources[source] = {"hash": digest, "keys": keys}
+            self.dirty = True
+        return True
+
+    def _remove_locked(self, source: str):
+        for key in self.sources.pop(source)["keys"]:
+            doc = self.docs.pop(key, None)
+            if not doc:
+                continue
+            self.total_len -= doc["len"]
+            for term in doc["terms"]:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(key, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def retain(self, sources):
+        """Drops every indexed source not in `sources` (e.g. files removed from the project)."""
+        keep = set(sources)
+        with self._lock:
+            for source in [s for s in self.sources if s not in keep]:
+                self._remove_locked(source)
+                self.dirty = True
+
+    # ---- Search ----
+
+    def search(self, query: str, k: int = 10) -> list:
+        """Top-k chunks by BM25 score as records shaped like rag_core's (text, source, chunk, rank, score)."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.docs)
+            if not n or not terms:
+                return []
+            avg_len = self.total_len / n
+            scores = {}
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for key, tf in posting.items():
+                    norm = tf + K1 * (1 - B + B * self.docs[key]["len"] / avg_len)
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (K1 + 1) / norm
+            best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+            return [
+                {"id": key, "text": self.docs[key]["text"], "source": self.docs[key]["source"],
+                 "chunk": self.docs[key]["chunk"], "rank": rank, "score": round(score, 4)}
+                for rank, (key, score) in enumerate(best)
+            ]
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """
+    Fuses ranked record lists by sum of 1 / (k + rank). Records are matched on (source, chunk);
+    the first list's copy of a record wins. Returns records re-ranked from 0.
+    """
+    fused = {}
+    for records in rankings:
+        for rank, record in enumerate(records):
+            key = (record["source"], record["chunk"])
+            entry = fused.setdefault(key, {"record": record, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank + 1)
+    ordered = sorted(fused.values(), key=lambda e: e["score"], reverse=True)
+    return [{**e["record"], "rank": rank} for rank, e in enumerate(ordered)]
+
+
+# ---- Benchmark: hybrid vs. vector-only retrieval ----
+
+def build_eval_set(index: BM25Index, per_source: int = 15) -> list:
+    """
+    Generates queries from the indexed chunks themselves, two kinds per sampled chunk:
+      - "keyword": the chunk's two rarest terms (acronym/code style lookups)
+      - "phrase":  an 8-word span from the middle of the chunk
+    A query counts as answered if any retrieved chunk is the target or contains the phrase verbatim.
+    """
+    n = len(index.docs)
+    eval_set = []
+    for source, entry in index.sources.items():
+        keys = entry["keys"]
+        step = max(1, len(keys) // per_source)
+        for key in keys[::step][:per_source]:
+            doc = index.docs[key]
+            rare = sorted(doc["terms"], key=lambda t: len(index.postings.get(t, {})))
+            rare = [t for t in rare if len(t) > 2 and not t.isdigit()][:2]
+            if rare and len(index.postings[rare[0]]) < n:
+                eval_set.append({"kind": "keyword", "query": " ".join(rare), "source": source, "chunk": doc["chunk"]})
+            words = doc["text"].split()
+            if len(words) >= 16:
+                mid = len(words) // 2
+                eval_set.append({"kind": "phrase", "query": " ".join(words[mid - 4:mid + 4]),
+                                 "source": source, "chunk": doc["chunk"]})
+    return eval_set
+
+
+def _hit(item, records) -> bool:
+    for r in records:
+        if r["source"] == item["source"] and r["chunk"] == item["chunk"]:
+            return True
+        if item["kind"] == "phrase" and item["query"] in r["text"]:
+            return True
+    return False
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else None
+
+
+def bench(argv=None):
+    parser = argparse.ArgumentParser(prog="bm25_index.py bench", description="Compare hybrid (BM25 + vector) and vector-only retrieval.")
+    parser.add_argument("files", nargs="+", help="Documents to index (pdf, pptx, txt)")
+    parser.add_argument("--k", default="2,5", help="Comma-separated cutoffs for recall@k")
+    parser.add_argument("--per-source", type=int, default=15, help="Chunks sampled per document for generated queries")
+    parser.add_argument("--eval", default=None, help="JSON eval set to use instead of generating one")
+    parser.add_argument("--rerank", action="store_true", help="Also measure hybrid retrieval with cross-encoder reranking")
+    parser.add_argument("--save-eval", default=None, help="Write the generated eval set here for reuse")
+    parser.add_argument("--out", default=None, help="JSON output path (default: bench_results/retrieval_<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    import tempfile
+    import rag_core
+    from doc_parser import parse_document
+
+    # Benchmark against a throwaway Chroma store, never the server's
+    rag_core.db_path = tempfile.mkdtemp(prefix="bm25_bench_")
+    rag_core.keyword_index = BM25Index()
+    for path in args.files:
+        text = parse_document(path)
+        if text:
+            rag_core.add_docs(rag_core.chunk_text(text), source=os.path.basename(path))
+
+    if args.eval:
+        with open(args.eval, "r", encoding="utf-8") as f:
+            eval_set = json.load(f)
+    else:
+        eval_set = build_eval_set(rag_core.keyword_index, args.per_source)
+        if args.save_eval:
+            with open(args.save_eval, "w", encoding="utf-8") as f:
+                json.dump(eval_set, f, indent=2, ensure_ascii=False)
+    if not eval_set:
+        print("❌ [BENCH] No eval queries (were the documents parsed?).")
+        return 1
+
+    cutoffs = [int(x) for x in args.k.split(",") if x.strip()]
+    report = {
+        "created_at": datetime.datetime.now().isoformat(),
+        "files": args.files,
+        "chunks": len(rag_core.keyword_index),
+        "queries": len(eval_set),
+        "modes": {},
+    }
+    rag_core.embed(["warm up"])
+    modes = [("vector", "vector", False), ("hybrid", "hybrid", False)]
+    if args.rerank:
+        rag_core.RERANK_ENABLED = True
+        if rag_core.load_reranker() is not None:
+            modes.append(("hybrid+rerank", "hybrid", True))
+    for mode, retrieval_mode, use_rerank in modes:
+        rag_core.RETRIEVAL_MODE = retrieval_mode
+        for k in cutoffs:
+            rag_core._rerank_cache.clear()
+            latencies = []
+            hits = Counter()
+            totals = Counter()
+            for item in eval_set:
+                t0 = time.perf_counter()
+                records = rag_core.retrieve_records(item["query"], k=k, rerank_results=use_rerank)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                totals[item.get("kind", "query")] += 1
+                hits[item.get("kind", "query")] += _hit({"kind": "", **item}, records)
+            result = {
+                "recall": round(sum(hits.values()) / len(eval_set), 3),
+                "recall_by_kind": {kind: round(hits[kind] / totals[kind], 3) for kind in totals},
+                "latency_ms": {"p50": round(_percentile(latencies, 50), 2), "p95": round(_percentile(latencies, 95), 2)},
+            }
+            report["modes"].setdefault(mode, {})[f"k={k}"] = result
+            print(f"📊 [BENCH] {mode:<13} k={k}: recall {result['recall']} {result['recall_by_kind']} | "
+                  f"p50 {result['latency_ms']['p50']} ms, p95 {result['latency_ms']['p95']} ms")
+
+    out = args.out or os.path.join("bench_results", f"retrieval_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n💾 [BENCH] Results written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sys.exit(bench(sys.argv[2:]))
+    log.info("Usage: python bm25_index.py bench <files...> [--k 2,5] [--eval eval.json]")
@@ -1,32 +1,124 @@
 import os
 import pymupdf  # fitz
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from logs import get_logger
+
+log = get_logger("parser")
+
+# Bump when extraction output changes so cached parses (parse_cache.py) are redone
+# 2: PPTX slides as title/body/tables/notes records, including grouped shapes
+PARSER_VERSION = 2
+
+# Decks with at least this many slides are extracted by worker processes (LETSLEARN_PPTX_WORKERS, 1 = never)
+PPTX_PARALLEL_MIN_SLIDES = int(os.environ.get("LETSLEARN_PPTX_PARALLEL_MIN_SLIDES", "200"))
+PPTX_WORKERS = int(os.environ.get("LETSLEARN_PPTX_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+# How each kind of segment is joined back into the document text
+SEPARATORS = {"page": "\n\n", "slide": "\n", "text": ""}
+
+def join_segments(kind, segments):
+    sep = SEPARATORS[kind]
+    return "".join(segment + sep for segment in segments).strip()
+
+def pdf_pages(filepath):
+    doc = pymupdf.open(filepath)
+    try:
+        return [page.get_text() for page in doc]
+    finally:
+        doc.close()
+
+def _walk_shapes(shapes):
+    """Shapes in reading order, with group shapes flattened."""
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            yield from _walk_shapes(shape.shapes)
+        else:
+            yield shape
+
+def slide_record(index, slide):
+    """{"index", "title", "body", "tables", "notes"} for one slide; body is a list of text blocks, tables lists of rows."""
+    title_shape = slide.shapes.title
+    record = {"index": index, "title": title_shape.text.strip() if title_shape is not None else "",
+              "body": [], "tables": [], "notes": ""}
+    for shape in _walk_shapes(slide.shapes):
+        if title_shape is not None and shape.shape_id == title_shape.shape_id:
+            continue
+        if getattr(shape, "has_table", False) and shape.has_table:
+            record["tables"].append([[cell.text.strip() for cell in row.cells] for row in shape.table.rows])
+        elif getattr(shape, "has_text_frame", False) and shape.has_text_frame and shape.text_frame.text.strip():
+            record["body"].append(shape.text_frame.text.strip())
+    if slide.has_notes_slide and slide.notes_slide.notes_text_frame is not None:
+        record["notes"] = slide.notes_slide.notes_text_frame.text.strip()
+    return record
+
+def slide_text(record):
+    lines = [record["title"]] if record["title"] else []
+    lines.extend(record["body"])
+    for table in record["tables"]:
+        lines.extend(" | ".join(row) for row in table)
+    if record["notes"]:
+        lines.append(f"Notes: {record['notes']}")
+    return "".join(line + "\n" for line in lines)
+
+def _slide_range(filepath, start, stop):
+    slides = Presentation(filepath).slides
+    return [slide_record(i, slides[i]) for i in range(start, stop)]
+
+def iter_pptx_slides(filepath, workers=None):
+    """
+    Yields slide records in order as they are extracted. Large decks are split into one contiguous slide range
+    per worker process; records still arrive in slide order, a range at a time.
+    """
+    slides = Presentation(filepath).slides
+    workers = PPTX_WORKERS if workers is None else workers
+    if workers <= 1 or len(slides) < PPTX_PARALLEL_MIN_SLIDES:
+        for i, slide in enumerate(slides):
+            yield slide_record(i, slide)
+        return
+
+    # Every range re-opens and re-parses the whole deck in its worker, so use exactly one per worker
+    workers = min(workers, len(slides))
+    step = -(-len(slides) // workers)
+    ranges = [(start, min(start + step, len(slides))) for start in range(0, len(slides), step)]
+    log.info(f"🧵 [PARSER] Extracting {len(slides)} slides with {workers} worker processes.")
+    done = 0
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(_slide_range, filepath, start, stop) for start, stop in ranges]
+        for future in futures:
+            records = future.result()
+            done += len(records)
+            yield from records
+    except BrokenProcessPool as e:
+        log.warning(f"⚠️ [PARSER] Worker processes failed ({e}); extracting the remaining slides here.")
+        for i in range(done, len(slides)):
+            yield slide_record(i, slides[i])
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def pptx_slides(filepath):
+    return [slide_text(record) for record in iter_pptx_slides(filepath)]
 
 def extract_text_from_pdf(filepath):
     text = ""
     try:
-        doc = pymupdf.open(filepath)
-        for page in doc:
-            text += page.get_text() + "\n\n"
-        doc.close()
+        text = join_segments("page", pdf_pages(filepath))
     except Exception as e:
-        print(f"❌ Error parsing PDF {filepath}: {e}")
-    print(f"📄 [PARSER] Extracted {len(text)} characters from PDF.")
-    return text.strip()
+        log.error(f"❌ Error parsing PDF {filepath}: {e}")
+    log.info(f"📄 [PARSER] Extracted {len(text)} characters from PDF.")
+    return text
 
 def extract_text_from_pptx(filepath):
     text = ""
     try:
-        prs = Presentation(filepath)
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text += shape.text + "\n"
-            text += "\n"
+        text = join_segments("slide", pptx_slides(filepath))
     except Exception as e:
-        print(f"❌ Error parsing PPTX {filepath}: {e}")
-    print(f"📄 [PARSER] Extracted {len(text)} characters from PPTX.")
-    return text.strip()
+        log.error(f"❌ Error parsing PPTX {filepath}: {e}")
+    log.info(f"📄 [PARSER] Extracted {len(text)} characters from PPTX.")
+    return text
 
 def extract_text_from_txt(filepath):
     text = ""
@@ -34,8 +126,8 @@ def extract_text_from_txt(filepath):
         with open(filepath, 'r', encoding='utf-8') as f:
             text = f.read()
     except Exception as e:
-        print(f"❌ Error reading Text file {filepath}: {e}")
-    print(f"📄 [PARSER] Loaded {len(text)} characters from {os.path.basename(filepath)}.")
+        log.error(f"❌ Error reading Text file {filepath}: {e}")
+    log.info(f"📄 [PARSER] Loaded {len(text)} characters from {os.path.basename(filepath)}.")
     return text.strip()
 
 def parse_document(filepath):
@@ -44,7 +136,7 @@ def parse_document(filepath):
     Supported: .pdf, .pptx, .txt, .md
     """
     if not os.path.exists(filepath):
-        print(f"Error: File not found at {filepath}")
+        log.info(f"Error: File not found at {filepath}")
         return ""
         
     ext = os.path.splitext(filepath)[1].lower()
@@ -56,5 +148,20 @@ def parse_document(filepath):
     elif ext in ['.txt', '.md', '.csv', '.json']:
         return extract_text_from_txt(filepath)
     else:
-        print(f"Unsupported file type: {ext}")
+        log.info(f"Unsupported file type: {ext}")
         return ""
+
+def parse_segments(filepath):
+    """
+    (kind, segments) with page/slide boundaries kept: "page" for PDFs, "slide" for PPTX, "text" (one segment)
+    for plain text. Unlike parse_document, extraction errors are raised. Returns None for unsupported types.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == '.pdf':
+        return "page", pdf_pages(filepath)
+    if ext == '.pptx':
+        return "slide", pptx_slides(filepath)
+    if ext in ['.txt', '.md', '.csv', '.json']:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return "text", [f.read()]
+    return None
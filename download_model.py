@@ -40,6 +40,23 @@ def download_mistral_model():
         print(f"\n❌ Error downloading model: {e}")
         return None
 
+def download_reranker_model():
+    """
+    Caches the small cross-encoder used for optional reranking (LETSLEARN_RERANK=1),
+    so it can load later with HF_HUB_OFFLINE set.
+    """
+    from huggingface_hub import snapshot_download
+    repo_id = os.environ.get("LETSLEARN_RERANKER", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    print(f"📥 Caching reranker {repo_id} (approx 90 MB)...")
+    try:
+        path = snapshot_download(repo_id=repo_id)
+        print(f"🎉 Reranker cached at: {path}")
+        return path
+    except Exception as e:
+        print(f"\n❌ Error downloading reranker: {e}")
+        return None
+
 if __name__ == "__main__":
     print("🚀 LetsLearn - Model Setup")
     download_mistral_model()
+    download_reranker_model()
@@ -0,0 +1,241 @@
+"""
+Embedding backends behind rag_core.embed.
+
+LETSLEARN_EMBEDDER picks one:
+  - "sentence-transformers" (default): BAAI/bge-small-en-v1.5 in fp32 PyTorch
+  - "onnx": the same model exported to ONNX and int8-quantized, run with ONNX Runtime from a local directory
+            (LETSLEARN_ONNX_EMBEDDER_DIR, default models/bge-small-en-v1.5-onnx). Intra-op threads default to
+            the physical core count (LETSLEARN_EMBEDDER_THREADS overrides).
+
+Both return L2-normalized float32 arrays, so stored vectors stay comparable. The exported model is close to,
+not identical with, PyTorch; check it on your own documents before switching an existing project.
+
+    python embedders.py export                  # torch -> ONNX -> int8, from the cached HF model
+    python embedders.py parity test.pdf         # cosine between the two backends' chunk embeddings
+    python embedders.py bench test.pdf          # chunks/sec per backend and batch size
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+
+import numpy as np
+
+from logs import get_logger
+
+log = get_logger("embedder")
+
+EMBEDDER_BACKEND = os.environ.get("LETSLEARN_EMBEDDER", "sentence-transformers")
+ONNX_MODEL_DIR = os.environ.get("LETSLEARN_ONNX_EMBEDDER_DIR", os.path.join("models", "bge-small-en-v1.5-onnx"))
+# Preferred first: the int8 export, then a full-precision one
+ONNX_MODEL_FILES = ("model_int8.onnx", "model.onnx")
+MAX_LENGTH = 512
+BATCH_SIZE = 32
+
+
+class SentenceTransformerEmbedder:
+    backend = "sentence-transformers"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        import transformers
+        transformers.logging.set_verbosity_error()
+        self.model = SentenceTransformer(model_name)
+        self.model_id = model_name
+
+    def encode(self, texts, batch_size=BATCH_SIZE) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
+
+
+class OnnxEmbedder:
+    """bge with CLS pooling, run by ONNX Runtime. Inputs are sorted by length so batches pad little."""
+    backend = "onnx"
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, threads: int | None = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = next((os.path.join(model_dir, f) for f in ONNX_MODEL_FILES if os.path.exists(os.path.join(model_dir, f))), None)
+        if model_file is None:
+            raise FileNotFoundError(f"No ONNX embedder in '{model_dir}'. Run: python embedders.py export")
+        if threads is None:
+            threads = int(os.environ.get("LETSLEARN_EMBEDDER_THREADS", "0")) or _physical_cores()
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_LENGTH)
+        self.threads = threads
+        self.model_id = _read_model_id(model_dir, os.path.basename(model_file))
+        log.info(f"🧮 [EMBEDDER] ONNX Runtime: {model_file} ({threads} threads)")
+
+    def encode(self, texts, batch_size=BATCH_SIZE) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        encodings = self.tokenizer.encode_batch(list(texts))
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        out = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            batch = [encodings[i] for i in order[start:start + batch_size]]
+            width = max(len(e.ids) for e in batch)
+            ids = np.zeros((len(batch), width), dtype=np.int64)
+            mask = np.zeros((len(batch), width), dtype=np.int64)
+            for row, e in enumerate(batch):
+                ids[row, :len(e.ids)] = e.ids
+                mask[row, :len(e.ids)] = 1
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(ids)
+            hidden = self.session.run(None, feeds)[0]
+            cls = hidden[:, 0, :]
+            cls = cls / np.linalg.norm(cls, axis=1, keepdims=True)
+            for row, i in enumerate(order[start:start + batch_size]):
+                out[i] = cls[row]
+        return np.asarray(out, dtype=np.float32)
+
+
+def _physical_cores() -> int:
+    from llm_profile import physical_cores
+    return physical_cores()
+
+
+def _read_model_id(model_dir, model_file) -> str:
+    """Model id recorded at export (source model + quantization), so caches can tell backends apart."""
+    try:
+        with open(os.path.join(model_dir, "export.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        return f"{info['source']}:onnx:{info['files'].get(model_file, model_file)}"
+    except (OSError, json.JSONDecodeError, KeyError):
+        return f"{os.path.basename(os.path.normpath(model_dir))}:onnx:{model_file}"
+
+
+def load_embedder(model_name: str, backend: str | None = None):
+    backend = backend or EMBEDDER_BACKEND
+    if backend == "onnx":
+        return OnnxEmbedder()
+    if backend == "sentence-transformers":
+        return SentenceTransformerEmbedder(model_name)
+    raise ValueError(f"Unknown embedder backend '{backend}' (use sentence-transformers or onnx)")
+
+
+# ---- CLI: export, parity, bench ----
+
+def export(model_name: str, out_dir: str = ONNX_MODEL_DIR):
+    """Exports the cached HF model to ONNX (dynamic batch/sequence axes) and writes a dynamic int8 copy."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    int8_path = os.path.join(out_dir, "model_int8.onnx")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    print(f"📦 [EMBEDDER] Exporting {model_name} to {fp32_path}...")
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[n] for n in names), fp32_path, input_names=names,
+                          output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=14)
+    print(f"🗜️ [EMBEDDER] Quantizing to int8: {int8_path}")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, "export.json"), "w", encoding="utf-8") as f:
+        json.dump({"source": model_name, "files": {"model.onnx": "fp32", "model_int8.onnx": "int8"},
+                   "exported_at": datetime.datetime.now().isoformat()}, f, indent=4)
+    print(f"🎉 [EMBEDDER] Done. Use it with LETSLEARN_EMBEDDER=onnx LETSLEARN_ONNX_EMBEDDER_DIR={out_dir}")
+
+
+def _fixture_chunks(files, limit):
+    from doc_parser import parse_document
+    from rag_core import chunk_text
+    chunks = []
+    for path in files:
+        text = parse_document(path)
+        if text:
+            chunks.extend(chunk_text(text))
+    return chunks[:limit] if limit else chunks
+
+
+def parity(model_name, files, limit=500, min_cosine=0.98, k=5) -> int:
+    """
+    Embeds the same chunks with both backends. Passes if every chunk's two embeddings have a cosine similarity of
+    at least `min_cosine`; also reports how often the backends agree on a chunk's top-k neighbours.
+    """
+    chunks = _fixture_chunks(files, limit)
+    if not chunks:
+        print("❌ [PARITY] No chunks to compare.")
+        return 1
+    reference = SentenceTransformerEmbedder(model_name).encode(chunks)
+    candidate = OnnxEmbedder().encode(chunks)
+    cosines = np.sum(reference * candidate, axis=1)
+    top_ref = np.argsort(-(reference @ reference.T), axis=1)[:, 1:k + 1]
+    top_onnx = np.argsort(-(candidate @ candidate.T), axis=1)[:, 1:k + 1]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(top_ref, top_onnx)])
+    ok = float(cosines.min()) >= min_cosine
+    print(f"{'✅' if ok else '❌'} [PARITY] {len(chunks)} chunks: cosine min {cosines.min():.4f}, "
+          f"mean {cosines.mean():.4f}, p1 {np.percentile(cosines, 1):.4f} | top-{k} neighbour overlap {overlap:.3f}")
+    return 0 if ok else 1
+
+
+def bench(model_name, files, backends, batch_sizes, repeat=3, limit=None, out=None) -> int:
+    chunks = _fixture_chunks(files, limit)
+    if not chunks:
+        print("❌ [BENCH] No chunks to embed.")
+        return 1
+    report = {"created_at": datetime.datetime.now().isoformat(), "files": files, "chunks": len(chunks), "backends": {}}
+    for backend in backends:
+        t0 = time.perf_counter()
+        embedder = load_embedder(model_name, backend)
+        load_s = time.perf_counter() - t0
+        embedder.encode(chunks[:8])
+        results = {"load_s": round(load_s, 2), "model_id": embedder.model_id, "batch": {}}
+        for batch_size in batch_sizes:
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                embedder.encode(chunks, batch_size=batch_size)
+                times.append(time.perf_counter() - t0)
+            best = min(times)
+            results["batch"][str(batch_size)] = {"seconds": round(best, 3), "chunks_per_s": round(len(chunks) / best, 1)}
+            print(f"📊 [BENCH] {backend:<21} batch {batch_size:>3}: {len(chunks) / best:8.1f} chunks/s")
+        report["backends"][backend] = results
+    out = out or os.path.join("bench_results", f"embedders_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n💾 [BENCH] Results written to {out}")
+    return 0
+
+
+def main(argv=None):
+    from rag_core import EMBEDDER_NAME
+    parser = argparse.ArgumentParser(prog="embedders.py", description="Export, check and benchmark embedder backends.")
+    parser.add_argument("command", choices=["export", "parity", "bench"])
+    parser.add_argument("files", nargs="*", default=["test.pdf", "test2.pdf"])
+    parser.add_argument("--out", default=None, help="export: model directory; bench: JSON path")
+    parser.add_argument("--limit", type=int, default=500, help="Max chunks to embed")
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--backends", default="sentence-transformers,onnx")
+    parser.add_argument("--batch", default="8,32,64")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export(EMBEDDER_NAME, args.out or ONNX_MODEL_DIR)
+        return 0
+    if args.command == "parity":
+        return parity(EMBEDDER_NAME, args.files, args.limit, args.min_cosine)
+    return bench(EMBEDDER_NAME, args.files, [b.strip() for b in args.backends.split(",")],
+                 [int(b) for b in args.batch.split(",")], args.repeat, args.limit, args.out)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+On-disk chunk embedding cache shared by all projects.
+
+The same textbook or syllabus often lands in several projects; its chunks only need embedding once. Vectors are
+keyed by (embedder model id, sha1 of the chunk text): each model id gets its own directory under
+embedding_cache/ with append-only files
+    hashes.bin   20-byte sha1 digests, one per row
+    vectors.bin  float32 rows, exactly as the embedder returned them
+    meta.json    committed row count (rows past it are leftovers of an interrupted write and get truncated)
+The digest -> row map is rebuilt from hashes.bin on open; vectors are memory-mapped.
+
+LETSLEARN_EMBEDDING_CACHE=0 turns it off. One server process writes a cache directory at a time.
+"""
+import os
+import re
+import json
+import hashlib
+import threading
+
+import numpy as np
+
+from logs import get_logger
+
+log = get_logger("embedding_cache")
+
+ENABLED = os.environ.get("LETSLEARN_EMBEDDING_CACHE", "1").lower() in ("1", "true", "yes", "on")
+CACHE_DIR = os.environ.get("LETSLEARN_EMBEDDING_CACHE_DIR", os.path.join(os.path.dirname(__file__), "embedding_cache"))
+DIGEST_SIZE = 20
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, model_id: str, root: str | None = None):
+        self.model_id = model_id
+        self.path = os.path.join(root or CACHE_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id))
+        self._lock = threading.Lock()
+        self.dim = None
+        self._count = 0
+        self._rows = {}
+        self._vectors = None
+        self.stats = {"hits": 0, "misses": 0}
+        self._open()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        try:
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model_id") != self.model_id:
+                raise ValueError("model id mismatch")
+            self.dim, self._count = meta["dim"], meta["count"]
+            with open(self._file("hashes.bin"), "rb") as f:
+                digests = f.read(self._count * DIGEST_SIZE)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, json.JSONDecodeError) as e:
+            log.warning(f"⚠️ [EMBED CACHE] Unreadable cache at {self.path}, starting over: {e}")
+            self.dim, self._count = None, 0
+            return
+        self._rows = {digests[i:i + DIGEST_SIZE]: i // DIGEST_SIZE for i in range(0, len(digests), DIGEST_SIZE)}
+        self._remap()
+        log.info(f"♻️ [EMBED CACHE] {self._count} cached embeddings for {self.model_id}")
+
+    def _remap(self):
+        self._vectors = np.memmap(self._file("vectors.bin"), dtype=np.float32, mode="r",
+                                  shape=(self._count, self.dim)) if self._count else None
+
+    def _append(self, name, data: bytes, expected_size: int):
+        with open(self._file(name), "ab") as f:
+            if f.seek(0, os.SEEK_END) != expected_size:
+                f.truncate(expected_size)
+            f.write(data)
+
+    def __len__(self):
+        return self._count
+
+    def embed(self, texts: list, embed_fn) -> list:
+        """
+        Embeddings for `texts` in order. Only texts never seen with this model go to `embed_fn` (once each,
+        even if repeated in the batch); their vectors are stored before returning.
+        """
+        digests = [text_hash(t) for t in texts]
+        with self._lock:
+            rows = [self._rows.get(d) for d in digests]
+            hits = sum(1 for row in rows if row is not None)
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(texts) - hits
+        missing = {}
+        for text, digest, row in zip(texts, digests, rows):
+            if row is None and digest not in missing:
+                missing[digest] = text
+
+        fresh = {}
+        if missing:
+            vectors = np.asarray(embed_fn(list(missing.values())), dtype=np.float32)
+            fresh = dict(zip(missing, vectors))
+            self._store(fresh)
+        with self._lock:
+            cached = self._vectors
+        return [(cached[row] if row is not None else fresh[digest]).tolist() for digest, row in zip(digests, rows)]
+
+    def _store(self, fresh: dict):
+        with self._lock:
+            digests = [d for d in fresh if d not in self._rows]
+            if not digests:
+                return
+            vectors = np.stack([fresh[d] for d in digests]).astype(np.float32)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                log.warning(f"⚠️ [EMBED CACHE] Dimension changed for {self.model_id}; not caching.")
+                return
+            os.makedirs(self.path, exist_ok=True)
+            self._append("vectors.bin", vectors.tobytes(), self._count * self.dim * 4)
+            self._append("hashes.bin", b"".join(digests), self._count * DIGEST_SIZE)
+            for i, d in enumerate(digests):
+                self._rows[d] = self._count + i
+            self._count += len(digests)
+            tmp_path = self._file("meta.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model_id": self.model_id, "dim": self.dim, "count": self._count}, f)
+            os.replace(tmp_path, self._file("meta.json"))
+            self._remap()
@@ -13,24 +13,39 @@ async function fetchQuiz(projectName, count = 5, topic = 'all', onProgress, sign
   const res = await fetch(`${API}/projects/${projectName}/quiz`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ count, fmt: 'json', topic }),
+    body: JSON.stringify({ count, fmt: 'ndjson', topic }),
     signal
   });
   if (!res.ok) throw new Error('Server error');
 
+  // One question per line; each is parsed and reported as soon as its line is complete
   const reader = res.body.getReader();
   const decoder = new TextDecoder('utf-8');
+  const questions = [];
   let raw = '';
+  let pending = '';
+  const takeLine = (line) => {
+    if (!line.trim()) return;
+    try {
+      questions.push(JSON.parse(line));
+      raw += line + '\n';
+    } catch {
+      // Skip a malformed line rather than losing the whole quiz
+    }
+  };
   while (true) {
     const { value, done } = await reader.read();
     if (done) break;
-    const chunk = decoder.decode(value, { stream: true });
-    raw += chunk;
-    if (onProgress) onProgress(raw);
+    pending += decoder.decode(value, { stream: true });
+    const lines = pending.split('\n');
+    pending = lines.pop();
+    if (lines.length === 0) continue;
+    lines.forEach(takeLine);
+    if (onProgress) onProgress(raw, [...questions]);
   }
-  const arrayMatch = raw.match(/\[[\s\S]*\]/);
-  if (!arrayMatch) throw new Error('No valid JSON array found in response.');
-  return JSON.parse(arrayMatch[0]);
+  takeLine(pending + decoder.decode());
+  if (onProgress) onProgress(raw, [...questions]);
+  return questions;
 }
 
 async function fetchTopics(projectName, onProgress, signal) {
@@ -606,7 +621,8 @@ export default function QuizView({ activeProj, onResultSaved, setIsBusy, onConte
       correct: q.answer || q.correct,
       selected: opt, 
       isCorrect, 
-      topic: q.topic || 'General'
+      topic: q.topic || 'General',
+      hash: q.hash
     }];
     setAnswers(newAnswers);
 
@@ -724,7 +740,9 @@ export default function QuizView({ activeProj, onResultSaved, setIsBusy, onConte
         breakdown: byTopic, 
         timestamp: new Date().toISOString(), 
         project: activeProj,
-        time_spent: sessionTime 
+        time_spent: sessionTime,
+        // Per-question outcomes feed the server's spaced-repetition sampler
+        questions: answers.filter(r => r.hash).map(r => ({ hash: r.hash, topic: r.topic, correct: r.isCorrect }))
       });
     } catch (err) {
       console.error('Failed to save results', err);
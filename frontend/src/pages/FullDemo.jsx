@@ -235,7 +235,7 @@ function ChatView({ activeProj, isBusy, setIsBusy }) {
               }
             } else if (parsed.type === 'image') {
               setMessages(prev => prev.map(m =>
-                m.id === msgId ? { ...m, image: parsed.content, imagePath: parsed.path } : m
+                m.id === msgId ? { ...m, image: `${API}${parsed.url}`, imagePath: parsed.path } : m
               ));
             } else if (parsed.type === 'new_message') {
               msgId = Date.now() + Math.random();
@@ -376,14 +376,14 @@ function ChatView({ activeProj, isBusy, setIsBusy }) {
                     {msg.image && (
                       <div className="mt-4 not-prose">
                         <img
-                          src={`data:image/png;base64,${msg.image}`}
+                          src={msg.image}
                           alt="AI-generated visualization"
-                          onClick={() => setZoomedImage(`data:image/png;base64,${msg.image}`)}
+                          onClick={() => setZoomedImage(msg.image)}
                           className="max-w-xs border-4 border-slate-900 shadow-[4px_4px_0px_#0f172a] cursor-zoom-in hover:scale-[1.02] transition-transform"
                         />
                         <div className="flex gap-3 mt-4">
                           <a
-                            href={`data:image/png;base64,${msg.image}`}
+                            href={msg.image}
                             download="visualization.png"
                             className="inline-flex items-center gap-2 px-4 py-2 text-xs font-black uppercase tracking-widest text-slate-900 bg-white border-4 border-slate-900 shadow-[4px_4px_0px_#0f172a] hover:bg-slate-100 transition-all hover:translate-x-[2px] hover:translate-y-[2px] hover:shadow-[0px_0px_0px_#0f172a]"
                           >
@@ -391,7 +391,7 @@ function ChatView({ activeProj, isBusy, setIsBusy }) {
                             Download
                           </a>
                           <button
-                            onClick={() => setZoomedImage(`data:image/png;base64,${msg.image}`)}
+                            onClick={() => setZoomedImage(msg.image)}
                             className="inline-flex items-center gap-2 px-4 py-2 text-xs font-black uppercase tracking-widest text-slate-900 bg-yellow-300 border-4 border-slate-900 shadow-[4px_4px_0px_#0f172a] hover:bg-yellow-400 transition-all hover:translate-x-[2px] hover:translate-y-[2px] hover:shadow-none"
                           >
                             Expand View
@@ -611,8 +611,7 @@ export default function FullDemo() {
           const pData = projectMap[key];
           return {
             id: key, name: key,
-            docs: Array.isArray(pData) ? pData : (pData?.loaded_files || []),
-            results: pData?.results || []
+            docs: Array.isArray(pData) ? pData : (pData?.loaded_files || [])
           };
         });
         setProjects(formatted);
@@ -635,9 +634,17 @@ export default function FullDemo() {
     if (local) {
       try { setResults(JSON.parse(local)); } catch { setResults([]); }
     } else {
-      const proj = projects.find(p => p.id === projId);
-      if (proj && proj.results) setResults(proj.results);
-      else setResults([]);
+      // History lives in the project's results log on the server, not in GET /projects
+      setResults([]);
+      try {
+        const res = await fetch(`${API}/projects/${encodeURIComponent(projId)}/results?limit=50`);
+        if (res.ok) {
+          const data = await res.json();
+          setResults(data.results || []);
+        }
+      } catch (err) {
+        console.error('results load error', err);
+      }
     }
 
     try {
@@ -0,0 +1,170 @@
+"""
+LLM backends.
+
+Every generate_* function takes an `llm` with the slice of the llama_cpp.Llama API LetsLearn uses (LLMBackend).
+load_llm picks the backend from LETSLEARN_LLM_BACKEND:
+  - "llama" (default): the GGUF model through llama-cpp-python
+  - "fake":  FakeLLM, which needs no model and streams deterministic text at a fixed rate. It is meant for load
+             testing the server (see loadgen.py) and for exercising endpoints without a GPU.
+
+FakeLLM settings: LETSLEARN_FAKE_TPS (decode tokens/sec, default 30), LETSLEARN_FAKE_PREFILL_TPS (prompt
+tokens/sec, default 800), LETSLEARN_FAKE_N_CTX (default 8192), LETSLEARN_FAKE_SEED.
+"""
+import os
+import re
+import json
+import time
+import zlib
+import random
+import hashlib
+from collections import Counter
+from typing import Protocol
+
+BACKENDS = ("llama", "fake")
+LLM_BACKEND = os.environ.get("LETSLEARN_LLM_BACKEND", "llama").lower()
+
+_PIECE_RE = re.compile(r"\S+\s*|\s+")
+_TOKEN_RE = re.compile(rb"\s*\S+|\s+")
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z\-]{3,}")
+_CONTEXT_RE = re.compile(r"<DOCUMENT_CONTENT>(.*?)</DOCUMENT_CONTENT>", re.DOTALL)
+_COUNT_RE = re.compile(r"exactly (\d+)")
+_FILLER = ("data", "model", "process", "analysis", "system", "structure", "method", "pattern", "example", "result")
+
+
+class LLMBackend(Protocol):
+    """The calls rag_core, section_summaries and pregen make on `llm`. llama_cpp.Llama matches it structurally."""
+
+    def create_completion(self, prompt: str, max_tokens: int = 16, temperature: float = 0.8, stop=None,
+                          stream: bool = False, **kwargs):
+        """A completion dict, or with stream=True an iterator of chunk dicts ({"choices": [{"text": ...}]})."""
+        ...
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> list: ...
+
+    def n_ctx(self) -> int: ...
+
+
+class FakeLLM:
+    """
+    Deterministic stand-in for the GGUF model: the same prompt always gets the same text. The reply is shaped
+    by the prompt (quiz JSON, topic list, Mermaid, visual route, otherwise prose built from the prompt's own
+    words) so the endpoints' parsing and caching paths run as they would with Mistral.
+    Timing: prompt tokens are "evaluated" at prefill_tps before the first token, then tokens stream at tps.
+    """
+
+    def __init__(self, tps: float = 30.0, prefill_tps: float = 800.0, n_ctx: int = 8192, seed: int = 0):
+        self.tps = tps
+        self.prefill_tps = prefill_tps
+        self._n_ctx = n_ctx
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls) -> "FakeLLM":
+        return cls(
+            tps=float(os.environ.get("LETSLEARN_FAKE_TPS", "30")),
+            prefill_tps=float(os.environ.get("LETSLEARN_FAKE_PREFILL_TPS", "800")),
+            n_ctx=int(os.environ.get("LETSLEARN_FAKE_N_CTX", "8192")),
+            seed=int(os.environ.get("LETSLEARN_FAKE_SEED", "0")),
+        )
+
+    def __repr__(self):
+        return f"FakeLLM(tps={self.tps}, prefill_tps={self.prefill_tps}, n_ctx={self._n_ctx})"
+
+    # ---- Llama surface ----
+
+    def n_ctx(self) -> int:
+        return self._n_ctx
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> list:
+        # Roughly one token per word, with stable ids so prompts hash the same way every run
+        tokens = [3 + zlib.crc32(piece) % 31997 for piece in _TOKEN_RE.findall(text)]
+        return [1] + tokens if add_bos else tokens
+
+    def create_completion(self, prompt: str, max_tokens: int = 16, temperature: float = 0.8, stop=None,
+                          stream: bool = False, **kwargs):
+        pieces, finish_reason = self._pieces(prompt, max_tokens, stop)
+        n_prompt = len(self.tokenize(prompt.encode("utf-8")))
+        if stream:
+            return self._stream(pieces, finish_reason, n_prompt)
+        self._sleep(n_prompt / self.prefill_tps + len(pieces) / self.tps)
+        return {
+            "id": self._completion_id(prompt),
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": "fake",
+            "choices": [{"text": "".join(pieces), "index": 0, "logprobs": None, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": n_prompt, "completion_tokens": len(pieces), "total_tokens": n_prompt + len(pieces)},
+        }
+
+    def _stream(self, pieces, finish_reason, n_prompt):
+        completion_id = self._completion_id("".join(pieces))
+        created = int(time.time())
+        self._sleep(n_prompt / self.prefill_tps)
+        for i, piece in enumerate(pieces):
+            if i:
+                self._sleep(1 / self.tps)
+            yield {
+                "id": completion_id,
+                "object": "text_completion",
+                "created": created,
+                "model": "fake",
+                "choices": [{"text": piece, "index": 0, "logprobs": None,
+                             "finish_reason": finish_reason if i == len(pieces) - 1 else None}],
+            }
+
+    @staticmethod
+    def _sleep(seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @staticmethod
+    def _completion_id(text):
+        return "cmpl-" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:24]
+
+    # ---- Reply scripts ----
+
+    def _pieces(self, prompt, max_tokens, stop):
+        text = self._script(prompt)
+        finish_reason = "length"
+        for s in stop or []:
+            if s and s in text:
+                text = text[:text.index(s)]
+                finish_reason = "stop"
+        pieces = _PIECE_RE.findall(text)
+        if len(pieces) <= max_tokens:
+            return pieces, "stop" if finish_reason == "length" else finish_reason
+        return pieces[:max_tokens], "length"
+
+    def _script(self, prompt: str) -> str:
+        rng = random.Random(f"{self.seed}:{prompt}")
+        match = _CONTEXT_RE.search(prompt)
+        words = _WORD_RE.findall(match.group(1) if match else prompt) or list(_FILLER)
+        common = [w for w, _ in Counter(w.lower() for w in words).most_common(40)]
+
+        if "Reply with ONLY one word: diagram, visual, or text" in prompt:
+            return " text"
+        if "Mermaid" in prompt:
+            steps = rng.sample(common, min(4, len(common)))
+            lines = ["flowchart TD"] + [f"    N{i}[{w.title()}] --> N{i + 1}[{steps[i + 1].title()}]"
+                                        for i, w in enumerate(steps[:-1])]
+            return "\n".join(lines)
+        if '"question"' in prompt and "JSON array" in prompt:
+            count = int(_COUNT_RE.search(prompt).group(1)) if _COUNT_RE.search(prompt) else 5
+            questions = []
+            for _ in range(count):
+                term, *wrong = rng.sample(common, 4) if len(common) >= 4 else rng.sample(list(_FILLER), 4)
+                questions.append({
+                    "question": f"Which concept does the material associate with {term} ({rng.randint(1, 999)})?",
+                    "options": [f"{term.title()} analysis"] + [f"{w.title()} analysis" for w in wrong],
+                    "answer": f"{term.title()} analysis",
+                })
+            return json.dumps(questions, indent=2)
+        if "JSON array of strings" in prompt:
+            return json.dumps([w.title() for w in common[:rng.randint(5, 8)]])
+
+        sentences = []
+        for _ in range(rng.randint(8, 14)):
+            sample = [rng.choice(common) for _ in range(rng.randint(6, 14))]
+            sentences.append(" ".join(sample).capitalize() + ".")
+        paragraphs = [" ".join(sentences[i:i + 4]) for i in range(0, len(sentences), 4)]
+        return "\n\n".join(paragraphs)
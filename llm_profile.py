@@ -0,0 +1,399 @@
+"""
+llama.cpp runtime profiles for load_llm.
+
+A profile is resolved in this order (later wins):
+  1. built-in preset: LETSLEARN_LLM_PROFILE=auto|laptop-gpu|cpu-server (default: auto)
+  2. JSON file: llm_profile.json next to this file, or the path in LETSLEARN_LLM_PROFILE_FILE
+  3. per-key env overrides: LETSLEARN_LLM_N_THREADS=32, LETSLEARN_LLM_USE_MLOCK=1, ...
+
+"auto" thread counts are replaced with detected core counts.
+
+Speculative decoding: "draft" is "none", "prompt-lookup" (drafts by matching n-grams already in the prompt,
+which suits RAG answers that quote their context) or the path to a small GGUF sharing the main model's
+vocabulary. "draft_tokens" is how many tokens are drafted per step.
+
+Benchmark:  python llm_profile.py bench --threads 8,16,32 --batch 256,512
+            python llm_profile.py bench --draft none,prompt-lookup,models/draft.gguf --draft-tokens 4,8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import itertools
+
+from logs import get_logger
+
+log = get_logger("llm_profile")
+
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_profile.json")
+
+PRESETS = {
+    # Original hand-tuned values: 25 layers (~3.5GB) fit an RTX 2050's 4GB VRAM
+    "laptop-gpu": {
+        "n_gpu_layers": 25,
+        "n_ctx": 8192,
+        "n_threads": 4,
+        "n_threads_batch": "auto",
+        "n_batch": 512,
+        "use_mmap": True,
+        "use_mlock": False,
+        "flash_attn": True,
+        "draft": "none",
+        "draft_tokens": 8,
+        "draft_gpu_layers": 0,
+    },
+    # Many cores, no GPU: decode on physical cores, prompt eval on all logical cores, pin weights in RAM
+    "cpu-server": {
+        "n_gpu_layers": 0,
+        "n_ctx": 8192,
+        "n_threads": "auto",
+        "n_threads_batch": "auto",
+        "n_batch": 512,
+        "use_mmap": True,
+        "use_mlock": True,
+        "flash_attn": False,
+        "draft": "none",
+        "draft_tokens": 8,
+        "draft_gpu_layers": 0,
+    },
+}
+
+# Keys accepted from files/env and how to parse them from strings
+_TYPES = {
+    "n_gpu_layers": int, "n_ctx": int, "n_threads": int, "n_threads_batch": int,
+    "n_batch": int, "use_mmap": bool, "use_mlock": bool, "flash_attn": bool,
+}
+# Speculative decoding settings; consumed by build_draft_model, not passed to Llama directly
+_DRAFT_TYPES = {"draft": str, "draft_tokens": int, "draft_gpu_layers": int}
+_ALL_TYPES = {**_TYPES, **_DRAFT_TYPES}
+
+
+def physical_cores() -> int:
+    """Physical core count (hyperthreads excluded). psutil if installed, else /proc/cpuinfo, else a guess."""
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+        if cores:
+            return cores
+    except ImportError:
+        pass
+    try:
+        cores = set()
+        physical_id = core_id = None
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("physical id"):
+                    physical_id = line.split(":")[1].strip()
+                elif line.startswith("core id"):
+                    core_id = line.split(":")[1].strip()
+                elif not line.strip():
+                    if core_id is not None:
+                        cores.add((physical_id, core_id))
+                    physical_id = core_id = None
+        if core_id is not None:
+            cores.add((physical_id, core_id))
+        if cores:
+            return len(cores)
+    except OSError:
+        pass
+    logical = os.cpu_count() or 2
+    return max(1, logical // 2)
+
+
+def logical_cores() -> int:
+    return os.cpu_count() or physical_cores()
+
+
+def gpu_available() -> bool:
+    try:
+        import llama_cpp
+        return bool(llama_cpp.llama_supports_gpu_offload())
+    except (ImportError, AttributeError):
+        return False
+
+
+def _parse(key, value):
+    if value == "auto" or value is None:
+        return "auto"
+    kind = _ALL_TYPES[key]
+    if kind is bool and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return kind(value)
+
+
+def load_profile(name: str | None = None) -> dict:
+    """Builds the (unresolved) profile from preset, profile file and env overrides."""
+    name = name or os.environ.get("LETSLEARN_LLM_PROFILE", "auto")
+    if name == "auto":
+        name = "laptop-gpu" if gpu_available() else "cpu-server"
+    if name not in PRESETS:
+        raise ValueError(f"Unknown LLM profile '{name}'. Choose from: auto, {', '.join(PRESETS)}")
+    profile = {"name": name, **PRESETS[name]}
+
+    path = os.environ.get("LETSLEARN_LLM_PROFILE_FILE", PROFILE_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            overrides = json.load(f)
+        profile.update({k: _parse(k, v) for k, v in overrides.items() if k in _ALL_TYPES})
+        profile["source"] = path
+
+    for key in _ALL_TYPES:
+        env_value = os.environ.get(f"LETSLEARN_LLM_{key.upper()}")
+        if env_value is not None:
+            profile[key] = _parse(key, env_value)
+    return profile
+
+
+def resolve_profile(profile: dict | None = None) -> dict:
+    """Replaces "auto" values with concrete numbers for this machine."""
+    profile = dict(profile or load_profile())
+    if profile.get("n_threads") == "auto":
+        profile["n_threads"] = physical_cores()
+    if profile.get("n_threads_batch") == "auto":
+        # Prompt eval is compute-bound and benefits from SMT; token generation is memory-bound and does not
+        profile["n_threads_batch"] = logical_cores()
+    return profile
+
+
+def llama_kwargs(profile: dict) -> dict:
+    """Only the keys the Llama constructor understands."""
+    return {k: profile[k] for k in _TYPES if k in profile}
+
+
+# ---- Speculative decoding ----
+
+class GGUFDraftModel:
+    """
+    Drafts tokens greedily with a small GGUF model that shares the main model's vocabulary
+    (e.g. a 1B model of the same family). llama-cpp-python calls it with the current token ids
+    and verifies the returned draft in one batched forward pass of the main model.
+    """
+
+    def __init__(self, model_path: str, num_pred_tokens: int, settings: dict):
+        from llama_cpp import Llama
+        self.num_pred_tokens = num_pred_tokens
+        self.llm = Llama(
+            model_path=model_path,
+            verbose=False,
+            n_ctx=settings.get("n_ctx", 8192),
+            n_threads=settings.get("n_threads"),
+            n_threads_batch=settings.get("n_threads_batch"),
+            n_batch=settings.get("n_batch", 512),
+            n_gpu_layers=settings.get("draft_gpu_layers", 0),
+        )
+
+    def __call__(self, input_ids, **kwargs):
+        import numpy as np
+        draft = []
+        # generate() reuses the KV cache for the shared prefix, so each step only evaluates the new tokens
+        for token in self.llm.generate(list(input_ids), top_k=1, temp=0.0, reset=True):
+            if token == self.llm.token_eos():
+                break
+            draft.append(token)
+            if len(draft) >= self.num_pred_tokens:
+                break
+        return np.array(draft, dtype=np.intc)
+
+
+def build_draft_model(settings: dict):
+    """The draft model for llama-cpp-python's `draft_model` argument, or None when speculative decoding is off."""
+    draft = settings.get("draft") or "none"
+    num_pred_tokens = settings.get("draft_tokens", 8)
+    if draft == "none":
+        return None
+    if draft == "prompt-lookup":
+        from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+        return LlamaPromptLookupDecoding(num_pred_tokens=num_pred_tokens)
+    if not os.path.exists(draft):
+        log.warning(f"⚠️ [LLM] Draft model not found at '{draft}', speculative decoding disabled.")
+        return None
+    return GGUFDraftModel(draft, num_pred_tokens, settings)
+
+
+def check_draft_vocab(llm, draft=None):
+    """
+    Disables a GGUF draft whose vocabulary doesn't match the main model (its tokens would be meaningless).
+    Pass `draft` when llm.draft_model is a wrapper around it, as in the benchmark.
+    """
+    draft = draft if draft is not None else getattr(llm, "draft_model", None)
+    if isinstance(draft, GGUFDraftModel) and draft.llm.n_vocab() != llm.n_vocab():
+        log.warning(f"⚠️ [LLM] Draft model vocabulary ({draft.llm.n_vocab()}) differs from the main model "
+                    f"({llm.n_vocab()}), speculative decoding disabled.")
+        llm.draft_model = None
+    return llm
+
+
+class _CountingDraft:
+    """Wraps a draft model to count drafting steps and proposed tokens for the benchmark."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = 0
+        self.proposed = 0
+
+    def __call__(self, input_ids, **kwargs):
+        draft = self.inner(input_ids, **kwargs)
+        self.calls += 1
+        self.proposed += len(draft)
+        return draft
+
+
+# ---- Benchmark ----
+
+BENCH_PROMPT = (
+    "[INST] Explain, step by step and in detail, how a data warehouse differs from an OLTP database, "
+    "covering schema design, query patterns, indexing, normalization and typical workloads. [/INST]"
+)
+
+# Shaped like generate_answer: the reply can reuse phrases from the passage, which is where prompt lookup pays off
+RAG_PASSAGE = (
+    "A data warehouse is a subject-oriented, integrated, time-variant and non-volatile collection of data "
+    "that supports management decision making. OLAP operations such as roll-up, drill-down, slice, dice and "
+    "pivot run over multidimensional cubes built from fact tables and dimension tables arranged in a star or "
+    "snowflake schema. OLTP systems, by contrast, handle many short read-write transactions on normalized tables. "
+)
+RAG_BENCH_PROMPT = (
+    "[INST] Using ONLY the DOCUMENT_CONTENT, explain what a data warehouse is, which OLAP operations exist "
+    "and how warehouse schemas differ from OLTP schemas.\n\n<DOCUMENT_CONTENT>\n{passage}</DOCUMENT_CONTENT> [/INST]"
+)
+
+
+def _bench_prompt(llm, kind, prompt_tokens):
+    """Repeats the prompt (or the RAG passage) until it reaches the requested length so prompt eval is measurable."""
+    if kind == "rag":
+        base = llm.tokenize(RAG_PASSAGE.encode("utf-8"), add_bos=False)
+        reps = max(1, prompt_tokens // max(len(base), 1))
+        return RAG_BENCH_PROMPT.format(passage=RAG_PASSAGE * reps)
+    base = llm.tokenize(BENCH_PROMPT.encode("utf-8"), add_bos=False)
+    reps = max(1, prompt_tokens // max(len(base), 1))
+    return " ".join([BENCH_PROMPT] * reps)
+
+
+def _bench_once(model_path, settings, prompt_tokens, gen_tokens, prompt_kind="default"):
+    from llama_cpp import Llama
+
+    t0 = time.perf_counter()
+    draft = build_draft_model(settings)
+    counter = _CountingDraft(draft) if draft is not None else None
+    llm = Llama(model_path=model_path, verbose=False, draft_model=counter, **llama_kwargs(settings))
+    if draft is not None and check_draft_vocab(llm, draft).draft_model is None:
+        raise ValueError("draft model vocabulary does not match")
+    load_s = time.perf_counter() - t0
+
+    prompt = _bench_prompt(llm, prompt_kind, prompt_tokens)
+    n_prompt = len(llm.tokenize(prompt.encode("utf-8")))
+
+    start = time.perf_counter()
+    first = last = None
+    n_gen = 0
+    for chunk in llm.create_completion(prompt, max_tokens=gen_tokens, temperature=0.0, stream=True):
+        now = time.perf_counter()
+        if first is None:
+            first = now
+        last = now
+        n_gen += 1
+    del llm
+
+    ttft = (first - start) if first else None
+    speculative = {}
+    if counter is not None and counter.calls:
+        # Each verification step keeps the accepted draft tokens plus one token sampled by the main model
+        accepted = max(0, n_gen - counter.calls)
+        speculative = {
+            "draft_steps": counter.calls,
+            "draft_proposed": counter.proposed,
+            "draft_accepted": accepted,
+            "acceptance_rate": round(accepted / counter.proposed, 3) if counter.proposed else None,
+            "tokens_per_step": round(n_gen / counter.calls, 2),
+        }
+    return {
+        **speculative,
+        "load_s": round(load_s, 2),
+        "prompt_tokens": n_prompt,
+        "generated_tokens": n_gen,
+        "ttft_s": round(ttft, 3) if ttft else None,
+        "prompt_tps": round(n_prompt / ttft, 1) if ttft else None,
+        "gen_tps": round((n_gen - 1) / (last - first), 1) if n_gen > 1 and last > first else None,
+    }
+
+
+def _int_list(raw):
+    return [int(x) for x in raw.split(",") if x.strip()]
+
+
+def bench(argv=None):
+    parser = argparse.ArgumentParser(prog="llm_profile.py bench", description="Sweep llama.cpp settings and record tokens/sec.")
+    parser.add_argument("--model", default=os.path.join("models", "mistral.gguf"))
+    parser.add_argument("--profile", default=None, help="Base profile (default: LETSLEARN_LLM_PROFILE or auto)")
+    parser.add_argument("--threads", default=None, help="Comma-separated n_threads values to sweep")
+    parser.add_argument("--threads-batch", default=None, help="Comma-separated n_threads_batch values to sweep")
+    parser.add_argument("--batch", default=None, help="Comma-separated n_batch values to sweep")
+    parser.add_argument("--gpu-layers", default=None, help="Comma-separated n_gpu_layers values to sweep")
+    parser.add_argument("--draft", default=None, help="Comma-separated draft settings to sweep: none, prompt-lookup, or GGUF paths")
+    parser.add_argument("--draft-tokens", default=None, help="Comma-separated draft_tokens values to sweep")
+    parser.add_argument("--prompt", default="default", choices=["default", "rag"],
+                        help="'rag' asks for an answer grounded in a pasted passage, where prompt lookup can copy tokens")
+    parser.add_argument("--prompt-tokens", type=int, default=512)
+    parser.add_argument("--gen-tokens", type=int, default=128)
+    parser.add_argument("--out", default=None, help="JSON output path (default: bench_results/llm_profile_<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model):
+        print(f"❌ Model not found at '{args.model}'.")
+        return 1
+
+    base = resolve_profile(load_profile(args.profile))
+    sweep = {
+        "n_threads": _int_list(args.threads) if args.threads else [base["n_threads"]],
+        "n_threads_batch": _int_list(args.threads_batch) if args.threads_batch else [base["n_threads_batch"]],
+        "n_batch": _int_list(args.batch) if args.batch else [base["n_batch"]],
+        "n_gpu_layers": _int_list(args.gpu_layers) if args.gpu_layers else [base["n_gpu_layers"]],
+        "draft": [d.strip() for d in args.draft.split(",") if d.strip()] if args.draft else [base["draft"]],
+        "draft_tokens": _int_list(args.draft_tokens) if args.draft_tokens else [base["draft_tokens"]],
+    }
+
+    runs = []
+    print(f"🏁 [BENCH] Base profile '{base['name']}' | physical cores: {physical_cores()} | logical: {logical_cores()}")
+    for values in itertools.product(*sweep.values()):
+        settings = {**base, **dict(zip(sweep, values))}
+        label = " ".join(f"{key}={value}" for key, value in zip(sweep, values))
+        print(f"⏱️ [BENCH] {label} ...", end=" ", flush=True)
+        try:
+            result = _bench_once(args.model, settings, args.prompt_tokens, args.gen_tokens, args.prompt)
+            accept = f" | draft acceptance {result['acceptance_rate']}" if "acceptance_rate" in result else ""
+            print(f"prompt {result['prompt_tps']} tok/s | gen {result['gen_tps']} tok/s{accept}")
+        except Exception as e:
+            result = {"error": str(e)}
+            print(f"failed: {e}")
+        runs.append({"settings": {**llama_kwargs(settings), **{k: settings[k] for k in _DRAFT_TYPES}}, **result})
+
+    ok = [r for r in runs if r.get("gen_tps")]
+    best = max(ok, key=lambda r: r["gen_tps"]) if ok else None
+    report = {
+        "created_at": datetime.datetime.now().isoformat(),
+        "model": args.model,
+        "machine": {"physical_cores": physical_cores(), "logical_cores": logical_cores(), "gpu_offload": gpu_available()},
+        "base_profile": base,
+        "prompt": args.prompt,
+        "prompt_tokens": args.prompt_tokens,
+        "gen_tokens": args.gen_tokens,
+        "runs": runs,
+        "best_gen": best,
+    }
+    out = args.out or os.path.join("bench_results", f"llm_profile_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n💾 [BENCH] Results written to {out}")
+    if best:
+        print(f"🏆 [BENCH] Fastest generation: {best['gen_tps']} tok/s with {best['settings']}")
+        print(f"   Save it as {PROFILE_FILE} to use it in load_llm.")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sys.exit(bench(sys.argv[2:]))
+    print(json.dumps(resolve_profile(), indent=4))
@@ -0,0 +1,250 @@
+"""
+Load generator for the LetsLearn server.
+
+Start the server with the fake LLM so generation costs a predictable amount of time without a model:
+
+    LETSLEARN_LLM_BACKEND=fake LETSLEARN_FAKE_TPS=30 python server.py
+    python loadgen.py --clients 200 --duration 60 --mix chat=5,quiz=2,notes=2,projects=1 --upload test.pdf
+
+Each client is a thread with its own keep-alive connection that sends requests back to back (closed loop,
+optional --think time). Streaming bodies are read to the end. Per endpoint it reports throughput, p50/p99
+latency and time to first byte, and the 429 / 503 / error rates; the server's /metrics snapshot is attached.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import datetime
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench import percentile
+
+QUERIES = [
+    "What is data mining?",
+    "Explain the star schema.",
+    "What is the difference between OLAP and OLTP?",
+    "How does a decision tree classify data?",
+    "What is ETL in data warehousing?",
+    "Explain association rule mining with an example.",
+]
+TOPICS = ["data warehousing", "olap", "classification", "clustering", "association rules"]
+
+
+class Client:
+    """One keep-alive HTTP connection. Reconnects after any transport error."""
+
+    def __init__(self, base_url, timeout):
+        parsed = urllib.parse.urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """(status, ttfb seconds, total seconds, bytes). Raises on transport errors."""
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        t0 = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            first = response.read(1)
+            ttfb = time.perf_counter() - t0
+            size = len(first) + len(response.read())
+        except Exception:
+            self.close()
+            raise
+        if response.will_close:
+            self.close()
+        return response.status, ttfb, time.perf_counter() - t0, size
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def _multipart(path):
+    boundary = uuid.uuid4().hex
+    with open(path, "rb") as f:
+        content = f.read()
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{os.path.basename(path)}\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n").encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def setup_project(client, project, uploads):
+    quoted = urllib.parse.quote(project)
+    status, *_ = client.request("POST", "/projects", {"name": project})
+    if status not in (200, 400):  # 400: already exists
+        raise RuntimeError(f"Could not create project '{project}' (HTTP {status})")
+    for path in uploads:
+        body, headers = _multipart(path)
+        status, *_ = client.request("POST", f"/projects/{quoted}/upload", body, headers)
+        print(f"📤 [LOADGEN] Uploaded {os.path.basename(path)}: HTTP {status}")
+    status, *_ = client.request("POST", f"/projects/{quoted}/load")
+    if status != 200:
+        raise RuntimeError(f"Could not load project '{project}' (HTTP {status})")
+
+
+def make_request(endpoint, project, rng, cold):
+    """(method, path, body) for one request. `cold` adds a unique suffix so topic caches and pools miss."""
+    quoted = urllib.parse.quote(project)
+    suffix = f" {uuid.uuid4().hex[:6]}" if cold else ""
+    if endpoint == "chat":
+        return "POST", "/chat", {"query": rng.choice(QUERIES) + suffix, "cache": not cold}
+    if endpoint == "quiz":
+        return "POST", f"/projects/{quoted}/quiz", {"count": 5, "fmt": "json", "topic": rng.choice(TOPICS) + suffix}
+    if endpoint == "notes":
+        return "POST", f"/projects/{quoted}/notes", {"topic": rng.choice(TOPICS) + suffix}
+    if endpoint == "projects":
+        return "GET", "/projects", None
+    raise ValueError(f"Unknown endpoint '{endpoint}'")
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # endpoint -> list of (status, ttfb, total, bytes) ; status None = transport error
+
+    def add(self, endpoint, sample):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(sample)
+
+    def report(self, elapsed) -> dict:
+        with self._lock:
+            samples = {k: list(v) for k, v in self.samples.items()}
+        report = {}
+        for endpoint, rows in sorted(samples.items()):
+            n = len(rows)
+            ok = [r for r in rows if r[0] is not None and r[0] < 400]
+            latencies = [r[2] * 1000 for r in ok]
+            ttfb = [r[1] * 1000 for r in ok]
+            count = lambda pred: sum(1 for r in rows if pred(r[0]))
+            report[endpoint] = {
+                "requests": n,
+                "ok": len(ok),
+                "throughput_rps": round(len(ok) / elapsed, 2),
+                "latency_ms": {"p50": _round(percentile(latencies, 50)), "p99": _round(percentile(latencies, 99))},
+                "ttfb_ms": {"p50": _round(percentile(ttfb, 50)), "p99": _round(percentile(ttfb, 99))},
+                "rate_429": round(count(lambda s: s == 429) / n, 4),
+                "rate_503": round(count(lambda s: s == 503) / n, 4),
+                "error_rate": round(count(lambda s: s is None or (s >= 400 and s not in (429, 503))) / n, 4),
+                "status": _status_counts(rows),
+            }
+        return report
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+def _status_counts(rows):
+    counts = {}
+    for status, *_ in rows:
+        key = str(status) if status is not None else "transport_error"
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def worker(args, mix, recorder, deadline, seed):
+    rng = random.Random(seed)
+    client = Client(args.url, args.timeout)
+    endpoints, weights = zip(*mix.items())
+    while time.monotonic() < deadline:
+        endpoint = rng.choices(endpoints, weights)[0]
+        method, path, body = make_request(endpoint, args.project, rng, args.cold)
+        try:
+            sample = client.request(method, path, body)
+        except Exception:
+            sample = (None, 0.0, 0.0, 0)
+        recorder.add(endpoint, sample)
+        if args.think:
+            time.sleep(rng.uniform(0, 2 * args.think) / 1000)
+    client.close()
+
+
+def parse_mix(spec) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="loadgen.py", description="Drive the LetsLearn server with concurrent clients.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--project", default="loadtest")
+    parser.add_argument("--upload", nargs="*", default=[], help="Documents to upload into the project before the run")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load after ramp-up")
+    parser.add_argument("--ramp", type=float, default=5, help="Seconds over which clients start")
+    parser.add_argument("--mix", default="chat=5,quiz=2,notes=2,projects=1", help="endpoint=weight,...")
+    parser.add_argument("--think", type=float, default=0, help="Mean think time between a client's requests (ms)")
+    parser.add_argument("--cold", action="store_true", help="Unique queries/topics so the caches never hit")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON output path (default: bench_results/loadgen_<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    for endpoint in mix:
+        make_request(endpoint, args.project, random.Random(), False)  # Validates names up front
+
+    setup = Client(args.url, args.timeout)
+    setup_project(setup, args.project, args.upload)
+
+    print(f"🚦 [LOADGEN] {args.clients} clients for {args.duration:.0f}s against {args.url} (mix {mix})")
+    recorder = Recorder()
+    start = time.monotonic()
+    deadline = start + args.ramp + args.duration
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        for i in range(args.clients):
+            pool.submit(worker, args, mix, recorder, deadline, args.seed + i)
+            if args.ramp:
+                time.sleep(args.ramp / args.clients)
+    elapsed = time.monotonic() - start
+
+    report = {
+        "created_at": datetime.datetime.now().isoformat(),
+        "url": args.url,
+        "clients": args.clients,
+        "duration_s": round(elapsed, 1),
+        "mix": mix,
+        "cold": args.cold,
+        "endpoints": recorder.report(elapsed),
+    }
+    try:
+        with urllib.request.urlopen(args.url.rstrip("/") + "/metrics", timeout=args.timeout) as response:
+            report["server_metrics"] = json.loads(response.read())
+    except Exception as e:
+        print(f"⚠️ [LOADGEN] Could not fetch /metrics: {e}")
+    setup.close()
+
+    for endpoint, r in report["endpoints"].items():
+        print(f"📊 [LOADGEN] {endpoint:<9} {r['requests']:>6} req | {r['throughput_rps']:>7} ok/s | "
+              f"p50 {r['latency_ms']['p50']} ms, p99 {r['latency_ms']['p99']} ms | "
+              f"429 {r['rate_429']:.1%}, 503 {r['rate_503']:.1%}, errors {r['error_rate']:.1%}")
+
+    out = args.out or os.path.join("bench_results", f"loadgen_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n💾 [LOADGEN] Results written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
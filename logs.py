@@ -0,0 +1,72 @@
+"""
+Logging for LetsLearn.
+
+Log calls only enqueue the record (QueueHandler); a background QueueListener thread does the console writes,
+so request handlers and decode loops never block on a slow terminal or Windows console.
+
+Levels come from LETSLEARN_LOG_LEVEL (default INFO). Token mirroring — echoing every generated token to the
+console, as rag_core used to do with print(..., flush=True) — is off unless LETSLEARN_TOKEN_MIRROR=1.
+"""
+import os
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+
+LOG_LEVEL = os.environ.get("LETSLEARN_LOG_LEVEL", "INFO").upper()
+TOKEN_MIRROR = os.environ.get("LETSLEARN_TOKEN_MIRROR", "0").lower() in ("1", "true", "yes", "on")
+
+ROOT_LOGGER = "letslearn"
+TOKENS_LOGGER = "letslearn.tokens"
+
+_listener = None
+_token_log = logging.getLogger(TOKENS_LOGGER)
+
+
+class _TokenFilter(logging.Filter):
+    """Routes token records to the unterminated handler and everything else to the line handler."""
+
+    def __init__(self, tokens: bool):
+        super().__init__()
+        self.tokens = tokens
+
+    def filter(self, record):
+        return (record.name == TOKENS_LOGGER) == self.tokens
+
+
+def setup_logging(level: str | None = None, mirror_tokens: bool | None = None):
+    """Installs the queue handler and starts the listener thread once. Later calls only adjust settings."""
+    global _listener, TOKEN_MIRROR
+    if mirror_tokens is not None:
+        TOKEN_MIRROR = mirror_tokens
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level or LOG_LEVEL)
+    if _listener is not None:
+        return
+
+    lines = logging.StreamHandler(sys.stdout)
+    lines.setFormatter(logging.Formatter("%(message)s"))
+    lines.addFilter(_TokenFilter(tokens=False))
+    tokens = logging.StreamHandler(sys.stdout)
+    tokens.terminator = ""
+    tokens.addFilter(_TokenFilter(tokens=True))
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, lines, tokens, respect_handler_level=True)
+    _listener.start()
+    # Flush whatever is still queued on exit
+    atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def mirror_token(text: str):
+    """Echoes generated text to the console without a newline, only in verbose token-mirroring mode."""
+    if TOKEN_MIRROR:
+        _token_log.info(text)
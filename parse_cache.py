@@ -0,0 +1,102 @@
+"""
+Parsed-text artifacts, so unchanged documents are not re-extracted on every project load.
+
+Each parse is stored as gzip-compressed JSON next to the other per-content data:
+    data/parsed/<first 2 hex>/<sha256>.v<PARSER_VERSION>.json.gz
+    {"parser_version": 1, "kind": "page" | "slide" | "text", "segments": [...], "ext": ".pdf", "created_at": ...}
+The key is the file's SHA-256 (the blob digest for uploads) plus doc_parser.PARSER_VERSION, so a document is
+only parsed again when its bytes change or the parser is upgraded. Failed extractions are not cached.
+
+LETSLEARN_PARSE_CACHE=0 turns it off.
+"""
+import os
+import json
+import gzip
+import hashlib
+import datetime
+
+from doc_parser import PARSER_VERSION, parse_segments
+from tracing import cache_event
+from logs import get_logger
+
+log = get_logger("parse_cache")
+
+ENABLED = os.environ.get("LETSLEARN_PARSE_CACHE", "1").lower() in ("1", "true", "yes", "on")
+CACHE_DIR = os.path.join("data", "parsed")
+
+
+def file_digest(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def artifact_path(digest: str, version: int = PARSER_VERSION) -> str:
+    return os.path.join(CACHE_DIR, digest[:2], f"{digest}.v{version}.json.gz")
+
+
+def load_artifact(digest: str):
+    try:
+        with gzip.open(artifact_path(digest), "rt", encoding="utf-8") as f:
+            artifact = json.load(f)
+        if artifact.get("parser_version") != PARSER_VERSION:
+            return None
+        return artifact
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError) as e:
+        log.warning(f"⚠️ [PARSE CACHE] Unreadable artifact for {digest[:12]}, reparsing: {e}")
+        return None
+
+
+def _save_artifact(digest: str, artifact: dict):
+    path = artifact_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(artifact, f)
+    os.replace(tmp_path, path)
+    # Artifacts from older parser versions are never read again
+    folder = os.path.dirname(path)
+    for name in os.listdir(folder):
+        if name.startswith(f"{digest}.v") and name != os.path.basename(path) and not name.endswith(".tmp"):
+            os.remove(os.path.join(folder, name))
+
+
+def parsed_segments(filepath: str, digest: str | None = None):
+    """
+    (kind, segments) for a document, from its artifact when one exists for this content and parser version.
+    `digest` is the file's SHA-256 if the caller already knows it. Returns None if the file can't be parsed.
+    """
+    if not os.path.exists(filepath):
+        log.info(f"Error: File not found at {filepath}")
+        return None
+    if ENABLED:
+        digest = digest or file_digest(filepath)
+        artifact = load_artifact(digest)
+        cache_event("parse", artifact is not None)
+        if artifact is not None:
+            log.info(f"♻️ [PARSE CACHE] Reusing parsed text of {os.path.basename(filepath)} ({len(artifact['segments'])} {artifact['kind']} segments).")
+            return artifact["kind"], artifact["segments"]
+    try:
+        parsed = parse_segments(filepath)
+    except Exception as e:
+        log.error(f"❌ Error parsing {filepath}: {e}")
+        return None
+    if parsed is None:
+        log.info(f"Unsupported file type: {os.path.splitext(filepath)[1].lower()}")
+        return None
+    kind, segments = parsed
+    log.info(f"📄 [PARSER] Extracted {sum(len(s) for s in segments)} characters ({len(segments)} {kind} segments) from {os.path.basename(filepath)}.")
+    if ENABLED:
+        _save_artifact(digest, {
+            "parser_version": PARSER_VERSION,
+            "kind": kind,
+            "segments": segments,
+            "ext": os.path.splitext(filepath)[1].lower(),
+            "created_at": datetime.datetime.now().isoformat(),
+        })
+    return kind, segments
+
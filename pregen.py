@@ -0,0 +1,291 @@
+import json
+import re
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+from rag_core import (
+    generate_topics, generate_notes, generate_quiz, generate_flashcards, generate_section_summary, parse_quiz_json
+)
+from quiz_pool import add_questions
+from section_summaries import next_missing, store_summary, reduce_inputs
+from logs import get_logger
+
+log = get_logger("pregen")
+
+# Default per-project pool targets. Override per project via projects.json -> "pregen".
+DEFAULT_PREGEN_CONFIG = {
+    "enabled": True,
+    "quiz_pool": 10,     # Questions to keep ready per topic
+    "quiz_batch": 5,     # Questions generated per background job
+    "flashcards": 5,     # Flashcards generated per topic (0 disables)
+    "notes": True,       # Pre-generate study notes per topic
+}
+
+
+def get_pregen_config(project: dict) -> dict:
+    """Merges a project's stored pregen settings over the defaults."""
+    return {**DEFAULT_PREGEN_CONFIG, **project.get("pregen", {})}
+
+
+def parse_topics(raw) -> list:
+    """Extracts the topic list from the cached (raw LLM) topics string."""
+    if not raw:
+        return []
+    if isinstance(raw, list):
+        return raw
+    match = re.search(r'\[.*\]', raw, re.DOTALL)
+    if not match:
+        return []
+    try:
+        topics = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return []
+    return [t for t in topics if isinstance(t, str) and t.strip()]
+
+
+class PregenScheduler:
+    """
+    Background worker that summarizes the active project's document sections, then fills the
+    quiz, flashcard and notes caches for every topic while the LLM is idle.
+
+    Interactive requests take the LLM through `interactive()`. Any pending interactive
+    request makes the running background job stop at the next token and release the lock.
+    """
+
+    def __init__(self, llm_lock, get_llm, get_active_project, load_data, save_data, data_lock=None,
+                 idle_seconds=3.0, poll_seconds=2.0, max_failures=3):
+        self.llm_lock = llm_lock
+        self.get_llm = get_llm
+        self.get_active_project = get_active_project
+        self.load_data = load_data
+        self.save_data = save_data
+        self.data_lock = data_lock or threading.RLock()  # Held across each read-modify-write of the projects data
+        self.idle_seconds = idle_seconds
+        self.poll_seconds = poll_seconds
+        self.max_failures = max_failures
+
+        self._state_lock = threading.Lock()
+        self._interactive_waiting = 0
+        self._last_interactive = 0.0
+        self._job = None  # (project, kind, topic) currently holding the LLM
+        self._stop = threading.Event()
+        self._thread = None
+        self._failures = {}  # (project, kind, topic key) -> failed attempts, so a bad job can't loop forever
+
+    # ---- Interactive side ----
+
+    @asynccontextmanager
+    async def interactive(self):
+        """
+        Acquires the LLM for a user request, pre-empting any background job. The wait happens in a worker
+        thread, so the event loop keeps serving other requests while a job winds down.
+        """
+        with self._state_lock:
+            self._interactive_waiting += 1
+        try:
+            acquire = asyncio.ensure_future(asyncio.to_thread(self.llm_lock.acquire))
+            try:
+                await asyncio.shield(acquire)
+            except asyncio.CancelledError:
+                # The thread still ends up holding the lock; hand it straight back
+                acquire.add_done_callback(lambda _: self.llm_lock.release())
+                raise
+            try:
+                yield
+            finally:
+                self.llm_lock.release()
+        finally:
+            with self._state_lock:
+                self._interactive_waiting -= 1
+                self._last_interactive = time.monotonic()
+
+    def llm_busy(self) -> bool:
+        """True when the LLM is held or awaited by an interactive request (background jobs don't count)."""
+        return self._interactive_waiting > 0 or (self.llm_lock.locked() and self._job is None)
+
+    def _should_yield(self) -> bool:
+        return self._interactive_waiting > 0 or self._stop.is_set()
+
+    def _is_idle(self) -> bool:
+        with self._state_lock:
+            if self._interactive_waiting > 0:
+                return False
+            return time.monotonic() - self._last_interactive >= self.idle_seconds
+
+    # ---- Lifecycle ----
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="pregen", daemon=True)
+        self._thread.start()
+        log.info("🗓️ [PREGEN] Background pre-generation scheduler started.")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def status(self) -> dict:
+        job = self._job
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "current_job": {"project": job[0], "kind": job[1], "topic": job[2]} if job else None,
+            "interactive_waiting": self._interactive_waiting,
+        }
+
+    # ---- Worker ----
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                ran = self._tick()
+            except Exception as e:
+                log.warning(f"⚠️ [PREGEN] Job failed: {e}")
+                ran = False
+            # Go straight to the next job after a successful one, otherwise back off
+            if not ran:
+                self._stop.wait(self.poll_seconds)
+
+    def _tick(self) -> bool:
+        llm = self.get_llm()
+        project_name = self.get_active_project()
+        if not llm or not project_name or not self._is_idle():
+            return False
+
+        data = self.load_data()
+        project = data["projects"].get(project_name)
+        if not project:
+            return False
+        config = get_pregen_config(project)
+        if not config["enabled"]:
+            return False
+
+        job = self._next_job(project_name, project, config)
+        if not job:
+            return False
+        return self._run_job(llm, project_name, config, *job)
+
+    def _next_job(self, project_name: str, project: dict, config: dict):
+        """
+        Picks the next missing cache entry. Section summaries go first since topics are reduced from them,
+        and notes before quizzes and flashcards since those use them as context.
+        """
+        cache = project["cache"]
+
+        def wanted(kind, key):
+            return self._failures.get((project_name, kind, key), 0) < self.max_failures
+
+        section = next_missing(project_name)
+        if section and wanted("sections", section[0]):
+            return ("sections", section[0])
+
+        if cache.get("topics") is None:
+            return ("topics", None) if wanted("topics", None) else None
+
+        for topic in parse_topics(cache["topics"]):
+            key = topic.lower().strip()
+            if config["notes"] and key not in cache.get("notes", {}) and wanted("notes", key):
+                return ("notes", topic)
+            pool = cache.get("quizzes", {}).get(key, [])
+            if isinstance(pool, list) and len(pool) < config["quiz_pool"] and wanted("quiz", key):
+                return ("quiz", topic)
+            if config["flashcards"] > 0 and key not in cache.get("flashcards", {}) and wanted("flashcards", key):
+                return ("flashcards", topic)
+        return None
+
+    def _run_job(self, llm, project_name, config, kind, topic) -> bool:
+        # Set before acquiring so llm_busy() never mistakes the job for an interactive holder
+        self._job = (project_name, kind, topic)
+        if not self.llm_lock.acquire(blocking=False):
+            self._job = None
+            return False
+        # Section jobs carry the section hash in place of a topic
+        key = topic.lower().strip() if topic else None
+        try:
+            if self._should_yield():
+                return False
+            log.info(f"\n🗓️ [PREGEN] Pre-generating {kind} for '{project_name}'" + (f" / '{topic}'" if topic else ""))
+
+            cache = self.load_data()["projects"][project_name]["cache"]
+            extra_context = cache.get("notes", {}).get(key, "") if key else ""
+            if kind == "sections":
+                missing = next_missing(project_name)
+                if not missing or missing[0] != topic:
+                    return False
+                stream = generate_section_summary(llm, missing[1])
+            elif kind == "topics":
+                section_summaries = reduce_inputs(llm, project_name, should_stop=self._should_yield)
+                if self._should_yield():
+                    log.info("\n⏸️ [PREGEN] Yielding to interactive request before reducing topics.")
+                    return False
+                stream = generate_topics(llm, section_summaries=section_summaries)
+            elif kind == "notes":
+                stream = generate_notes(llm, topic)
+            elif kind == "quiz":
+                pool = cache.get("quizzes", {}).get(key, [])
+                count = min(config["quiz_batch"], config["quiz_pool"] - len(pool))
+                stream = generate_quiz(llm, count, "json", topic, extra_context=extra_context)
+            else:
+                stream = generate_flashcards(llm, config["flashcards"], topic, extra_context=extra_context)
+
+            full_response = []
+            for chunk in stream:
+                if self._should_yield():
+                    log.info(f"\n⏸️ [PREGEN] Yielding to interactive request, dropping partial {kind}.")
+                    stream.close()
+                    return False
+                text = chunk["choices"][0].get("text", "")
+                if text:
+                    full_response.append(text)
+        finally:
+            self._job = None
+            self.llm_lock.release()
+
+        self._store(project_name, kind, key, "".join(full_response))
+        return True
+
+    def _store(self, project_name, kind, key, raw):
+        with self.data_lock:
+            self._store_locked(project_name, kind, key, raw)
+
+    def _store_locked(self, project_name, kind, key, raw):
+        data = self.load_data()  # Reload to avoid clobbering writes made while generating
+        project = data["projects"].get(project_name)
+        if not project:
+            return
+        cache = project["cache"]
+        if kind == "sections":
+            if not store_summary(project_name, key, raw):
+                failure = (project_name, kind, key)
+                self._failures[failure] = self._failures.get(failure, 0) + 1
+                return
+            log.info(f"💾 [PREGEN] Saved section summary: {key}")
+            return
+        if kind == "topics":
+            if cache.get("topics") is None:
+                cache["topics"] = raw
+        elif kind == "notes":
+            cache.setdefault("notes", {}).setdefault(key, raw)
+        elif kind == "flashcards":
+            cache.setdefault("flashcards", {}).setdefault(key, raw)
+        else:
+            new_qs = parse_quiz_json(raw)
+            if not new_qs:
+                log.warning("⚠️ [PREGEN] Failed to find valid JSON array in LLM response.")
+                failure = (project_name, kind, key)
+                self._failures[failure] = self._failures.get(failure, 0) + 1
+                return
+            pool = cache.setdefault("quizzes", {}).get(key, [])
+            if isinstance(pool, str):
+                pool = []
+            if not add_questions(project_name, pool, new_qs):
+                # Only duplicates came back; count it so a saturated topic doesn't regenerate forever
+                failure = (project_name, kind, key)
+                self._failures[failure] = self._failures.get(failure, 0) + 1
+            cache["quizzes"][key] = pool
+        self.save_data(data)
+        log.info(f"💾 [PREGEN] Saved {kind}" + (f" for topic: '{key}'" if key else ""))
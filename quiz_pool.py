@@ -0,0 +1,291 @@
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+
+import numpy as np
+
+from rag_core import embed
+from logs import get_logger
+
+log = get_logger("quiz_pool")
+
+DATA_DIR = "data"
+# Cosine similarity (bge vectors are normalized) above which two questions count as the same
+NEAR_DUPLICATE_THRESHOLD = 0.92
+
+# Serializes read-modify-write of the embedding sidecars (request handlers + pregen thread)
+_index_lock = threading.Lock()
+
+
+def question_hash(question: dict) -> str:
+    """Stable id for a question: hash of its normalized text, so rewordings in case/spacing/punctuation collide."""
+    text = re.sub(r"[^a-z0-9 ]", "", " ".join(question.get("question", "").lower().split()))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _index_path(project_name: str) -> str:
+    return os.path.join(DATA_DIR, project_name, "quiz_index.npz")
+
+
+def _load_index(project_name: str) -> dict:
+    """Loads the per-project {hash: embedding} sidecar. Embeddings live outside projects.json to keep it small."""
+    path = _index_path(project_name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with np.load(path) as npz:
+            return dict(zip(npz["hashes"].tolist(), npz["vectors"]))
+    except Exception as e:
+        log.warning(f"⚠️ [QUIZ POOL] Could not read embedding index, rebuilding: {e}")
+        return {}
+
+
+def _save_index(project_name: str, index: dict):
+    path = _index_path(project_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    hashes = np.array(list(index.keys()))
+    vectors = np.stack(list(index.values())).astype(np.float16) if index else np.zeros((0, 0), dtype=np.float16)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, hashes=hashes, vectors=vectors)
+    os.replace(tmp_path, path)
+
+
+def add_questions(project_name: str, pool: list, new_qs: list, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> list:
+    """
+    Inserts new questions into a topic pool in place, skipping exact and near-duplicates.
+    Every pooled question gets a "hash" field; its bge embedding is kept in the project's sidecar index.
+    Returns the accepted questions.
+    """
+    candidates = []
+    seen = set()
+    unique = []
+    for q in pool:
+        q.setdefault("hash", question_hash(q))
+        if q["hash"] not in seen:
+            seen.add(q["hash"])
+            unique.append(q)
+    # Compact exact duplicates left over from pools that were appended blindly
+    pool[:] = unique
+    for q in new_qs:
+        h = question_hash(q)
+        if h in seen:
+            continue
+        seen.add(h)
+        candidates.append({**q, "hash": h})
+    if not candidates:
+        log.info(f"♻️ [QUIZ POOL] All {len(new_qs)} new question(s) were exact duplicates.")
+        return []
+
+    with _index_lock:
+        index = _load_index(project_name)
+
+        # Backfill embeddings for older pool entries and embed the candidates in a single batch
+        missing = [q for q in pool if q["hash"] not in index]
+        to_embed = missing + candidates
+        vectors = np.asarray(embed([q.get("question", "") for q in to_embed]), dtype=np.float32)
+        for q, v in zip(missing, vectors[:len(missing)]):
+            index[q["hash"]] = v
+        cand_vectors = vectors[len(missing):]
+
+        pool_matrix = (
+            np.stack([index[q["hash"]] for q in pool]).astype(np.float32)
+            if pool else np.zeros((0, cand_vectors.shape[1]), dtype=np.float32)
+        )
+        accepted = []
+        for q, v in zip(candidates, cand_vectors):
+            if pool_matrix.shape[0] and float(np.max(pool_matrix @ v)) >= threshold:
+                continue
+            accepted.append(q)
+            pool.append(q)
+            index[q["hash"]] = v
+            pool_matrix = np.vstack([pool_matrix, v[None, :]])
+
+        _save_index(project_name, index)
+
+    rejected = len(new_qs) - len(accepted)
+    log.info(f"🧮 [QUIZ POOL] Accepted {len(accepted)} new question(s), rejected {rejected} duplicate(s). Pool size: {len(pool)}")
+    return accepted
+
+
+# ---- Adaptive (spaced-repetition) sampling ----
+
+# Leitner boxes: a correct answer promotes a question one box, a miss sends it back to box 0.
+# Hours until a question in each box is due for review again.
+REVIEW_INTERVALS_HOURS = [0, 24, 72, 168, 504]
+# Weight of a question that has been seen but is not due yet (still drawable, just unlikely)
+NOT_DUE_WEIGHT = 0.05
+
+# (project, topic names) -> cached per-topic samplers; answers update them in place (see record_attempts)
+_sampler_cache = {}
+_sampler_lock = threading.Lock()
+
+
+def record_attempts(project_name: str, project: dict, attempts: list):
+    """
+    Folds answered questions ({"hash", "correct"}) into the project's per-question stats.
+    Stats are stored compactly as hash -> [attempts, correct, box, last_seen_epoch].
+    """
+    stats = project.setdefault("question_stats", {})
+    now = int(time.time())
+    for a in attempts:
+        h = a.get("hash")
+        if not h:
+            continue
+        s = stats.setdefault(h, [0, 0, 0, 0])
+        s[0] += 1
+        if a.get("correct"):
+            s[1] += 1
+            s[2] = min(s[2] + 1, len(REVIEW_INTERVALS_HOURS) - 1)
+        else:
+            s[2] = 0
+        s[3] = now
+    _update_samplers(project_name, {a["hash"]: stats[a["hash"]] for a in attempts if a.get("hash")}, now)
+
+
+def _update_samplers(project_name: str, changed: dict, now: float):
+    """Point-updates the answered questions' weights in this project's cached samplers (O(log n) each)."""
+    with _sampler_lock:
+        for (project, _), cached in _sampler_cache.items():
+            if project != project_name:
+                continue
+            for h, stat in changed.items():
+                weight = _question_weight(stat, now)
+                for seg, i in cached["positions"].get(h, ()):
+                    cached["trees"][seg].set(i, weight)
+
+
+def _topic_weight(mastery_entry) -> float:
+    """Weaker topics weigh more: 1.25 at 0% accuracy down to 0.25 at 100%. Untested topics count as weak."""
+    if not mastery_entry:
+        return 1.0
+    return 0.25 + (1 - mastery_entry.get("accuracy", 0) / 100)
+
+
+def _question_weight(stat, now: float) -> float:
+    if not stat:
+        return 1.0  # Never answered
+    attempts, correct, box, last_seen = stat
+    interval = REVIEW_INTERVALS_HOURS[box] * 3600
+    if now < last_seen + interval:
+        return NOT_DUE_WEIGHT
+    # Overdue questions and historically missed ones rise in priority
+    overdue = min(1.0, (now - last_seen - interval) / max(interval, 3600))
+    miss_rate = (attempts - correct) / attempts if attempts else 0
+    return (1 + overdue) * (1 + miss_rate)
+
+
+class _FenwickSampler:
+    """Fenwick tree over item weights: O(n) build, O(log n) point update and draw."""
+
+    def __init__(self, weights):
+        self.n = len(weights)
+        self.weights = list(weights)
+        self.tree = [0.0] + self.weights
+        for i in range(1, self.n + 1):
+            parent = i + (i & -i)
+            if parent <= self.n:
+                self.tree[parent] += self.tree[i]
+        self.total = sum(self.weights)
+
+    def set(self, i, weight):
+        self._add(i, weight - self.weights[i])
+        self.weights[i] = weight
+
+    def _add(self, i, delta):
+        self.total += delta
+        i += 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def _find(self, x):
+        """Index of the item whose cumulative weight range contains x."""
+        pos = 0
+        step = 1 << self.n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= x:
+                pos = nxt
+                x -= self.tree[nxt]
+            step >>= 1
+        return min(pos, self.n - 1)
+
+
+
+def _draw(trees: list, topic_weights: list, k: int) -> list:
+    """
+    Draws up to k distinct (segment, index) pairs without replacement. A segment is chosen in proportion to
+    its topic weight times its tree's total, then an item within it: the same distribution as one flat tree of
+    topic_weight * question_weight, but mastery changes never touch the trees.
+    """
+    picked = []
+    want = min(k, sum(t.n for t in trees))
+    draws = 0
+    while len(picked) < want and draws < 4 * want + 8:
+        masses = [w * t.total if t.n else 0.0 for w, t in zip(topic_weights, trees)]
+        total = sum(masses)
+        if total <= 1e-9:
+            break
+        draws += 1
+        x = random.random() * total
+        seg = 0
+        while seg < len(masses) - 1 and (x >= masses[seg] or not trees[seg].n):
+            x -= masses[seg]
+            seg += 1
+        tree = trees[seg]
+        i = tree._find(random.random() * tree.total)
+        if (seg, i) in picked or tree.weights[i] <= 0:
+            continue  # Float drift landed on an already-drawn slot
+        picked.append((seg, i))
+        tree._add(i, -tree.weights[i])
+    # Restore removed weights so the cached trees can be reused by the next request
+    for seg, i in picked:
+        trees[seg]._add(i, trees[seg].weights[i])
+    return picked
+
+
+def sample_adaptive(project_name: str, project: dict, segments: list, count: int) -> list:
+    """
+    Draws `count` questions across one or more topic pools, weighted by topic weakness (from "mastery")
+    and per-question spaced-repetition state (from "question_stats").
+    `segments` is a list of (topic_name, pool) pairs; pools are indexed in place, never concatenated.
+    Returns copies with shuffled options and a "topic" field.
+    """
+    if not any(pool for _, pool in segments):
+        return []
+
+    now = time.time()
+    signature = (
+        tuple((name, len(pool), pool[-1].get("hash") if pool else None) for name, pool in segments),
+        int(now // 3600),  # Dueness drifts with time; rebuild at most hourly
+    )
+    cache_key = (project_name, tuple(name for name, _ in segments))
+    # Topic weights are per request (a handful of topics); question weights live in the cached trees
+    mastery = {k.lower().strip(): v for k, v in project.get("mastery", {}).items()}
+    topic_weights = [_topic_weight(mastery.get(name.lower().strip())) for name, _ in segments]
+
+    with _sampler_lock:
+        cached = _sampler_cache.get(cache_key)
+        if not cached or cached["signature"] != signature:
+            stats = project.get("question_stats", {})
+            positions = {}
+            trees = []
+            for seg, (_, pool) in enumerate(segments):
+                for i, q in enumerate(pool):
+                    positions.setdefault(q.get("hash"), []).append((seg, i))
+                trees.append(_FenwickSampler([_question_weight(stats.get(q.get("hash")), now) for q in pool]))
+            cached = {"signature": signature, "trees": trees, "positions": positions}
+            _sampler_cache[cache_key] = cached
+        picked = _draw(cached["trees"], topic_weights, count)
+
+    return [quiz_item(segments[seg][1][i], segments[seg][0]) for seg, i in picked]
+
+
+def quiz_item(q: dict, topic: str) -> dict:
+    """A pooled question as served: a copy with shuffled options and a "topic" field."""
+    options = list(q["options"])
+    random.shuffle(options)
+    return {**q, "options": options, "topic": q.get("topic") or topic}
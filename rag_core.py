@@ -1,8 +1,18 @@
 import os
+import re
 import json
-import chromadb
+import time
 import logging
 import warnings
+import threading
+from collections import OrderedDict
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from tracing import span, traced_tokens, cache_event
+from logs import get_logger, mirror_token
+from llm_backends import LLM_BACKEND, FakeLLM
+
+log = get_logger("rag")
 
 # Strictly disable HuggingFace network calls and warnings (Forces fully offline mode)
 os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
@@ -16,81 +26,248 @@ warnings.filterwarnings("ignore", category=UserWarning)
 logging.getLogger("transformers").setLevel(logging.ERROR)
 logging.getLogger("sentence_transformers").setLevel(logging.ERROR)
 
-from llama_cpp import Llama
-import llama_cpp
-from sentence_transformers import SentenceTransformer
-import transformers
-
-transformers.logging.set_verbosity_error()
+# Heavy dependencies (llama_cpp, sentence_transformers, transformers, chromadb) are imported
+# lazily inside their loaders so `import rag_core` stays cheap and models can load in parallel.
 
 def check_gpu_support():
     """Checks if llama-cpp-python was correctly compiled with CUDA/GPU support."""
+    import llama_cpp
     try:
         # Depending on the version, standard method to check
         supports_gpu = llama_cpp.llama_supports_gpu_offload()
         if supports_gpu:
-            print("🟢 [HARDWARE] CUDA/GPU Acceleration is ENABLED and WORKING!")
+            log.info("🟢 [HARDWARE] CUDA/GPU Acceleration is ENABLED and WORKING!")
         else:
-            print("🔴 [HARDWARE] WARNING: Running in SLOW CPU Mode. (GPU wheel not detected)")
+            log.warning("🔴 [HARDWARE] WARNING: Running in SLOW CPU Mode. (GPU wheel not detected)")
     except AttributeError:
-        print("🟡 [HARDWARE] Unknown acceleration status (old llama-cpp version)")
+        log.warning("🟡 [HARDWARE] Unknown acceleration status (old llama-cpp version)")
 
 
-def load_llm(model_path="models/mistral.gguf"):
+def load_llm(model_path="models/mistral.gguf", profile=None):
+    """
+    Loads the GGUF model with the runtime profile from llm_profile (preset, llm_profile.json, env).
+    With LETSLEARN_LLM_BACKEND=fake no model is loaded; a FakeLLM streams canned text instead (see llm_backends).
+    """
+    if LLM_BACKEND == "fake":
+        llm = FakeLLM.from_env()
+        log.info(f"🧪 [LLM] Using fake backend: {llm!r}")
+        return llm
     if not os.path.exists(model_path):
-        print(f"Warning: Model not found at {model_path}.")
+        log.warning(f"Warning: Model not found at {model_path}.")
         return None
         
+    from llama_cpp import Llama
+    from llm_profile import resolve_profile, llama_kwargs, build_draft_model, check_draft_vocab
     check_gpu_support()
-    print("Loading LLM...")
-    return Llama(
+    settings = resolve_profile(profile)
+    log.info(f"Loading LLM with profile '{settings.get('name', 'custom')}': {llama_kwargs(settings)}")
+    # Speculative decoding (profile "draft"): prompt lookup or a small GGUF drafts tokens the main model verifies
+    draft_model = build_draft_model(settings)
+    if draft_model is not None:
+        log.info(f"Speculative decoding: draft={settings['draft']} draft_tokens={settings['draft_tokens']}")
+    llm = Llama(
         model_path=model_path,
-        n_gpu_layers=25,   # Offload exactly 25 layers (~3.5GB) to fit RTX 2050 4GB VRAM limit
-        n_ctx=8192,        # Fast 8K semantic context window
-        n_threads=4,       # Standard optimal threads
-        n_batch=512,       # Massive prompt batching speedup due to GPU cores
-        use_mlock=False,   
-        flash_attn=True,   
-        verbose=False
+        verbose=False,
+        draft_model=draft_model,
+        **llama_kwargs(settings)
     )
+    return check_draft_vocab(llm)
+
+
+EMBEDDER_NAME = "BAAI/bge-small-en-v1.5"
+embedder = None
+_embedder_lock = threading.Lock()
 
 
-# Initialize embedder silently
-embedder = SentenceTransformer("BAAI/bge-small-en-v1.5")
+def load_embedder():
+    """
+    Loads the bge embedder once (backend from LETSLEARN_EMBEDDER, see embedders.py).
+    Concurrent callers wait for the first load instead of loading twice.
+    """
+    global embedder
+    if embedder is not None:
+        return embedder
+    with _embedder_lock:
+        if embedder is None:
+            from embedders import load_embedder as load_backend
+            embedder = load_backend(EMBEDDER_NAME)
+    return embedder
 
 
 def embed(texts):
-    return embedder.encode(texts, normalize_embeddings=True).tolist()
+    model = load_embedder()
+    with span("embed", texts=len(texts)):
+        return model.encode(texts).tolist()
+
+
+_embedding_cache = None
+
+
+def embed_chunks(chunks):
+    """Document chunk embeddings through the shared on-disk cache (embedding_cache.py); queries use embed()."""
+    global _embedding_cache
+    from embedding_cache import EmbeddingCache, ENABLED as EMBEDDING_CACHE_ENABLED
+    if not EMBEDDING_CACHE_ENABLED:
+        return embed(chunks)
+    model = load_embedder()
+    with _embedder_lock:
+        if _embedding_cache is None or _embedding_cache.model_id != model.model_id:
+            _embedding_cache = EmbeddingCache(model.model_id)
+    cache = _embedding_cache
+    hits_before = cache.stats["hits"]
+    vectors = cache.embed(chunks, embed)
+    hits = cache.stats["hits"] - hits_before
+    cache_event("embedding", hits == len(chunks))
+    if hits:
+        log.info(f"♻️ [EMBED CACHE] {hits}/{len(chunks)} chunk embeddings reused.")
+    return vectors
+
+
+# Optional cross-encoder reranking of a wider candidate set (LETSLEARN_RERANK=1).
+# Download once with `python download_model.py`; it loads offline like the embedder.
+RERANKER_NAME = os.environ.get("LETSLEARN_RERANKER", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_ENABLED = os.environ.get("LETSLEARN_RERANK", "0").lower() in ("1", "true", "yes", "on")
+RERANK_CANDIDATES = int(os.environ.get("LETSLEARN_RERANK_CANDIDATES", "30"))
+# Scoring stops after the batch that crosses the budget; unscored candidates keep first-stage order
+RERANK_BUDGET_MS = float(os.environ.get("LETSLEARN_RERANK_BUDGET_MS", "250"))
+RERANK_BATCH_SIZE = 8
+RERANK_CACHE_SIZE = 256
+reranker = None
+_reranker_lock = threading.Lock()
+_rerank_cache = OrderedDict()  # (collection version, mode, candidates, query) -> reranked records
+_rerank_cache_lock = threading.Lock()
+
+
+def load_reranker():
+    """Loads the cross-encoder once. Returns None (reranking is skipped) if it isn't available locally."""
+    global reranker, RERANK_ENABLED
+    if reranker is not None:
+        return reranker
+    with _reranker_lock:
+        if reranker is None and RERANK_ENABLED:
+            try:
+                from sentence_transformers import CrossEncoder
+                reranker = CrossEncoder(RERANKER_NAME, max_length=512)
+            except Exception as e:
+                log.warning(f"⚠️ [RERANK] Could not load {RERANKER_NAME}, reranking disabled: {e}")
+                RERANK_ENABLED = False
+    return reranker
+
+
+def rerank(query, records, budget_ms=None):
+    """
+    Reorders candidate records by cross-encoder relevance, scoring in batches in first-stage order
+    until `budget_ms` runs out. Returns (records, fully_scored).
+    """
+    model = load_reranker()
+    if model is None or not records:
+        return records, False
+    budget_ms = RERANK_BUDGET_MS if budget_ms is None else budget_ms
+    t0 = time.perf_counter()
+    scored = []
+    for start in range(0, len(records), RERANK_BATCH_SIZE):
+        batch = records[start:start + RERANK_BATCH_SIZE]
+        scores = model.predict([(query, r["text"]) for r in batch], batch_size=RERANK_BATCH_SIZE)
+        scored.extend(zip(batch, (float(s) for s in scores)))
+        if (time.perf_counter() - t0) * 1000 >= budget_ms:
+            break
+    elapsed = (time.perf_counter() - t0) * 1000
+    rest = records[len(scored):]
+    ordered = [r for r, _ in sorted(scored, key=lambda rs: rs[1], reverse=True)] + rest
+    if rest:
+        log.info(f"⏱️ [RERANK] Budget {budget_ms:.0f} ms hit: scored {len(scored)}/{len(records)} candidates in {elapsed:.0f} ms.")
+    else:
+        log.debug(f"🎯 [RERANK] Reranked {len(records)} candidates in {elapsed:.0f} ms.")
+    return [{**r, "rank": rank} for rank, r in enumerate(ordered)], not rest
 
 
 db_path = os.path.join(os.path.dirname(__file__), "chroma_db")
-client = chromadb.PersistentClient(path=db_path)
-logging.getLogger("chromadb").setLevel(logging.ERROR)
-collection = client.get_or_create_collection("letslearn")
+# "chroma", or "numpy" for the memory-mapped int8/float16 store in vector_store.py (kept under db_path/numpy)
+VECTOR_STORE = os.environ.get("LETSLEARN_VECTOR_STORE", "chroma")
+client = None
+collection = None
+_db_lock = threading.Lock()
+# Bumped on every change to the indexed documents; keys retrieval caches
+collection_version = 0
+
+# "hybrid" fuses BM25 keyword hits with vector hits; "vector" is the plain Chroma path
+RETRIEVAL_MODE = os.environ.get("LETSLEARN_RETRIEVAL", "hybrid")
+# Candidates taken from each ranking before fusion
+HYBRID_CANDIDATES = 20
+# In-memory until a project opens its persisted index (see open_keyword_index)
+keyword_index = BM25Index()
+
+
+def get_collection():
+    """Opens the persistent Chroma client and collection (or the NumPy vector store) on first use."""
+    global client, collection
+    if collection is not None:
+        return collection
+    with _db_lock:
+        if collection is None and VECTOR_STORE == "numpy":
+            from vector_store import NumpyVectorStore
+            collection = NumpyVectorStore(os.path.join(db_path, "numpy"))
+        elif collection is None:
+            import chromadb
+            client = chromadb.PersistentClient(path=db_path)
+            logging.getLogger("chromadb").setLevel(logging.ERROR)
+            collection = client.get_or_create_collection("letslearn")
+    return collection
 
 
 def add_docs(chunks, source="manual_add"):
     if not chunks:
-        print(f"⚠️  [RAG] No chunks to embed for source: {source}")
+        log.warning(f"⚠️  [RAG] No chunks to embed for source: {source}")
         return
-    print(f"🚀 [RAG] Embedding {len(chunks)} chunks from source: {source}...")
-    vectors = embed(chunks)
+    log.info(f"🚀 [RAG] Embedding {len(chunks)} chunks from source: {source}...")
+    vectors = embed_chunks(chunks)
+    collection = get_collection()
     start_id = collection.count()
     ids = [f"doc_{start_id + i}" for i in range(len(chunks))]
-    metadatas = [{"source": source} for _ in chunks]
+    # Chunk position lets the context assembler stitch neighbouring (overlapping) chunks back together
+    metadatas = [{"source": source, "chunk": i} for i in range(len(chunks))]
     collection.add(
         documents=chunks,
         embeddings=vectors,
         metadatas=metadatas,
         ids=ids
     )
-    print(f"✅ [RAG] Successfully embedded into Vector DB. Total docs now: {collection.count()}")
+    log.info(f"✅ [RAG] Successfully embedded into Vector DB. Total docs now: {collection.count()}")
+    _bump_collection_version()
+    # Persisted by the caller once per batch (keyword_index.save()); saving per file rewrites the whole index each time
+    if keyword_index.add_source(source, chunks):
+        log.info(f"📇 [BM25] Indexed {len(chunks)} chunks from {source}.")
+    else:
+        log.info(f"📇 [BM25] {source} unchanged, reusing stored postings.")
+
+
+def open_keyword_index(project_dir):
+    """Switches the BM25 index to a project's persisted one. Call after clear_db when loading a project."""
+    global keyword_index
+    keyword_index = BM25Index.open(project_dir)
+    _bump_collection_version()
+    return keyword_index
+
+
+def _bump_collection_version():
+    global collection_version
+    with _rerank_cache_lock:
+        collection_version += 1
+        _rerank_cache.clear()
 
 def clear_db():
-    global collection
-    client.delete_collection("letslearn")
-    collection = client.create_collection("letslearn")
-    print("🗑️  Vector Database cleared.")
+    global collection, keyword_index
+    get_collection()
+    with _db_lock:
+        if VECTOR_STORE == "numpy":
+            collection.reset()
+        else:
+            client.delete_collection("letslearn")
+            collection = client.create_collection("letslearn")
+    # Detach from the project's persisted keyword index; it is kept on disk for the next load
+    keyword_index = BM25Index()
+    _bump_collection_version()
+    log.info("🗑️  Vector Database cleared.")
 
 
 def chunk_text(text, size=500, overlap=100):
@@ -102,36 +279,240 @@ def chunk_text(text, size=500, overlap=100):
     return chunks
 
 
-def retrieve(query, k=2):
-    print(f"🔍 [RAG] Searching memory for: '{query}'")
-    if collection.count() == 0:
-        print("⚠️  [RAG] Vector DB is empty. Returning NO context.")
+def chunk_document(kind, segments, size=500, overlap=100):
+    """
+    Chunks a parsed document (parse_cache.parsed_segments). Slides are natural boundaries: consecutive slides
+    are packed whole into chunks of up to `size` characters, and only a slide longer than that is split with
+    chunk_text. Pages and plain text are chunked as one string, as before.
+    """
+    from doc_parser import join_segments
+    if kind != "slide":
+        return chunk_text(join_segments(kind, segments), size, overlap)
+    chunks, current = [], ""
+    for segment in segments:
+        segment = segment.strip()
+        if not segment:
+            continue
+        if current and len(current) + 1 + len(segment) > size:
+            chunks.append(current)
+            current = ""
+        if len(segment) > size:
+            chunks.extend(chunk_text(segment, size, overlap))
+        else:
+            current = f"{current}\n{segment}" if current else segment
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def retrieve_records(query, k=2, rerank_results=None):
+    """
+    Top-k chunks for a query as dicts with text, source, chunk position and rank.
+    In hybrid mode the vector and BM25 candidate lists are merged with reciprocal-rank fusion.
+    With reranking (default: RERANK_ENABLED), RERANK_CANDIDATES are fetched and reordered by the cross-encoder.
+    """
+    log.debug(f"🔍 [RAG] Searching memory for: '{query}'")
+    collection = get_collection()
+    count = collection.count()
+    if count == 0:
+        log.warning("⚠️  [RAG] Vector DB is empty. Returning NO context.")
         return []
+
+    use_rerank = RERANK_ENABLED if rerank_results is None else rerank_results
+    with span("retrieve", k=k, mode=RETRIEVAL_MODE, rerank=bool(use_rerank)):
+        if use_rerank:
+            records = _reranked_candidates(query, max(k, RERANK_CANDIDATES))
+        else:
+            records = _candidate_records(query, k, count)
+    records = records[:k]
+
+    if records:
+        log.debug(f"💡 [RAG] Found {len(records)} relevant context snippet(s).")
+        return records
         
-    q_emb = embed([query])[0]
-    results = collection.query(query_embeddings=[q_emb], n_results=k)
-    
-    if results and results["documents"]:
-        retrieved_docs = results["documents"][0]
-        print(f"💡 [RAG] Found {len(retrieved_docs)} relevant context snippet(s).")
-        return retrieved_docs
-        
-    print("⚠️  [RAG] No relevant context found.")
+    log.warning("⚠️  [RAG] No relevant context found.")
     return []
 
 
-def _get_context(query="", limit=10, max_chars=3000, k=2):
+def _candidate_records(query, k, count):
+    """First-stage retrieval: Chroma top-k, fused with BM25 hits in hybrid mode."""
+    hybrid = RETRIEVAL_MODE == "hybrid" and len(keyword_index) > 0
+    n_results = min(count, max(k, HYBRID_CANDIDATES) if hybrid else k)
+    q_emb = embed([query])[0]
+    with span("vector_query", n_results=n_results):
+        results = get_collection().query(query_embeddings=[q_emb], n_results=n_results, include=["documents", "metadatas"])
+    records = []
+    if results and results["documents"] and results["documents"][0]:
+        records = _to_records(results["ids"][0], results["documents"][0], results["metadatas"][0])
+    if hybrid:
+        with span("bm25"):
+            keyword_hits = keyword_index.search(query, k=n_results)
+        records = reciprocal_rank_fusion([records, keyword_hits])
+    return records[:k]
+
+
+def _reranked_candidates(query, n_candidates):
+    """Reranked candidate list, cached per (collection version, query) until the documents change."""
+    version = collection_version
+    key = (version, RETRIEVAL_MODE, n_candidates, query.strip().lower())
+    with _rerank_cache_lock:
+        if key in _rerank_cache:
+            _rerank_cache.move_to_end(key)
+            log.debug("♻️ [RERANK] Cache hit.")
+            cache_event("rerank", True)
+            return _rerank_cache[key]
+    cache_event("rerank", False)
+
+    candidates = _candidate_records(query, n_candidates, get_collection().count())
+    with span("rerank", candidates=len(candidates)):
+        records, complete = rerank(query, candidates)
+    # Budget-truncated rankings aren't cached so a later, less loaded request can score them fully
+    if complete:
+        with _rerank_cache_lock:
+            if version == collection_version:
+                _rerank_cache[key] = records
+                while len(_rerank_cache) > RERANK_CACHE_SIZE:
+                    _rerank_cache.popitem(last=False)
+    return records
+
+
+def retrieve(query, k=2, rerank_results=None):
+    return [r["text"] for r in retrieve_records(query, k=k, rerank_results=rerank_results)]
+
+
+def _to_records(ids, docs, metadatas):
+    records = []
+    for rank, (doc_id, text, meta) in enumerate(zip(ids, docs, metadatas or [{}] * len(ids))):
+        meta = meta or {}
+        # Older entries have no chunk metadata; ids are sequential per add_docs call, so use them for order
+        chunk = meta.get("chunk", int(doc_id.split("_")[-1]) if doc_id.split("_")[-1].isdigit() else rank)
+        records.append({"id": doc_id, "text": text, "source": meta.get("source", ""), "chunk": chunk, "rank": rank})
+    return records
+
+
+# ---- Context assembly ----
+
+# Placeholder for retrieved context inside a prompt template (see _fit_context)
+CONTEXT_SLOT = "\x00CONTEXT\x00"
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+DEFAULT_N_CTX = 8192
+# Headroom for BOS/EOS and tokenizer differences at segment joins
+CONTEXT_SAFETY_TOKENS = 64
+# chunk_text overlaps neighbours by 100 chars; shorter suffix/prefix matches are coincidence
+MIN_MERGE_OVERLAP = 16
+# Tokens each additional chunk contributes once overlaps are merged: (500 - 100 overlap) chars at ~4 chars/token
+AVG_CHUNK_TOKENS = 100
+
+
+def count_tokens(llm, text: str) -> int:
+    """Exact count with the model's tokenizer when available, else the ~4 chars/token English estimate."""
+    if not text:
+        return 0
+    if llm is not None and hasattr(llm, "tokenize"):
+        return len(llm.tokenize(text.encode("utf-8"), add_bos=False))
+    return len(text) // 4 + 1
+
+
+def _overlap(a: str, b: str, max_overlap: int = 400) -> int:
+    """Length of the longest suffix of a that is also a prefix of b."""
+    for o in range(min(len(a), len(b), max_overlap), MIN_MERGE_OVERLAP - 1, -1):
+        if a.endswith(b[:o]):
+            return o
+    return 0
+
+
+def merge_chunks(records: list) -> list:
+    """
+    Dedups identical chunks and stitches consecutive chunks of the same source into one segment,
+    dropping the duplicated overlap. Each segment keeps the best (lowest) rank of its members.
+    """
+    seen = set()
+    unique = []
+    for r in sorted(records, key=lambda r: r["rank"]):
+        if r["text"] in seen:
+            continue
+        seen.add(r["text"])
+        unique.append(r)
+
+    segments = []
+    for r in sorted(unique, key=lambda r: (r["source"], r["chunk"])):
+        last = segments[-1] if segments else None
+        if last and last["source"] == r["source"] and r["chunk"] == last["end_chunk"] + 1:
+            last["text"] += r["text"][_overlap(last["text"], r["text"]):]
+            last["end_chunk"] = r["chunk"]
+            last["rank"] = min(last["rank"], r["rank"])
+        else:
+            segments.append({"text": r["text"], "source": r["source"], "chunk": r["chunk"],
+                             "end_chunk": r["chunk"], "rank": r["rank"]})
+    return segments
+
+
+def pack_context(llm, segments: list, budget_tokens: int, by_rank: bool = True) -> str:
+    """Fills the token budget with whole segments, best-ranked first; only an oversized first segment gets cut."""
+    sep_tokens = count_tokens(llm, CONTEXT_SEPARATOR)
+    chosen = []
+    used = 0
+    for seg in sorted(segments, key=lambda s: s["rank"]):
+        cost = count_tokens(llm, seg["text"]) + (sep_tokens if chosen else 0)
+        if used + cost <= budget_tokens:
+            chosen.append(seg)
+            used += cost
+        elif not chosen and budget_tokens > 0:
+            # Trim at a word boundary, proportionally to the overshoot
+            text = seg["text"]
+            while text and count_tokens(llm, text) > budget_tokens:
+                keep = int(len(text) * budget_tokens / count_tokens(llm, text) * 0.95)
+                text = text[:keep].rsplit(" ", 1)[0] if " " in text[:keep] else text[:keep]
+            if text:
+                chosen.append({**seg, "text": text})
+                used += count_tokens(llm, text)
+    if not by_rank:
+        chosen.sort(key=lambda s: (s["source"], s["chunk"]))
+    return CONTEXT_SEPARATOR.join(s["text"] for s in chosen)
+
+
+def _get_context(query="", limit=10, max_chars=3000, k=2, llm=None, budget_tokens=None, rerank_results=None):
+    """
+    Retrieves chunks (top-k for a query, else the first `limit`), merges overlapping neighbours,
+    dedups, and packs them into `budget_tokens` (defaults to roughly `max_chars` worth of tokens).
+    """
+    collection = get_collection()
     if collection.count() == 0:
         return ""
     
     if query:
-        docs = retrieve(query, k=k)
+        records = retrieve_records(query, k=k, rerank_results=rerank_results)
     else:
-        res = collection.get(limit=limit)
-        docs = res.get("documents", [])
-        
-    context = "\n\n---\n\n".join(docs) if docs else ""
-    return context[:max_chars] if len(context) > max_chars else context
+        res = collection.get(limit=limit, include=["documents", "metadatas"])
+        records = _to_records(res.get("ids", []), res.get("documents", []), res.get("metadatas", []))
+    if not records:
+        return ""
+
+    if budget_tokens is None:
+        budget_tokens = max_chars // 4
+    return pack_context(llm, merge_chunks(records), budget_tokens, by_rank=bool(query))
+
+
+def chunks_for_budget(budget_tokens: int, count: int) -> int:
+    """How many chunks to retrieve to fill `budget_tokens`; one extra so pack_context has something to trim."""
+    return max(1, min(count, budget_tokens // AVG_CHUNK_TOKENS + 1))
+
+
+def _fit_context(llm, template: str, max_tokens: int, query="", limit=None, k=None, cap_tokens=None) -> str:
+    """
+    Context for a prompt `template` containing CONTEXT_SLOT, sized to what is left of the model's
+    context window after the template itself and `max_tokens` of output (optionally capped lower).
+    Unless `k` (query) or `limit` (no query) is given, enough chunks are retrieved to fill the budget.
+    """
+    n_ctx = llm.n_ctx() if llm is not None and hasattr(llm, "n_ctx") else DEFAULT_N_CTX
+    budget = n_ctx - count_tokens(llm, template.replace(CONTEXT_SLOT, "")) - max_tokens - CONTEXT_SAFETY_TOKENS
+    if cap_tokens is not None:
+        budget = min(budget, cap_tokens)
+    budget = max(0, budget)
+    n_chunks = chunks_for_budget(budget, get_collection().count())
+    context = _get_context(query, limit=limit or n_chunks, k=k or n_chunks, llm=llm, budget_tokens=budget)
+    log.debug(f"📐 [RAG] Context budget {budget} tokens ({n_chunks} chunks), packed {count_tokens(llm, context)} tokens.")
+    return context
 
 
 def route_visual(llm, query: str) -> str:
@@ -150,7 +531,8 @@ Reply with ONLY one word: diagram, visual, or text.
 [/INST]"""
     try:
         # Added temperature=0.1 for high determinism and dot as a stopping char
-        result = llm.create_completion(prompt, max_tokens=5, temperature=0.1, stop=["</s>", "[INST]", "\n", ".", ","])
+        with span("generate", step="route_visual"):
+            result = llm.create_completion(prompt, max_tokens=5, temperature=0.1, stop=["</s>", "[INST]", "\n", ".", ","])
         raw_text = result["choices"][0].get("text", "text").strip().lower()
 
         route = "text"
@@ -159,10 +541,10 @@ Reply with ONLY one word: diagram, visual, or text.
         elif "visual" in raw_text:
             route = "visual"
 
-        print(f"🤖 [AGENT] Route → {route}")
+        log.info(f"🤖 [AGENT] Route → {route}")
         return route
     except Exception as e:
-        print(f"⚠️ [AGENT] Router error: {e}")
+        log.warning(f"⚠️ [AGENT] Router error: {e}")
     return "text"
 
 
@@ -219,18 +601,19 @@ Context: {context}
 [/INST]"""
 
     try:
-        result = llm.create_completion(
-            prompt,
-            max_tokens=400,
-            temperature=0.2,
-            stop=["</s>", "[INST]"]
-        )
+        with span("generate", step="mermaid"):
+            result = llm.create_completion(
+                prompt,
+                max_tokens=400,
+                temperature=0.2,
+                stop=["</s>", "[INST]"]
+            )
 
         raw = result["choices"][0].get("text", "").strip()
 
         # ---- CLEANING ----
         raw = raw.replace("```mermaid", "").replace("```", "").strip()
-        print(f"\n[MERMAID RAW (PRE-VALIDATION)]:\n{raw}\n---------------------")
+        log.debug(f"[MERMAID RAW (PRE-VALIDATION)]:\n{raw}")
 
         # Extract only Mermaid lines
         lines = raw.splitlines()
@@ -277,7 +660,7 @@ Context: {context}
                     keep.append(line)
 
         code = "\n".join(keep).strip()
-        print(f"[MERMAID CLEANED (POST-PARSING)]:\n{code}\n---------------------")
+        log.debug(f"[MERMAID CLEANED (POST-PARSING)]:\n{code}")
 
         # ---- VALIDATION ----
         if not code.startswith("flowchart") and not code.startswith("graph"):
@@ -286,11 +669,11 @@ Context: {context}
         if "-->" not in code:
             raise ValueError("No edges detected")
 
-        print(f"📊 [MERMAID] Generated diagram ({len(code)} chars):\n{code}\n")
+        log.info(f"📊 [MERMAID] Generated diagram ({len(code)} chars).")
         return code
 
     except Exception as e:
-        print(f"⚠️ [MERMAID] Generation error: {e}")
+        log.warning(f"⚠️ [MERMAID] Generation error: {e}")
 
         # ---- FALLBACK (guaranteed valid) ----
         fallback = """flowchart LR
@@ -311,16 +694,17 @@ Student question: "{query}"
 Return ONLY the image prompt. No preamble.
 [/INST]"""
     try:
-        result = llm.create_completion(prompt, max_tokens=200, stop=["</s>", "[INST]"])
+        with span("generate", step="sd_prompt"):
+            result = llm.create_completion(prompt, max_tokens=200, stop=["</s>", "[INST]"])
         return result["choices"][0].get("text", query).strip()
     except Exception as e:
-        print(f"⚠️ [SD] Prompt error: {e}")
+        log.warning(f"⚠️ [SD] Prompt error: {e}")
         return f"Educational diagram illustrating: {query}. Clean, labeled, white background."
 
 
-def generate_local_image(prompt: str) -> str | None:
-    """Generate an image via local ComfyUI API. Returns base64 PNG or None if offline."""
-    import requests, base64 as _base64, time
+def generate_local_image(prompt: str) -> bytes | None:
+    """Generate an image via local ComfyUI API. Returns raw PNG bytes or None if offline."""
+    import requests, time
     COMFYUI_URL = "http://127.0.0.1:8188"
     try:
         import random
@@ -345,29 +729,19 @@ def generate_local_image(prompt: str) -> str | None:
             if prompt_id in history:
                 for node_out in history[prompt_id].get("outputs", {}).values():
                     for img_data in node_out.get("images", []):
-                        img_bytes = requests.get(f"{COMFYUI_URL}/view", params={"filename": img_data["filename"], "subfolder": img_data.get("subfolder", ""), "type": "output"}, timeout=10).content
-                        return _base64.b64encode(img_bytes).decode("utf-8")
+                        return requests.get(f"{COMFYUI_URL}/view", params={"filename": img_data["filename"], "subfolder": img_data.get("subfolder", ""), "type": "output"}, timeout=10).content
         return None
     except requests.exceptions.ConnectionError:
-        print("⚠️ [SD] ComfyUI offline — skipping image generation")
+        log.warning("⚠️ [SD] ComfyUI offline — skipping image generation")
     except Exception as e:
-        print(f"⚠️ [SD] Error: {e}")
+        log.warning(f"⚠️ [SD] Error: {e}")
     return None
 
 
 def generate_answer(llm, query, k=2, max_chars=1500, is_visual=False):
 
-    print(f"\n💬 [CLIENT] Asked Question: {query}")
-    context = _get_context(query, max_chars=max_chars, k=k)
-    
-    if not context.strip() and not is_visual:
-        print("⚠️  [LLM] No context available, returning fallback error.")
-        yield {"choices": [{"text": "I can't answer this because the database is empty. Please use /add or /load first."}]}
-        return
-
-    print(f"🤖 [LLM] Generating answer from {len(context)} characters of context...")
-    print("--------------------------------------------------")
-    print("📢 [AI REPLY STREAMING TO WEBSERVER]: ", end="")
+    log.info(f"\n💬 [CLIENT] Asked Question: {query}")
+    max_tokens = 800
     
     # If a diagram/image is needed, instruct the LLM to give a structural explanation that will be used to build a diagram, preventing apologies.
     question_text = query
@@ -390,29 +764,37 @@ CRITICAL RULES:
 4. If formatting instructions are given, follow them strictly!
 
 <DOCUMENT_CONTENT>
-{context}
+{CONTEXT_SLOT}
 </DOCUMENT_CONTENT>
 
 Question: {question_text}
 [/INST]"""
-    # use yield from to properly pass the generator
-    for chunk in llm.create_completion(prompt, max_tokens=800, stop=["</s>", "[INST]"], stream=True):
+    # max_chars is the client's cap on context size; whole chunks are packed by tokens within it
+    context = _fit_context(llm, prompt, max_tokens, query, k=k, cap_tokens=max_chars // 4)
+    
+    if not context.strip() and not is_visual:
+        log.warning("⚠️  [LLM] No context available, returning fallback error.")
+        yield {"choices": [{"text": "I can't answer this because the database is empty. Please use /add or /load first."}]}
+        return
+
+    prompt = prompt.replace(CONTEXT_SLOT, context)
+    log.info(f"🤖 [LLM] Generating answer from {len(context)} characters of context...")
+    mirror_token("--------------------------------------------------\n📢 [AI REPLY STREAMING TO WEBSERVER]: ")
+    for chunk in traced_tokens(llm.create_completion(prompt, max_tokens=max_tokens, stop=["</s>", "[INST]"], stream=True)):
         text = chunk["choices"][0].get("text", "")
         if text:
-            print(text, end="", flush=True)  # Mirror word-by-word into terminal
+            mirror_token(text)  # Mirror word-by-word into terminal (LETSLEARN_TOKEN_MIRROR=1)
         yield chunk
     
-    print("\n--------------------------------------------------")
-    print("✅ [LLM] Finished generating answer.")
+    mirror_token("\n--------------------------------------------------\n")
+    log.info("✅ [LLM] Finished generating answer.")
 
 
 def generate_flashcards(llm, count: int = 5, topic: str = "all", extra_context: str = ""):
-    context = _get_context(topic if topic != "all" else "")
+    max_tokens = 1200
+    document_block = CONTEXT_SLOT
     if extra_context:
-        context = f"NOTES/EXTRACTED CONTEXT:\n{extra_context}\n\nDOCUMENT CONTENT:\n{context}"
-        
-    if not context.strip():
-        print(f"⚠️ [RAG] Warning: No document context found for topic '{topic}'. Falling back to LLM knowledge.")
+        document_block = f"NOTES/EXTRACTED CONTEXT:\n{extra_context}\n\nDOCUMENT CONTENT:\n{CONTEXT_SLOT}"
 
     topic_instruction = f"CRITICAL: Focus ONLY on the topic: '{topic}'. Keep the flashcards strictly relevant to this topic based on the context." if topic != "all" else "Cover all topics in the context."
         
@@ -428,26 +810,28 @@ Q: <question>
 A: <answer>
 
 <DOCUMENT_CONTENT>
-{context}
+{document_block}
 </DOCUMENT_CONTENT>
 [/INST]"""
-    print(f"\n📢 [AI GENERATING FLASHCARDS STREAMING TO WEBSERVER]: ", end="")
-    for chunk in llm.create_completion(prompt, max_tokens=1200, stop=["</s>", "[INST]"], stream=True):
+    context = _fit_context(llm, prompt, max_tokens, topic if topic != "all" else "")
+    if not context.strip() and not extra_context:
+        log.warning(f"⚠️ [RAG] Warning: No document context found for topic '{topic}'. Falling back to LLM knowledge.")
+    prompt = prompt.replace(CONTEXT_SLOT, context)
+    mirror_token("\n📢 [AI GENERATING FLASHCARDS STREAMING TO WEBSERVER]: ")
+    for chunk in traced_tokens(llm.create_completion(prompt, max_tokens=max_tokens, stop=["</s>", "[INST]"], stream=True)):
         text = chunk["choices"][0].get("text", "")
         if text:
-            print(text, end="", flush=True)
+            mirror_token(text)
         yield chunk
-    print("\n--------------------------------------------------")
-    print("✅ [LLM] Finished generating flashcards.")
+    mirror_token("\n--------------------------------------------------\n")
+    log.info("✅ [LLM] Finished generating flashcards.")
 
 
 def generate_quiz(llm, count: int = 5, fmt: str = "text", topic: str = "all", extra_context: str = ""):
-    context = _get_context(topic if topic != "all" else "")
+    max_tokens = 2000
+    document_block = CONTEXT_SLOT
     if extra_context:
-        context = f"NOTES/EXTRACTED CONTEXT:\n{extra_context}\n\nDOCUMENT CONTENT:\n{context}"
-        
-    if not context.strip():
-        print(f"⚠️ [RAG] Warning: No document context found for topic '{topic}'. Falling back to LLM knowledge.")
+        document_block = f"NOTES/EXTRACTED CONTEXT:\n{extra_context}\n\nDOCUMENT CONTENT:\n{CONTEXT_SLOT}"
 
     topic_instruction = f"CRITICAL: Focus ONLY on the topic: '{topic}'. Keep the questions strictly relevant to this topic based on the context." if topic != "all" else "Cover all topics in the context."
 
@@ -489,53 +873,175 @@ CRITICAL INSTRUCTIONS:
 {format_instruction}
 
 <DOCUMENT_CONTENT>
-{context}
+{document_block}
 </DOCUMENT_CONTENT>
 [/INST]"""
-    print(f"\n📢 [AI GENERATING QUIZ STREAMING TO WEBSERVER]: ", end="")
-    for chunk in llm.create_completion(prompt, max_tokens=2000, stop=["</s>", "[INST]"], stream=True):
+    context = _fit_context(llm, prompt, max_tokens, topic if topic != "all" else "")
+    if not context.strip() and not extra_context:
+        log.warning(f"⚠️ [RAG] Warning: No document context found for topic '{topic}'. Falling back to LLM knowledge.")
+    prompt = prompt.replace(CONTEXT_SLOT, context)
+    mirror_token("\n📢 [AI GENERATING QUIZ STREAMING TO WEBSERVER]: ")
+    for chunk in traced_tokens(llm.create_completion(prompt, max_tokens=max_tokens, stop=["</s>", "[INST]"], stream=True)):
         text = chunk["choices"][0].get("text", "")
         if text:
-            print(text, end="", flush=True)
+            mirror_token(text)
         yield chunk
-    print("\n--------------------------------------------------")
-    print("✅ [LLM] Finished generating quiz.")
+    mirror_token("\n--------------------------------------------------\n")
+    log.info("✅ [LLM] Finished generating quiz.")
 
 
-def generate_topics(llm):
-    """Summarizes the uploaded documents into a list of key topics."""
-    context = _get_context(limit=10, max_chars=3000)
-        
-    if not context.strip():
-        yield {"choices": [{"text": "[]"}]}
-        return
-        
+def valid_question(q) -> bool:
+    return isinstance(q, dict) and bool(q.get("question")) and isinstance(q.get("options"), list) and bool(q["options"])
+
+
+def parse_quiz_json(raw: str) -> list:
+    """
+    Extracts the JSON array of questions from raw generate_quiz output. Returns [] if none is found.
+    A truncated array (max_tokens hit mid-question) still yields the questions that were completed.
+    """
+    # Robust regex to find the JSON array even if the LLM adds fluff around it
+    match = re.search(r'\[\s*\{.*\}\s*\]', raw, re.DOTALL)
+    if match:
+        try:
+            return [q for q in json.loads(match.group(0)) if valid_question(q)]
+        except json.JSONDecodeError:
+            pass
+    return QuizStreamParser().feed(raw)
+
+
+class QuizStreamParser:
+    """
+    Incremental parser over the quiz token stream. feed() takes each new piece of text and returns the question
+    objects completed by it, so a question can be used as soon as its closing brace is decoded. Balanced
+    top-level {...} objects are considered (braces inside JSON strings are ignored), and so are the elements of
+    a "questions" array inside a top-level wrapper object ({"questions": [...]}); the surrounding array, code
+    fences and chatter are skipped. Objects that are not valid JSON or not valid questions are dropped.
+    """
+
+    def __init__(self):
+        self.stack = []  # ("{", buffer offset) or ("[", is a wrapper's "questions" array)
+        self.in_string = False
+        self.escaped = False
+        self.buffer = []
+        self.wrapped = 0  # Questions emitted from the current top-level wrapper
+        self.rejected = 0
+
+    def feed(self, text: str) -> list:
+        completed = []
+        for ch in text:
+            if not self.stack:
+                if ch == "{":
+                    self.stack.append(("{", 0))
+                    self.buffer = [ch]
+                    self.wrapped = 0
+                continue
+            self.buffer.append(ch)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.stack.append(("{", len(self.buffer) - 1))
+            elif ch == "[":
+                wrapper = len(self.stack) == 1 and re.search(r'"questions"\s*:\s*\[$', "".join(self.buffer[-40:]))
+                self.stack.append(("[", bool(wrapper)))
+            elif ch == "]" and self.stack[-1][0] == "[":
+                self.stack.pop()
+            elif ch == "}" and self.stack[-1][0] == "{":
+                start = self.stack.pop()[1]
+                if not self.stack:
+                    question = self._parse("".join(self.buffer), quiet=self.wrapped > 0)
+                elif len(self.stack) == 2 and self.stack[-1] == ("[", True):
+                    question = self._parse("".join(self.buffer[start:]))
+                    self.wrapped += question is not None
+                else:
+                    continue
+                if question is not None:
+                    completed.append(question)
+        return completed
+
+    def _parse(self, obj: str, quiet: bool = False):
+        try:
+            question = json.loads(obj)
+        except json.JSONDecodeError:
+            question = None
+        if not valid_question(question):
+            if not quiet:
+                self.rejected += 1
+                log.warning(f"⚠️ [QUIZ] Dropped an invalid question object ({len(obj)} chars).")
+            return None
+        return question
+
+
+def generate_section_summary(llm, text: str, merge: bool = False):
+    """Map step of the map-reduce summary: condenses one document section (or, with merge=True, several section summaries)."""
+    max_tokens = 300
+    if merge:
+        task = "The SECTION SUMMARIES below cover consecutive parts of the same material. Merge them into one condensed summary"
+    else:
+        task = "Summarize the DOCUMENT SECTION below"
+    prompt = f"""[INST] You are an expert analyst. {task} as 4 to 8 dense bullet points.
+Keep every key term, definition, formula, acronym and code exactly as written. Do not add information that is not in the text.
+Return ONLY the bullet points.
+
+<DOCUMENT_SECTION>
+{text}
+</DOCUMENT_SECTION>
+[/INST]"""
+    for chunk in traced_tokens(llm.create_completion(prompt, max_tokens=max_tokens, temperature=0.2, stop=["</s>", "[INST]"], stream=True)):
+        yield chunk
+
+
+def _section_context(llm, prompt: str, max_tokens: int, section_summaries: list) -> str:
+    """Reduce-step context: section summaries in document order, packed into what the prompt leaves free."""
+    n_ctx = llm.n_ctx() if llm is not None and hasattr(llm, "n_ctx") else DEFAULT_N_CTX
+    budget = n_ctx - count_tokens(llm, prompt.replace(CONTEXT_SLOT, "")) - max_tokens - CONTEXT_SAFETY_TOKENS
+    segments = [{"text": s, "source": "", "chunk": i, "rank": i} for i, s in enumerate(section_summaries)]
+    context = pack_context(llm, segments, max(0, budget), by_rank=False)
+    log.debug(f"📐 [RAG] Reducing {len(section_summaries)} section summaries ({count_tokens(llm, context)} tokens).")
+    return context
+
+
+def generate_topics(llm, section_summaries=None):
+    """
+    Summarizes the uploaded documents into a list of key topics.
+    With `section_summaries` (see section_summaries.reduce_inputs) the whole corpus is covered, else the first chunks.
+    """
+    max_tokens = 300
     prompt = f"""[INST] You are an expert analyst. Read the DOCUMENT CONTENT below and extract the 5 to 10 most important key topics or themes.
 Return ONLY a valid JSON array of strings. No other text or markdown.
 
 Example: ["Topic 1", "Topic 2", "Topic 3"]
 
 <DOCUMENT_CONTENT>
-{context}
+{CONTEXT_SLOT}
 </DOCUMENT_CONTENT>
 [/INST]"""
-    print(f"\n📢 [AI GENERATING TOPICS STREAMING TO WEBSERVER]: ", end="")
-    for chunk in llm.create_completion(prompt, max_tokens=300, stop=["</s>", "[INST]"], stream=True):
+    if section_summaries:
+        context = _section_context(llm, prompt, max_tokens, section_summaries)
+    else:
+        context = _fit_context(llm, prompt, max_tokens)
+    if not context.strip():
+        yield {"choices": [{"text": "[]"}]}
+        return
+    prompt = prompt.replace(CONTEXT_SLOT, context)
+    mirror_token("\n📢 [AI GENERATING TOPICS STREAMING TO WEBSERVER]: ")
+    for chunk in traced_tokens(llm.create_completion(prompt, max_tokens=max_tokens, stop=["</s>", "[INST]"], stream=True)):
         text = chunk["choices"][0].get("text", "")
         if text:
-            print(text, end="", flush=True)
+            mirror_token(text)
         yield chunk
-    print("\n--------------------------------------------------")
-    print("✅ [LLM] Finished generating topics.")
+    mirror_token("\n--------------------------------------------------\n")
+    log.info("✅ [LLM] Finished generating topics.")
 
 def generate_notes(llm, topic: str):
     """Generates a detailed markdown study guide for a specific topic."""
-    context = _get_context(topic)
-        
-    if not context.strip():
-        yield {"choices": [{"text": "No documents found in the database covering this topic."}]}
-        return
-        
+    max_tokens = 1500
     prompt = f"""[INST] You are an expert tutor. Based on the DOCUMENT CONTENT below, generate highly detailed and comprehensive study notes exclusively about the topic: '{topic}'.
 Format the notes strictly using Github Flavored Markdown (GFM). 
 
@@ -555,27 +1061,30 @@ INSTRUCTIONS:
 - Make it visually appealing and well-structured.
 
 <DOCUMENT_CONTENT>
-{context}
+{CONTEXT_SLOT}
 </DOCUMENT_CONTENT>
 [/INST]"""
-    print(f"\n📢 [AI GENERATING NOTES STREAMING TO WEBSERVER]: ", end="")
-    for chunk in llm.create_completion(prompt, max_tokens=1500, stop=["</s>", "[INST]"], stream=True):
+    context = _fit_context(llm, prompt, max_tokens, topic)
+    if not context.strip():
+        yield {"choices": [{"text": "No documents found in the database covering this topic."}]}
+        return
+    prompt = prompt.replace(CONTEXT_SLOT, context)
+    mirror_token("\n📢 [AI GENERATING NOTES STREAMING TO WEBSERVER]: ")
+    for chunk in traced_tokens(llm.create_completion(prompt, max_tokens=max_tokens, stop=["</s>", "[INST]"], stream=True)):
         text = chunk["choices"][0].get("text", "")
         if text:
-            print(text, end="", flush=True)
+            mirror_token(text)
         yield chunk
-    print("\n--------------------------------------------------")
-    print("✅ [LLM] Finished generating notes.")
+    mirror_token("\n--------------------------------------------------\n")
+    log.info("✅ [LLM] Finished generating notes.")
 
 
-def generate_summary(llm):
-    """Generates a structured markdown summary of all uploaded documents."""
-    context = _get_context(limit=20, max_chars=4000)
-        
-    if not context.strip():
-        yield {"choices": [{"text": "No documents found in the database. Please use /add or /load first."}]}
-        return
-        
+def generate_summary(llm, section_summaries=None):
+    """
+    Generates a structured markdown summary of all uploaded documents.
+    With `section_summaries` (see section_summaries.reduce_inputs) the whole corpus is covered, else the first chunks.
+    """
+    max_tokens = 1500
     prompt = f"""[INST] You are an expert analyst. Read the COMPLETE DOCUMENT CONTENT below and generate a high-level, comprehensive summary of all the material.
 Format the summary strictly using Github Flavored Markdown (GFM).
 
@@ -595,17 +1104,25 @@ INSTRUCTIONS:
 - Make it visually appealing and well-structured.
 
 <DOCUMENT_CONTENT>
-{context}
+{CONTEXT_SLOT}
 </DOCUMENT_CONTENT>
 [/INST]"""
-    print(f"\n📢 [AI GENERATING SUMMARY STREAMING TO WEBSERVER]: ", end="")
-    for chunk in llm.create_completion(prompt, max_tokens=1500, stop=["</s>", "[INST]"], stream=True):
+    if section_summaries:
+        context = _section_context(llm, prompt, max_tokens, section_summaries)
+    else:
+        context = _fit_context(llm, prompt, max_tokens)
+    if not context.strip():
+        yield {"choices": [{"text": "No documents found in the database. Please use /add or /load first."}]}
+        return
+    prompt = prompt.replace(CONTEXT_SLOT, context)
+    mirror_token("\n📢 [AI GENERATING SUMMARY STREAMING TO WEBSERVER]: ")
+    for chunk in traced_tokens(llm.create_completion(prompt, max_tokens=max_tokens, stop=["</s>", "[INST]"], stream=True)):
         text = chunk["choices"][0].get("text", "")
         if text:
-            print(text, end="", flush=True)
+            mirror_token(text)
         yield chunk
-    print("\n--------------------------------------------------")
-    print("✅ [LLM] Finished generating summary.")
+    mirror_token("\n--------------------------------------------------\n")
+    log.info("✅ [LLM] Finished generating summary.")
 
 def generate_contextual_answer(llm, selected_text: str, question: str):
     """Answers a specific doubt based explicitly on a selected piece of text."""
@@ -620,12 +1137,12 @@ The user has a doubt/question regarding this exact text:
 
 Provide a clear, helpful, and concise answer to their question using the provided text. Don't mention "based on the selected text", just answer the question in a friendly tone. Use markdown if helpful. [/INST]"""
     
-    print(f"\n📢 [AI CONTEXTUAL CHAT STREAMING]: ", end="")
-    for chunk in llm.create_completion(prompt, max_tokens=1000, stop=["</s>", "[INST]"], stream=True):
+    mirror_token("\n📢 [AI CONTEXTUAL CHAT STREAMING]: ")
+    for chunk in traced_tokens(llm.create_completion(prompt, max_tokens=1000, stop=["</s>", "[INST]"], stream=True)):
         text = chunk["choices"][0].get("text", "")
         if text:
-            print(text, end="", flush=True)
+            mirror_token(text)
         yield chunk
-    print("\n--------------------------------------------------")
-    print("✅ [LLM] Finished contextual answer.")
+    mirror_token("\n--------------------------------------------------\n")
+    log.info("✅ [LLM] Finished contextual answer.")
 
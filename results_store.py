@@ -0,0 +1,248 @@
+import os
+import json
+import datetime
+import threading
+from collections import deque
+
+from logs import get_logger
+
+log = get_logger("results")
+
+DATA_DIR = "data"
+RESULTS_LOG = "results.jsonl"
+
+# Appends from concurrent requests must not interleave within a line
+_log_lock = threading.Lock()
+
+
+def results_log_path(project_name: str) -> str:
+    return os.path.join(DATA_DIR, project_name, RESULTS_LOG)
+
+
+def append_result(project_name: str, result: dict):
+    """Appends one quiz result to the project's append-only JSONL log. O(1) regardless of history length."""
+    path = results_log_path(project_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    line = json.dumps(result, ensure_ascii=False) + "\n"
+    with _log_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def read_results(project_name: str, limit: int | None = None) -> list:
+    """Reads the result history, oldest first. With `limit`, only the most recent entries are kept in memory."""
+    path = results_log_path(project_name)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        lines = deque(f, maxlen=limit) if limit else f.readlines()
+    results = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            results.append(json.loads(line))
+        except json.JSONDecodeError:
+            log.warning(f"⚠️ [RESULTS] Skipping corrupt line in {path}")
+    return results
+
+
+_migrate_lock = threading.Lock()
+
+
+def _identity(result: dict) -> str:
+    return json.dumps(result, sort_keys=True, ensure_ascii=False)
+
+
+def migrate_inline_results(project_name: str, project: dict) -> bool:
+    """
+    Moves a legacy inline "results" list out of projects.json into the log. Returns True if the project changed.
+    Idempotent: results already in the log (a previous run whose projects.json save never landed) are skipped.
+    """
+    if "results" not in project:
+        return False
+    with _migrate_lock:
+        legacy = project.pop("results") or []
+        logged = {_identity(r) for r in read_results(project_name)} if legacy else set()
+        moved = 0
+        for result in legacy:
+            if _identity(result) in logged:
+                continue
+            logged.add(_identity(result))
+            append_result(project_name, result)
+            moved += 1
+    if legacy:
+        log.info(f"📦 [RESULTS] Migrated {moved} result(s) for '{project_name}' to {results_log_path(project_name)}"
+                 + (f" ({len(legacy) - moved} already there)" if moved < len(legacy) else ""))
+    return True
+
+
+def apply_result(mastery: dict, result: dict, now: datetime.datetime | None = None) -> list:
+    """
+    Folds one result's per-topic breakdown into the materialized mastery aggregate in place.
+    Returns the topics that were updated.
+    """
+    if "breakdown" not in result:
+        return []
+    now = now or datetime.datetime.now()
+    time_spent = result.get("time_spent", 0)
+    total_questions = result.get("total", 0)
+    updated = []
+
+    for topic, stats in result["breakdown"].items():
+        if topic == "all": continue
+
+        # Attribute time proportionally to number of questions per topic in multi-topic sessions
+        topic_time = (stats["total"] / total_questions) * time_spent if total_questions > 0 else 0
+
+        t_data = mastery.setdefault(topic, {
+            "attempted": 0, "correct": 0, "accuracy": 0,
+            "total_time": 0, "avg_speed": 0, "last_attempt": None
+        })
+
+        t_data["attempted"] += stats["total"]
+        t_data["correct"] += stats["correct"]
+        if t_data["attempted"] > 0:
+            t_data["accuracy"] = round((t_data["correct"] / t_data["attempted"]) * 100)
+
+        # Update total time and speed (Questions per Minute)
+        t_data["total_time"] = round(t_data.get("total_time", 0) + topic_time)
+        if t_data["total_time"] > 0:
+            current_speed = round((t_data["attempted"] / t_data["total_time"]) * 60, 1)
+            t_data["avg_speed"] = current_speed
+
+            # Track best speed (peak performance)
+            t_data["best_speed"] = max(t_data.get("best_speed", 0), current_speed)
+
+        t_data["last_attempt"] = now.isoformat()
+        updated.append(topic)
+    return updated
+
+
+# ---- Time-series rollups ----
+
+ROLLUPS_FILE = "rollups.json"
+BUCKETS = ("day", "week")
+
+_rollup_lock = threading.Lock()
+
+
+def rollups_path(project_name: str) -> str:
+    return os.path.join(DATA_DIR, project_name, ROLLUPS_FILE)
+
+
+def _result_time(result: dict) -> datetime.datetime:
+    """Local time a result was taken, from its client timestamp if present."""
+    for key in ("timestamp", "saved_at"):
+        raw = result.get(key)
+        if not raw:
+            continue
+        try:
+            ts = datetime.datetime.fromisoformat(raw)
+        except (TypeError, ValueError):
+            continue
+        return ts.astimezone().replace(tzinfo=None) if ts.tzinfo else ts
+    return datetime.datetime.now()
+
+
+def period_key(ts: datetime.date, bucket: str) -> str:
+    """Day buckets are keyed by ISO date, week buckets by the date of their Monday. Both sort lexically."""
+    day = ts.date() if isinstance(ts, datetime.datetime) else ts
+    if bucket == "week":
+        day = day - datetime.timedelta(days=day.weekday())
+    return day.isoformat()
+
+
+def _apply_rollup(rollups: dict, result: dict):
+    ts = _result_time(result)
+    time_spent = result.get("time_spent", 0)
+    total_questions = result.get("total", 0)
+    for bucket in BUCKETS:
+        period = rollups.setdefault(bucket, {}).setdefault(period_key(ts, bucket), {"sessions": 0, "topics": {}})
+        period["sessions"] += 1
+        for topic, stats in result.get("breakdown", {}).items():
+            if topic == "all": continue
+            t = period["topics"].setdefault(topic, {"attempted": 0, "correct": 0, "total_time": 0})
+            t["attempted"] += stats.get("total", 0)
+            t["correct"] += stats.get("correct", 0)
+            if total_questions > 0:
+                t["total_time"] += stats.get("total", 0) / total_questions * time_spent
+
+
+def _load_rollups(project_name: str) -> dict:
+    """Loads the rollups, rebuilding them once from the results log if they don't exist yet."""
+    path = rollups_path(project_name)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            log.warning(f"⚠️ [ROLLUPS] Corrupt rollups for '{project_name}', rebuilding from log.")
+    rollups = {}
+    history = read_results(project_name)
+    for result in history:
+        _apply_rollup(rollups, result)
+    if history:
+        log.info(f"📈 [ROLLUPS] Rebuilt rollups for '{project_name}' from {len(history)} logged result(s).")
+        _save_rollups(project_name, rollups)
+    return rollups
+
+
+def _save_rollups(project_name: str, rollups: dict):
+    path = rollups_path(project_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(rollups, f)
+    os.replace(tmp_path, path)
+
+
+def record_rollups(project_name: str, result: dict):
+    """Adds one result to the daily and weekly rollups. Must be called after append_result."""
+    with _rollup_lock:
+        existed = os.path.exists(rollups_path(project_name))
+        rollups = _load_rollups(project_name)
+        # A fresh rebuild already read this result back from the log
+        if existed:
+            _apply_rollup(rollups, result)
+        _save_rollups(project_name, rollups)
+
+
+def query_rollups(project_name: str, bucket: str = "day", start: str | None = None, end: str | None = None) -> dict:
+    """
+    Per-topic and overall series for periods in [start, end] (ISO dates, inclusive).
+    Answers from the rollups only, never from the raw results log.
+    """
+    with _rollup_lock:
+        rollups = _load_rollups(project_name)
+    lo = period_key(datetime.date.fromisoformat(start), bucket) if start else None
+    hi = end
+
+    series = {}
+    totals = []
+    for period in sorted(rollups.get(bucket, {})):
+        if (lo and period < lo) or (hi and period > hi):
+            continue
+        entry = rollups[bucket][period]
+        attempted = correct = total_time = 0
+        for topic, t in entry["topics"].items():
+            attempted += t["attempted"]
+            correct += t["correct"]
+            total_time += t["total_time"]
+            series.setdefault(topic, []).append(_point(period, t))
+        totals.append({**_point(period, {"attempted": attempted, "correct": correct, "total_time": total_time}),
+                       "sessions": entry["sessions"]})
+    return {"series": series, "totals": totals}
+
+
+def _point(period: str, t: dict) -> dict:
+    attempted, total_time = t["attempted"], t["total_time"]
+    return {
+        "period": period,
+        "attempted": attempted,
+        "correct": t["correct"],
+        "accuracy": round(t["correct"] / attempted * 100) if attempted else 0,
+        "total_time": round(total_time),
+        "avg_speed": round(attempted / total_time * 60, 1) if total_time > 0 else 0,  # Questions per minute
+    }
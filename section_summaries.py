@@ -0,0 +1,197 @@
+"""
+Map-reduce summarization over a project's full corpus.
+
+Map: every document is split into sections of SECTION_CHUNKS consecutive chunks. Each section is summarized
+once and cached by the hash of its chunks in data/<project>/sections.json. Sections are registered at ingest;
+the pregen scheduler fills in their summaries while the LLM is idle. /summary and /topics reduce over the
+summaries that exist at request time (raw chunks if there are none). Adding a file only adds that file's sections.
+
+Reduce: the ordered section summaries are fed to generate_summary / generate_topics. If they don't fit the
+context window they are first collapsed, group by group, into merged summaries (also cached).
+"""
+import os
+import json
+import hashlib
+import threading
+
+from rag_core import generate_section_summary, merge_chunks, count_tokens, DEFAULT_N_CTX
+from logs import get_logger
+
+log = get_logger("sections")
+
+DATA_DIR = "data"
+SECTIONS_FILE = "sections.json"
+# 6 chunks of 500 chars (100 overlap) is ~2.4K chars of source text per section summary
+SECTION_CHUNKS = 6
+# Room kept for the reduce prompt's instructions and its output (generate_summary uses 1500 tokens)
+REDUCE_RESERVED_TOKENS = 2200
+# Hard stop for the collapse loop in case merged summaries stop getting shorter
+MAX_REDUCE_LEVELS = 4
+
+_store_lock = threading.Lock()
+
+
+def sections_path(project_name: str) -> str:
+    return os.path.join(DATA_DIR, project_name, SECTIONS_FILE)
+
+
+def _section_hash(chunks: list) -> str:
+    return hashlib.sha1("\x00".join(chunks).encode("utf-8")).hexdigest()[:20]
+
+
+def _load(project_name: str) -> dict:
+    path = sections_path(project_name)
+    store = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                store = json.load(f)
+        except json.JSONDecodeError:
+            log.warning(f"⚠️ [SECTIONS] Corrupt section store for '{project_name}', starting over.")
+    for key in ("sources", "summaries", "pending", "merged"):
+        store.setdefault(key, {})
+    return store
+
+
+def _save(project_name: str, store: dict):
+    path = sections_path(project_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(store, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def register_sections(project_name: str, source: str, chunks: list) -> int:
+    """
+    Records a document's sections at ingest. Sections already summarized (same chunk hash) are reused.
+    Returns how many sections still need a summary.
+    """
+    with _store_lock:
+        store = _load(project_name)
+        hashes = []
+        for start in range(0, len(chunks), SECTION_CHUNKS):
+            group = chunks[start:start + SECTION_CHUNKS]
+            h = _section_hash(group)
+            hashes.append(h)
+            if h not in store["summaries"] and h not in store["pending"]:
+                # Stitch the overlapping chunks back together so the LLM doesn't read each overlap twice
+                records = [{"text": c, "source": source, "chunk": i, "rank": i} for i, c in enumerate(group)]
+                store["pending"][h] = "\n\n".join(seg["text"] for seg in merge_chunks(records))
+                store["merged"] = {}  # Corpus changed; merged reduce levels are stale
+        store["sources"][source] = hashes
+        _prune(store)
+        _save(project_name, store)
+        missing = sum(1 for h in hashes if h in store["pending"])
+    if missing:
+        log.info(f"🧩 [SECTIONS] {source}: {len(hashes)} section(s), {missing} to summarize.")
+    return missing
+
+
+def retain_sources(project_name: str, sources):
+    """Forgets sections of documents no longer in the project."""
+    keep = set(sources)
+    with _store_lock:
+        store = _load(project_name)
+        removed = [s for s in store["sources"] if s not in keep]
+        if not removed:
+            return
+        for source in removed:
+            del store["sources"][source]
+        store["merged"] = {}
+        _prune(store)
+        _save(project_name, store)
+
+
+def _prune(store: dict):
+    live = {h for hashes in store["sources"].values() for h in hashes}
+    for key in ("summaries", "pending"):
+        for h in [h for h in store[key] if h not in live]:
+            del store[key][h]
+
+
+def next_missing(project_name: str):
+    """(hash, text) of the next section without a summary, in document order, or None."""
+    with _store_lock:
+        store = _load(project_name)
+    for hashes in store["sources"].values():
+        for h in hashes:
+            if h in store["pending"]:
+                return h, store["pending"][h]
+    return None
+
+
+def store_summary(project_name: str, section: str, summary: str) -> bool:
+    """Saves one section summary. Empty summaries are rejected so the section is retried."""
+    summary = summary.strip()
+    if not summary:
+        return False
+    with _store_lock:
+        store = _load(project_name)
+        if section not in store["pending"] and section not in store["summaries"]:
+            return False  # Its document was removed meanwhile
+        store["summaries"][section] = summary
+        store["pending"].pop(section, None)
+        _save(project_name, store)
+    return True
+
+
+def _run_until(stream, should_stop):
+    """Joins a completion stream's text; closes the stream and returns None as soon as should_stop() is true."""
+    parts = []
+    for chunk in stream:
+        if should_stop():
+            stream.close()
+            return None
+        parts.append(chunk["choices"][0].get("text", ""))
+    return "".join(parts)
+
+
+def reduce_inputs(llm, project_name: str, should_stop=None) -> list:
+    """
+    Section summaries in document order, collapsed into merged summaries until they fit the reduce budget.
+    Returns [] when nothing has been summarized yet (callers then fall back to raw chunks).
+    `should_stop` is checked at every token of a merge; when it fires, the merges finished so far stay stored
+    and whatever is at hand is returned (the caller is expected to abandon the reduce).
+    """
+    with _store_lock:
+        store = _load(project_name)
+    summaries = [store["summaries"][h] for hashes in store["sources"].values() for h in hashes if h in store["summaries"]]
+    n_ctx = llm.n_ctx() if hasattr(llm, "n_ctx") else DEFAULT_N_CTX
+    budget = max(512, n_ctx - REDUCE_RESERVED_TOKENS)
+
+    for _ in range(MAX_REDUCE_LEVELS):
+        if not summaries or sum(count_tokens(llm, s) for s in summaries) <= budget:
+            break
+        groups, group, used = [], [], 0
+        for s in summaries:
+            cost = count_tokens(llm, s)
+            # Each merge prompt also needs room for its own output
+            if group and used + cost > budget // 2:
+                groups.append(group)
+                group, used = [], 0
+            group.append(s)
+            used += cost
+        groups.append(group)
+        if len(groups) == len(summaries):
+            break  # Every summary is already alone in its group; nothing left to merge
+        merged = []
+        for group in groups:
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            joined = "\n\n".join(group)
+            h = hashlib.sha1(joined.encode("utf-8")).hexdigest()[:20]
+            if h not in store["merged"]:
+                log.info(f"🧩 [SECTIONS] Merging {len(group)} section summaries for '{project_name}'")
+                merged_text = _run_until(generate_section_summary(llm, joined, merge=True), should_stop or (lambda: False))
+                if merged_text is None:
+                    return summaries
+                store["merged"][h] = merged_text.strip() or joined
+                with _store_lock:
+                    latest = _load(project_name)
+                    latest["merged"][h] = store["merged"][h]
+                    _save(project_name, latest)
+            merged.append(store["merged"][h])
+        summaries = merged
+    return summaries
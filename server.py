@@ -1,60 +1,91 @@
+import time
+_import_started = time.perf_counter()
+
 import os
 import json
 import shutil
 import asyncio
 import datetime
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
-from fastapi.responses import StreamingResponse
+import threading
+import urllib.parse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
 from pydantic import BaseModel
-from typing import List
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from typing import List, Optional
 
 from rag_core import (
-    load_llm, add_docs, chunk_text, generate_answer, clear_db,
+    load_llm, load_embedder, add_docs, chunk_document, generate_answer, clear_db, open_keyword_index,
+    load_reranker, RERANK_ENABLED,
     generate_flashcards, generate_quiz, generate_topics, generate_summary,
-    generate_contextual_answer, route_visual, generate_mermaid, create_sd_prompt, generate_local_image
+    generate_contextual_answer, route_visual, generate_mermaid, create_sd_prompt, generate_local_image,
+    parse_quiz_json, QuizStreamParser, embed
 )
-from doc_parser import parse_document
+import rag_core
+from parse_cache import parsed_segments
+from pregen import PregenScheduler, get_pregen_config, parse_topics
+from quiz_pool import add_questions, sample_adaptive, record_attempts, quiz_item
+from startup import StartupOrchestrator
+from answer_cache import AnswerCache, replay, corpus_key, ENABLED as ANSWER_CACHE_ENABLED
+from tracing import TracingMiddleware, span, annotate, cache_event, snapshot as metrics_snapshot, sampled_traces, dump_traces
+from section_summaries import register_sections, retain_sources, reduce_inputs, next_missing
+from results_store import (
+    append_result, read_results, migrate_inline_results, apply_result, record_rollups, query_rollups, BUCKETS
+)
+from logs import get_logger, setup_logging
+from llm_backends import LLM_BACKEND
+from embedders import EMBEDDER_BACKEND
+from blob_store import save_upload, document_name, document_path, migrate_project_files
+
+# Server mode: no per-token console mirroring unless LETSLEARN_TOKEN_MIRROR=1
+setup_logging()
+log = get_logger("server")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Warmup sequence: Load LLM Database mapping & clear vector DB."""
-    global llm
-    
-    print("\n" + "="*50)
-    print("🚀 LetsLearn Web Server Starting...")
-    print("="*50 + "\n")
+    """Warmup sequence: boot models & vector DB in the background, check project mapping."""
     
-    print("🔥 Warming up server & booting AI models...")
+    log.info("\n" + "="*50)
+    log.info("🚀 LetsLearn Web Server Starting...")
+    log.info("="*50 + "\n")
     
-    if not os.path.exists(MODEL_PATH):
-        print(f"⚠️ ERROR: Model not found at '{MODEL_PATH}'.")
-        print("Please ensure your Mistral model is downloaded before trying to chat.")
-    else:
-        llm = load_llm(MODEL_PATH)
-
-    print("🧹 Auto-clearing vector DB on startup...")
-    clear_db()
+    log.info("🔥 Warming up server & booting AI models in the background...")
+    # LLM, embedder, translator and vector DB load concurrently; cached endpoints work meanwhile (see /health)
+    loaders = {
+        "llm": boot_llm,
+        "embedder": boot_embedder,
+        "translator": boot_translator,
+        "vector_db": boot_vector_db,
+    }
+    if RERANK_ENABLED:
+        loaders["reranker"] = boot_reranker
+    boot.start(loaders)
     
     projects_data = load_projects_data()
     
     if not projects_data.get("projects"):
-        print("\n📝 No projects found. Please create a new project and upload files from the frontend.")
+        log.info("\n📝 No projects found. Please create a new project and upload files from the frontend.")
         save_projects_data({"projects": {}})
     else:
         project_count = len(projects_data['projects'])
         projects_names = list(projects_data['projects'].keys())
-        print(f"\n📂 Found {project_count} project(s): {', '.join(projects_names)}")
-        print("💡 Remember to call /projects/{project_name}/load to inject a project's files into the AI memory.")
+        log.info(f"\n📂 Found {project_count} project(s): {', '.join(projects_names)}")
+        log.info("💡 Remember to call /projects/{project_name}/load to inject a project's files into the AI memory.")
+
+    # Idles until the LLM is ready
+    scheduler.start()
         
     yield
-    print("\n👋 Shutting down LetsLearn Server...")
+    log.info("\n👋 Shutting down LetsLearn Server...")
+    scheduler.stop()
 
 app = FastAPI(title="LetsLearn API", description="API for Local RAG study application", lifespan=lifespan)
 
 # Add CORS to allow requests from your frontend
+# Per-request trace with spans for embed/retrieve/prompt_eval/decode/translate/persist (see /metrics)
+app.add_middleware(TracingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -64,9 +95,12 @@ app.add_middleware(
 )
 
 PROJECTS_FILE = "projects.json"
+# Serializes projects.json access between request handlers and the pregen thread (reentrant: load nests in updates)
+projects_lock = threading.RLock()
 DATA_DIR = "data"
 MODELS_DIR = "models"
 MODEL_PATH = os.path.join(MODELS_DIR, "mistral.gguf")
+llm = None
 
 # Ensure required directories exist
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -78,23 +112,79 @@ os.environ["HF_HUB_OFFLINE"] = "1"
 
 
 MODEL_NAME = "facebook/nllb-200-distilled-600M"
+tokenizer = None
+model = None
 
-try:
-    print(f"🌍 Loading Translation Model: {MODEL_NAME}...")
+boot = StartupOrchestrator()
+answer_cache = AnswerCache()
 
-    tokenizer = AutoTokenizer.from_pretrained(
-        MODEL_NAME,
-        use_fast=False   # 🔥 critical for NLLB
-    )
 
-    model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME)
+def boot_llm():
+    global llm
+    if LLM_BACKEND == "fake":
+        with boot.phase("llm", "load"):
+            llm = load_llm(MODEL_PATH)
+        return True
+    if not os.path.exists(MODEL_PATH):
+        log.warning(f"⚠️ ERROR: Model not found at '{MODEL_PATH}'.")
+        log.info("Please ensure your Mistral model is downloaded before trying to chat.")
+        return False
+    with boot.phase("llm", "import"):
+        import llama_cpp
+    with boot.phase("llm", "load"):
+        llm = load_llm(MODEL_PATH)
+    return llm is not None
 
-    print("✅ Translation Model Ready.")
 
-except Exception as e:
-    print(f"⚠️ Could not load translation model: {e}")
-    tokenizer = None
-    model = None
+def boot_embedder():
+    with boot.phase("embedder", "import"):
+        if EMBEDDER_BACKEND == "onnx":
+            import onnxruntime
+        else:
+            import sentence_transformers
+    with boot.phase("embedder", "load"):
+        load_embedder()
+
+
+def boot_reranker():
+    with boot.phase("reranker", "load"):
+        return load_reranker() is not None
+
+
+def boot_translator():
+    global tokenizer, model
+    with boot.phase("translator", "import"):
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+    with boot.phase("translator", "load"):
+        log.info(f"🌍 Loading Translation Model: {MODEL_NAME}...")
+        tok = AutoTokenizer.from_pretrained(
+            MODEL_NAME,
+            use_fast=False   # 🔥 critical for NLLB
+        )
+        mdl = AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME)
+    # Publish together so en_hi/hi_en never see a half-loaded pair
+    tokenizer, model = tok, mdl
+
+
+def boot_vector_db():
+    with boot.phase("vector_db", "import"):
+        if rag_core.VECTOR_STORE == "numpy":
+            import vector_store
+        else:
+            import chromadb
+    with boot.phase("vector_db", "load"):
+        log.info("🧹 Auto-clearing vector DB on startup...")
+        clear_db()
+
+
+def require_llm():
+    """Raises 503 while the LLM is still booting, 500 if it failed or is missing."""
+    if llm:
+        return
+    if boot.is_loading("llm"):
+        raise HTTPException(status_code=503, detail="LLM is still loading. Please retry in a moment.")
+    log.error("❌ [ERROR] LLM is not loaded.")
+    raise HTTPException(status_code=500, detail="LLM is not loaded. Ensure Mistral model exists.")
 
 def en_hi(text):
     if not model or not tokenizer:
@@ -102,13 +192,14 @@ def en_hi(text):
 
     tokenizer.src_lang = "eng_Latn"
 
-    inputs = tokenizer(text, return_tensors="pt")
+    with span("translate", direction="en-hi"):
+        inputs = tokenizer(text, return_tensors="pt")
 
-    translated_tokens = model.generate(
-        **inputs,
-        forced_bos_token_id=tokenizer.convert_tokens_to_ids("hin_Deva"),
-        max_length=512
-    )
+        translated_tokens = model.generate(
+            **inputs,
+            forced_bos_token_id=tokenizer.convert_tokens_to_ids("hin_Deva"),
+            max_length=512
+        )
 
     hi = tokenizer.batch_decode(translated_tokens, skip_special_tokens=True)[0]
     return hi
@@ -117,28 +208,40 @@ def hi_en(text):
     if not model or not tokenizer:
         return text
     tokenizer.src_lang = "hin_Deva"
-    inputs = tokenizer(text, return_tensors="pt")
-    translated_tokens = model.generate(
-        **inputs,
-        forced_bos_token_id=tokenizer.convert_tokens_to_ids("eng_Latn"),
-        max_length=512
-    )
+    with span("translate", direction="hi-en"):
+        inputs = tokenizer(text, return_tensors="pt")
+        translated_tokens = model.generate(
+            **inputs,
+            forced_bos_token_id=tokenizer.convert_tokens_to_ids("eng_Latn"),
+            max_length=512
+        )
     en = tokenizer.batch_decode(translated_tokens, skip_special_tokens=True)[0]
     return en
 
-llm = None
+# Project whose documents are currently embedded in the vector DB (set by /load)
+active_project = None
+# answer_cache.corpus_key of the embedded documents; keys the semantic answer cache
+active_corpus = None
 
 def load_projects_data():
     """Load projects file mapping with backward compatible cache migration."""
+    with projects_lock:
+        return _load_projects_data()
+
+def _load_projects_data():
     if os.path.exists(PROJECTS_FILE):
         with open(PROJECTS_FILE, 'r') as f:
             try:
                 data = json.load(f)
-            except json.JSONDecodeError:
+            except json.JSONDecodeError as e:
+                # Keep the unreadable file; the next save would otherwise replace every project with nothing
+                backup = f"{PROJECTS_FILE}.corrupt-{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                shutil.copyfile(PROJECTS_FILE, backup)
+                log.error(f"❌ {PROJECTS_FILE} is not valid JSON ({e}); a copy was kept at {backup}.")
                 return {"projects": {}}
         # Migrate existing projects that don't have a cache key
         changed = False
-        for proj in data.get("projects", {}).values():
+        for proj_name, proj in data.get("projects", {}).items():
             if "cache" not in proj:
                 proj["cache"] = {"topics": None, "quizzes": {}, "flashcards": {}, "notes": {}, "summary": None}
                 changed = True
@@ -148,8 +251,8 @@ def load_projects_data():
             if "summary" not in proj["cache"]:
                 proj["cache"]["summary"] = None
                 changed = True
-            if "results" not in proj:
-                proj["results"] = []
+            # Result history lives in data/<project>/results.jsonl, not in this file
+            if migrate_inline_results(proj_name, proj):
                 changed = True
             if "images" not in proj.get("cache", {}):
                 proj.setdefault("cache", {})["images"] = {}
@@ -157,18 +260,45 @@ def load_projects_data():
             if "mastery" not in proj:
                 proj["mastery"] = {}
                 changed = True
+            # Uploads used to be copied to data/<project>/<filename>; move them into the blob store
+            if migrate_project_files(proj):
+                changed = True
         if changed:
             save_projects_data(data)
         return data
     return {"projects": {}}
 
 def save_projects_data(data):
-    """Save to projects file mapping."""
-    with open(PROJECTS_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+    """Save to projects file mapping. Written to a temp file and swapped in, so readers never see half a file."""
+    with projects_lock, span("persist", target=PROJECTS_FILE):
+        tmp_path = PROJECTS_FILE + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, PROJECTS_FILE)
+
+@contextmanager
+def update_projects_data():
+    """Read-modify-write of projects.json under projects_lock; saved when the block exits without an error."""
+    with projects_lock:
+        data = load_projects_data()
+        yield data
+        save_projects_data(data)
 
 
 
+# Global lock to prevent concurrent GGML inference crashing
+llm_lock = threading.Lock()
+# Fills quiz/flashcard/notes caches in the background; user requests pre-empt it via scheduler.interactive()
+scheduler = PregenScheduler(
+    llm_lock,
+    get_llm=lambda: llm,
+    get_active_project=lambda: active_project,
+    load_data=load_projects_data,
+    save_data=save_projects_data,
+    data_lock=projects_lock,
+)
+
+
 # Models
 class ProjectCreate(BaseModel):
     name: str
@@ -178,6 +308,7 @@ class ChatRequest(BaseModel):
     lang: str = "en"
     k: int = 2
     max_chars: int = 1500
+    cache: Optional[bool] = None  # Semantic answer cache; defaults to LETSLEARN_ANSWER_CACHE
 
 class ContextualChatRequest(BaseModel):
     query: str
@@ -197,6 +328,42 @@ class FlashcardRequest(BaseModel):
 
 class NotesRequest(BaseModel):
     topic: str
+
+class PregenConfigRequest(BaseModel):
+    enabled: bool = True
+    quiz_pool: int = 10
+    quiz_batch: int = 5
+    flashcards: int = 5
+    notes: bool = True
+
+@app.get("/health")
+async def health():
+    """Per-component boot readiness and timings. Cached endpoints are usable before the LLM is ready."""
+    return boot.status()
+
+@app.get("/metrics")
+async def metrics():
+    """Latency histograms per route and span, decode tokens/sec, LLM queue depth and cache hit rates."""
+    result = metrics_snapshot()
+    pregen = scheduler.status()
+    result["queue"] = {
+        "interactive_waiting": pregen["interactive_waiting"],
+        "llm_busy": scheduler.llm_busy(),
+        "background_job": pregen["current_job"],
+    }
+    result["caches"]["answer_cache"] = answer_cache.metrics()
+    return result
+
+@app.get("/metrics/traces")
+async def get_traces(limit: int = 20):
+    """Most recent sampled request traces (LETSLEARN_TRACE_SAMPLE of all requests)."""
+    return {"traces": sampled_traces(limit)}
+
+@app.post("/metrics/traces/dump")
+async def dump_sampled_traces():
+    """Writes the sampled traces held in memory to traces/traces_<timestamp>.jsonl."""
+    return dump_traces()
+
 @app.get("/projects")
 async def get_projects():
     """Returns a list of all projects and their loaded files."""
@@ -205,24 +372,21 @@ async def get_projects():
 @app.post("/projects")
 async def create_project(req: ProjectCreate):
     """Creates a tracking space for a newly named project."""
-    data = load_projects_data()
     project_name = req.name.strip()
-    
-    if project_name in data["projects"]:
-        raise HTTPException(status_code=400, detail="Project already exists")
-    
-    data["projects"][project_name] = {
-        "loaded_files": [],
-        "cache": {
-            "topics": None,
-            "quizzes": {},
-            "flashcards": {},
-            "notes": {},
-            "summary": None
-        },
-        "results": []
-    }
-    save_projects_data(data)
+    with update_projects_data() as data:
+        if project_name in data["projects"]:
+            raise HTTPException(status_code=400, detail="Project already exists")
+        data["projects"][project_name] = {
+            "loaded_files": [],
+            "documents": {},
+            "cache": {
+                "topics": None,
+                "quizzes": {},
+                "flashcards": {},
+                "notes": {},
+                "summary": None
+            }
+        }
     
     # Create the physical folder
     project_dir = os.path.join(DATA_DIR, project_name)
@@ -233,23 +397,45 @@ async def create_project(req: ProjectCreate):
 @app.post("/projects/{project_name}/load")
 async def load_project(project_name: str):
     """Clears the Vector DB, then parses all previously uploaded files for this project to inject them."""
+    global active_project, active_corpus
     data = load_projects_data()
     if project_name not in data["projects"]:
         raise HTTPException(status_code=404, detail="Project not found")
         
+    # The startup clear_db must finish first or it would wipe what we embed here
+    await asyncio.to_thread(boot.wait, "vector_db")
+
     # Clear memory so it doesn't overlap with another project's context
+    active_project = None
+    active_corpus = None
     clear_db()
+    # The keyword index is persisted per project; unchanged files reuse their postings
+    keyword_index = open_keyword_index(os.path.join(DATA_DIR, project_name))
     
-    files = data["projects"][project_name]["loaded_files"]
+    project = data["projects"][project_name]
+    files = project["loaded_files"]
+    documents = project.get("documents", {})
     success_count = 0
-    
-    for file_path in files:
-        if os.path.exists(file_path):
-            parsed_text = parse_document(file_path)
-            if parsed_text:
-                chunks = chunk_text(parsed_text)
-                add_docs(chunks, source=os.path.basename(file_path))
-                success_count += 1
+    present = []
+
+    for name in files:
+        if name not in documents or not os.path.exists(document_path(documents[name])):
+            continue
+        present.append(name)
+        # Unchanged documents come from their parsed-text artifact instead of being re-extracted
+        parsed = parsed_segments(document_path(documents[name]), documents[name]["blob"])
+        chunks = chunk_document(*parsed) if parsed else []
+        if chunks:
+            add_docs(chunks, source=name)
+            register_sections(project_name, name, chunks)
+            success_count += 1
+
+    keyword_index.retain(present)
+    keyword_index.save()
+    retain_sources(project_name, present)
+
+    active_project = project_name
+    active_corpus = corpus_key(project_name, project)
                 
     return {
         "message": f"Project '{project_name}' successfully loaded into active AI memory.", 
@@ -260,66 +446,102 @@ async def load_project(project_name: str):
 @app.post("/projects/{project_name}/upload")
 async def upload_file(project_name: str, file: UploadFile = File(...)):
     """Uploads a new file directly to a project's folder, saves it, and immediately embeds it."""
+    global active_corpus
     data = load_projects_data()
     if project_name not in data["projects"]:
         raise HTTPException(status_code=404, detail="Project not found")
         
-    project_dir = os.path.join(DATA_DIR, project_name)
-    os.makedirs(project_dir, exist_ok=True) # Failsafe
-    
-    file_path = os.path.join(project_dir, file.filename)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    # Update JSON registry mapping
-    if file_path not in data["projects"][project_name]["loaded_files"]:
-        data["projects"][project_name]["loaded_files"].append(file_path)
-        save_projects_data(data)
+    # Streamed into the content-addressed store; identical content is kept once across all projects
+    record = await save_upload(file, file.filename or "document")
+
+    # Update JSON registry mapping (re-read: other requests may have saved while the upload streamed)
+    with update_projects_data() as data:
+        if project_name not in data["projects"]:
+            raise HTTPException(status_code=404, detail="Project not found")
+        project = data["projects"][project_name]
+        name = document_name(project, file.filename or "document", record["blob"])
+        if name not in project.setdefault("documents", {}):
+            project["documents"][name] = record
+            project["loaded_files"].append(name)
+        file_path = document_path(project["documents"][name])
         
-    # Embed the newly uploaded document directly
-    parsed_text = parse_document(file_path)
-    if parsed_text:
-        chunks = chunk_text(parsed_text)
-        add_docs(chunks, source=file.filename)
-        return {"message": f"File '{file.filename}' uploaded and actively embedded.", "path": file_path}
+    # Embed the newly uploaded document directly (after the startup clear_db has run)
+    await asyncio.to_thread(boot.wait, "vector_db")
+    parsed = parsed_segments(file_path, record["blob"])
+    chunks = chunk_document(*parsed) if parsed else []
+    if chunks:
+        add_docs(chunks, source=name)
+        rag_core.keyword_index.save()
+        if project_name == active_project:
+            active_corpus = corpus_key(project_name, project)
+        # Only the new file's sections need summarizing; the project summary is rebuilt from all of them
+        if register_sections(project_name, name, chunks):
+            with update_projects_data() as data:
+                # Topics are reduced from the same section summaries, so both are stale now
+                data["projects"][project_name]["cache"]["summary"] = None
+                data["projects"][project_name]["cache"]["topics"] = None
+        return {"message": f"File '{name}' uploaded and actively embedded.", "name": name,
+                "blob": record["blob"], "path": file_path}
     else:
         raise HTTPException(status_code=500, detail="Failed to parse text format from document uploaded.")
 
-import threading
-# Global lock to prevent concurrent GGML inference crashing
-llm_lock = threading.Lock()
-
 @app.post("/chat")
 async def chat(req: ChatRequest, request: Request):
     """Streams the real-time AI reply text directly to the frontend based on the currently loaded memory."""
-    if not llm:
-        raise HTTPException(status_code=500, detail="LLM is not loaded. Ensure Mistral model exists.")
     if not req.query.strip():
         raise HTTPException(status_code=400, detail="Query string cannot be empty.")
-    if llm_lock.locked():
-        raise HTTPException(status_code=429, detail="AI is currently processing another request.")
         
     query = req.query
     if req.lang == "hi":
-        print(f"🔄 Translating Hindi input to English: {query}")
+        log.info(f"🔄 Translating Hindi input to English: {query}")
         query = hi_en(query)
-        print(f"✅ Translated: {query}")
+        log.info(f"✅ Translated: {query}")
+
+    # Near-identical questions are replayed from the cache without touching the LLM
+    corpus = active_corpus
+    use_cache = (ANSWER_CACHE_ENABLED if req.cache is None else req.cache) and boot.is_ready("embedder") and corpus is not None
+    cache_params = {"k": req.k, "max_chars": req.max_chars, "retrieval": rag_core.RETRIEVAL_MODE, "rerank": rag_core.RERANK_ENABLED}
+    query_vector = None
+    if use_cache:
+        query_vector = (await asyncio.to_thread(embed, [query]))[0]
+        cached = answer_cache.lookup(query_vector, cache_params, corpus)
+        cache_event("answer", cached is not None)
+        if cached is not None:
+            annotate(cache="answer")
+            return StreamingResponse(replay(cached), media_type="text/plain")
+
+    require_llm()
+    if scheduler.llm_busy():
+        raise HTTPException(status_code=429, detail="AI is currently processing another request.")
 
     async def stream_generator():
-        with llm_lock:
+        full_response = []
+        completed = False
+        async with scheduler.interactive():
             stream = generate_answer(llm, query, k=req.k, max_chars=req.max_chars)
             for chunk in stream:
                 if await request.is_disconnected():
-                    print("🛑 [CHAT] Client disconnected, aborting generation.")
+                    log.info("🛑 [CHAT] Client disconnected, aborting generation.")
                     break
                 text = chunk["choices"][0].get("text", "")
                 if text:
+                    full_response.append(text)
                     yield text
+            else:
+                completed = True
+        # Skipped if an upload or project switch changed the documents mid-answer
+        if use_cache and completed and corpus == active_corpus:
+            answer_cache.store(query, query_vector, cache_params, "".join(full_response), corpus)
                 
     return StreamingResponse(stream_generator(), media_type="text/plain")
 
 
+@app.get("/chat/cache")
+async def chat_cache_stats():
+    """Hit-rate and size metrics of the semantic answer cache."""
+    return answer_cache.metrics()
+
+
 @app.post("/translate")
 async def translate(req: dict):
     """Translates English text to Hindi using NLLB. Offloaded to thread to prevent blocking AI stream."""
@@ -337,27 +559,27 @@ class VisualChatRequest(BaseModel):
 @app.post("/chat/visual")
 async def chat_visual(req: VisualChatRequest, request: Request):
     """Local multimodal streaming chat: text + Mermaid diagram or SD image."""
-    if not llm:
-        raise HTTPException(status_code=500, detail="LLM is not loaded.")
+    require_llm()
     if not req.query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
-    if llm_lock.locked():
+    if scheduler.llm_busy():
         raise HTTPException(status_code=429, detail="AI is currently processing another request. Please wait.")
 
     async def stream():
         import json as _json
 
         # Step 1 — Route query
-        route = route_visual(llm, req.query)
+        async with scheduler.interactive():
+            route = route_visual(llm, req.query)
 
         # Step 2 — Stream the text explanation first
         full_text = ""
         if route in ["text", "diagram"]:
-            with llm_lock:
+            async with scheduler.interactive():
                 text_stream = generate_answer(llm, req.query, k=req.k, max_chars=req.max_chars, is_visual=(route == "diagram"))
                 for chunk in text_stream:
                     if await request.is_disconnected():
-                        print("🛑 [VISUAL CHAT] Client disconnected, aborting generation.")
+                        log.info("🛑 [VISUAL CHAT] Client disconnected, aborting generation.")
                         break
                     text = chunk["choices"][0].get("text", "")
                     if text:
@@ -367,43 +589,52 @@ async def chat_visual(req: VisualChatRequest, request: Request):
         # Step 3 — Generate Diagram/Image synchronously using the newly generated text context
         if route == "diagram":
             yield _json.dumps({"type": "new_message"}) + "\n"
-            mermaid_code = generate_mermaid(llm, req.query, context=full_text)
+            async with scheduler.interactive():
+                mermaid_code = generate_mermaid(llm, req.query, context=full_text)
             if mermaid_code:
                 yield _json.dumps({"type": "mermaid", "content": mermaid_code}) + "\n"
         elif route == "visual":
             yield _json.dumps({"type": "text", "content": "🎨 Generating image... (This will take approx 15-20 seconds, please wait!)\n"}) + "\n"
-            sd_prompt = create_sd_prompt(llm, req.query)
+            async with scheduler.interactive():
+                sd_prompt = create_sd_prompt(llm, req.query)
 
         # Step 4 — Generate SD Image in the background after text starts/finishes
         if route == "visual" and sd_prompt:
-            img_b64 = await asyncio.to_thread(generate_local_image, sd_prompt)
-            if img_b64:
+            img_bytes = await asyncio.to_thread(generate_local_image, sd_prompt)
+            if img_bytes:
                 file_path = None
                 try:
-                    import base64 as _b64
-                    images_dir = os.path.join("data", req.project_name, "images")
+                    images_dir = os.path.join(DATA_DIR, req.project_name, "images")
                     os.makedirs(images_dir, exist_ok=True)
                     ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                     safe = "".join(c if c.isalnum() else "_" for c in req.query[:30])
                     file_path = os.path.join(images_dir, f"{ts}_{safe}.png")
                     with open(file_path, "wb") as f:
-                        f.write(_b64.b64decode(img_b64))
-                    data = load_projects_data()
-                    if req.project_name in data["projects"]:
-                        data["projects"][req.project_name]["cache"]["images"][req.query[:60]] = {
-                            "path": file_path, "prompt": sd_prompt,
-                            "created_at": datetime.datetime.now().isoformat()
-                        }
-                        save_projects_data(data)
+                        f.write(img_bytes)
+                    with update_projects_data() as data:
+                        if req.project_name in data["projects"]:
+                            data["projects"][req.project_name]["cache"]["images"][req.query[:60]] = {
+                                "path": file_path, "prompt": sd_prompt,
+                                "created_at": datetime.datetime.now().isoformat()
+                            }
                 except Exception as e:
-                    print(f"⚠️ [SD] Save error: {e}")
-                yield _json.dumps({"type": "image", "content": img_b64, "path": file_path or ""}) + "\n"
+                    log.warning(f"⚠️ [SD] Save error: {e}")
+                if file_path and os.path.exists(file_path):
+                    # Only the URL goes over the stream; the browser fetches (and caches) the PNG itself
+                    yield _json.dumps({"type": "image", "url": image_url(req.project_name, file_path), "path": file_path}) + "\n"
+                else:
+                    yield _json.dumps({"type": "text", "content": "\n*(Image could not be saved to disk.)*"}) + "\n"
             else:
                 yield _json.dumps({"type": "text", "content": "\n*(Image generation unavailable — is ComfyUI running?)*"}) + "\n"
 
     return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
+def image_url(project_name: str, file_path: str) -> str:
+    """Relative URL under which a saved project image is served."""
+    return f"/projects/{urllib.parse.quote(project_name, safe='')}/images/{urllib.parse.quote(os.path.basename(file_path))}"
+
+
 @app.get("/projects/{project_name}/images")
 async def list_project_images(project_name: str):
     """Returns all saved image records for a given project."""
@@ -411,24 +642,54 @@ async def list_project_images(project_name: str):
     if project_name not in data["projects"]:
         raise HTTPException(status_code=404, detail="Project not found")
     images = data["projects"][project_name].get("cache", {}).get("images", {})
-    return {"project": project_name, "images": images}
+    enriched = {
+        key: {**record, "url": image_url(project_name, record.get("path", ""))}
+        for key, record in images.items()
+    }
+    return {"project": project_name, "images": enriched}
+
+
+@app.get("/projects/{project_name}/images/{filename}")
+async def get_project_image(project_name: str, filename: str, request: Request):
+    """Serves a saved image straight from disk. Supports Range requests and ETag revalidation."""
+    if project_name not in load_projects_data()["projects"]:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if filename != os.path.basename(filename) or filename.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid image filename")
+    images_dir = os.path.realpath(os.path.join(DATA_DIR, project_name, "images"))
+    file_path = os.path.realpath(os.path.join(images_dir, filename))
+    # Project names are user-chosen; never serve anything outside the data directory
+    data_root = os.path.realpath(DATA_DIR)
+    if os.path.commonpath([data_root, images_dir]) != data_root or os.path.dirname(file_path) != images_dir:
+        raise HTTPException(status_code=400, detail="Invalid image path")
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    stat = os.stat(file_path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    # Image filenames are timestamped and never rewritten, so clients may cache them indefinitely
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(file_path, media_type="image/png", headers=headers)
 
 @app.post("/projects/{project_name}/chat/contextual")
 async def chat_contextual(project_name: str, req: ContextualChatRequest, request: Request):
     """Streams the real-time AI reply text directly to the frontend based on explicitly selected text."""
-    if not llm:
-        raise HTTPException(status_code=500, detail="LLM is not loaded. Ensure Mistral model exists.")
+    require_llm()
     if not req.query.strip() or not req.selected_text.strip():
         raise HTTPException(status_code=400, detail="Query and selected_text strings cannot be empty.")
-    if llm_lock.locked():
+    if scheduler.llm_busy():
         raise HTTPException(status_code=429, detail="AI is currently processing another request.")
         
     async def stream_generator():
-        with llm_lock:
+        async with scheduler.interactive():
             stream = generate_contextual_answer(llm, req.selected_text, req.query)
             for chunk in stream:
                 if await request.is_disconnected():
-                    print("🛑 [CONTEXTUAL CHAT] Client disconnected, aborting generation.")
+                    log.info("🛑 [CONTEXTUAL CHAT] Client disconnected, aborting generation.")
                     break
                 text = chunk["choices"][0].get("text", "")
                 if text:
@@ -436,13 +697,25 @@ async def chat_contextual(project_name: str, req: ContextualChatRequest, request
                 
     return StreamingResponse(stream_generator(), media_type="text/plain")
 
+def quiz_segments(project: dict, topic_key: str) -> list:
+    """
+    (topic name, pool) pairs a quiz is drawn from. A topic quiz uses its own pool; an "all" quiz
+    spans every topic pool so the adaptive sampler can favour the weakest topics.
+    """
+    quizzes = project["cache"]["quizzes"]
+    names = {t.lower().strip(): t for t in parse_topics(project["cache"].get("topics"))}
+    if topic_key != "all":
+        return [(names.get(topic_key, topic_key), quizzes.get(topic_key, []))]
+    segments = [("General", quizzes.get("all", []))]
+    for key, pool in quizzes.items():
+        if key != "all" and isinstance(pool, list) and pool:
+            segments.append((names.get(key, key), pool))
+    return segments
+
 @app.post("/projects/{project_name}/quiz")
 async def generate_quiz_endpoint(project_name: str, req: QuizRequest, request: Request):
     """Generates a quiz for the given project. Smart caching by topic."""
-    import random as _random
-    print(f"\n📥 [REQUEST] POST /projects/{project_name}/quiz | Count: {req.count} | Topic: '{req.topic}'")
-    if not llm:
-        raise HTTPException(status_code=500, detail="LLM is not loaded.")
+    log.info(f"\n📥 [REQUEST] POST /projects/{project_name}/quiz | Count: {req.count} | Topic: '{req.topic}'")
     data = load_projects_data()
     if project_name not in data["projects"]:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -461,40 +734,66 @@ async def generate_quiz_endpoint(project_name: str, req: QuizRequest, request: R
         except:
             cache["quizzes"][topic_key] = []
 
-    cached_pool = cache["quizzes"][topic_key]
-    
-    # Randomization Helper: Shuffle options and return randomized sample
-    def finalize_quiz(pool, count):
-        sample = _random.sample(pool, min(len(pool), count))
-        # Ensure shuffling of options for each question
-        final = []
-        for q in sample:
-            q_copy = q.copy()
-            options = q_copy["options"]
-            _random.shuffle(options)
-            q_copy["options"] = options
-            final.append(q_copy)
-        return final
+    project = data["projects"][project_name]
+    segments = quiz_segments(project, topic_key)
+    available = sum(len(pool) for _, pool in segments)
 
     # Case 1: We have enough in cache
-    if len(cached_pool) >= req.count:
-        print(f"⚡ [CACHE] Returning {req.count} randomized questions from pool ({len(cached_pool)} total)")
-        final_quiz = finalize_quiz(cached_pool, req.count)
+    cache_event("quiz_pool", available >= req.count)
+    if available >= req.count:
+        log.info(f"⚡ [CACHE] Returning {req.count} adaptively sampled questions from pool ({available} total)")
+        annotate(cache="quiz_pool")
+        final_quiz = sample_adaptive(project_name, project, segments, req.count)
+        if req.fmt == "ndjson":
+            return StreamingResponse(iter([json.dumps(q) + "\n" for q in final_quiz]), media_type="application/x-ndjson")
         return StreamingResponse(iter([json.dumps(final_quiz)]), media_type="application/json")
 
     # Case 2: Need to generate more
-    diff = req.count - len(cached_pool)
-    print(f"🧠 [AI] Generating {diff} additional questions for topic: '{topic_key}'")
+    require_llm()
+    diff = req.count - available
+    log.info(f"🧠 [AI] Generating {diff} additional questions for topic: '{topic_key}'")
 
     extra_context = cache.get("notes", {}).get(topic_key, "") if topic_key != "all" else "\n".join(cache.get("notes", {}).values())
 
+    def pool_question(question) -> list:
+        """Adds one generated question to the topic pool; returns it unless it was a (near-)duplicate."""
+        with update_projects_data() as updated_data:
+            updated_pool = updated_data["projects"][project_name]["cache"]["quizzes"].get(topic_key, [])
+            if isinstance(updated_pool, str): updated_pool = []
+            accepted = add_questions(project_name, updated_pool, [question])
+            updated_data["projects"][project_name]["cache"]["quizzes"][topic_key] = updated_pool
+        return accepted
+
+    async def ndjson_generator():
+        # Pooled questions go out first; each new one follows as soon as its closing brace is decoded
+        for q in sample_adaptive(project_name, project, segments, available):
+            yield json.dumps(q) + "\n"
+        parser = QuizStreamParser()
+        sent = 0
+        async with scheduler.interactive():
+            for chunk in generate_quiz(llm, diff, "json", req.topic, extra_context=extra_context):
+                if await request.is_disconnected():
+                    log.info(f"🛑 [QUIZ] Client disconnected after {sent} new question(s), aborting generation.")
+                    return
+                text = chunk["choices"][0].get("text", "")
+                for question in parser.feed(text):
+                    # Reload/save of projects.json plus the bge dedup would otherwise block the event loop
+                    for q in await asyncio.to_thread(pool_question, question):
+                        sent += 1
+                        yield json.dumps(quiz_item(q, segments[0][0])) + "\n"
+        if not sent:
+            log.warning(f"⚠️ [QUIZ] No new questions were accepted ({parser.rejected} invalid).")
+
+    if req.fmt == "ndjson":
+        return StreamingResponse(ndjson_generator(), media_type="application/x-ndjson")
+
     async def stream_generator():
         full_response = []
-        with llm_lock:
+        async with scheduler.interactive():
             # Generate the difference
             for chunk in generate_quiz(llm, diff, "json", req.topic, extra_context=extra_context):
                 if await request.is_disconnected():
-                    print("🛑 [QUIZ] Client disconnected, aborting generation.")
+                    log.info("🛑 [QUIZ] Client disconnected, aborting generation.")
                     return # Exit generator early
                 text = chunk["choices"][0].get("text", "")
                 if text:
@@ -502,29 +801,27 @@ async def generate_quiz_endpoint(project_name: str, req: QuizRequest, request: R
                 
         # Parse new questions and update cache
         try:
-            raw_new = "".join(full_response)
-            import re as _re
-            # More robust regex to find JSON array even if LLM adds fluff
-            match = _re.search(r'\[\s*\{.*\}\s*\]', raw_new, _re.DOTALL)
-            if match:
-                new_qs = json.loads(match.group(0))
+            new_qs = parse_quiz_json("".join(full_response))
+            if new_qs:
                 # Add to pool
-                updated_data = load_projects_data()
-                updated_pool = updated_data["projects"][project_name]["cache"]["quizzes"].get(topic_key, [])
-                if isinstance(updated_pool, str): updated_pool = []
-                updated_pool.extend(new_qs)
-                updated_data["projects"][project_name]["cache"]["quizzes"][topic_key] = updated_pool
-                save_projects_data(updated_data)
+                def pool_questions():
+                    with update_projects_data() as updated_data:
+                        updated_pool = updated_data["projects"][project_name]["cache"]["quizzes"].get(topic_key, [])
+                        if isinstance(updated_pool, str): updated_pool = []
+                        add_questions(project_name, updated_pool, new_qs)
+                        updated_data["projects"][project_name]["cache"]["quizzes"][topic_key] = updated_pool
+                    return updated_data
+                updated_data = await asyncio.to_thread(pool_questions)
                 
-                # Combine original cache + new and return requested count
-                combined = cached_pool + new_qs
-                final_quiz = finalize_quiz(combined, req.count)
+                # Serve from the deduplicated pool
+                updated_project = updated_data["projects"][project_name]
+                final_quiz = sample_adaptive(project_name, updated_project, quiz_segments(updated_project, topic_key), req.count)
                 yield json.dumps(final_quiz)
             else:
-                print("⚠️ [QUIZ] Failed to find valid JSON array in LLM response.")
-                yield json.dumps(finalize_quiz(cached_pool, req.count)) # Return whatever we have in cache
+                log.warning("⚠️ [QUIZ] Failed to find valid JSON array in LLM response.")
+                yield json.dumps(sample_adaptive(project_name, project, segments, req.count)) # Return whatever we have in cache
         except Exception as e:
-            print(f"❌ [ERROR] Cache update failed: {e}")
+            log.error(f"❌ [ERROR] Cache update failed: {e}")
             yield "".join(full_response) # Fallback to raw if logic fails
 
     return StreamingResponse(stream_generator(), media_type="application/json")
@@ -532,10 +829,7 @@ async def generate_quiz_endpoint(project_name: str, req: QuizRequest, request: R
 @app.post("/projects/{project_name}/flashcards")
 async def generate_flashcards_endpoint(project_name: str, req: FlashcardRequest, request: Request):
     """Generates flashcards for the given project. Caches result by topic (not 'all')."""
-    print(f"\n📥 [REQUEST] POST /projects/{project_name}/flashcards | Count: {req.count} | Topic: '{req.topic}'")
-    if not llm:
-        print("❌ [ERROR] LLM is not loaded.")
-        raise HTTPException(status_code=500, detail="LLM is not loaded.")
+    log.info(f"\n📥 [REQUEST] POST /projects/{project_name}/flashcards | Count: {req.count} | Topic: '{req.topic}'")
     data = load_projects_data()
     if project_name not in data["projects"]:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -543,11 +837,14 @@ async def generate_flashcards_endpoint(project_name: str, req: FlashcardRequest,
     topic_key = req.topic.lower().strip()
     cache = data["projects"][project_name]["cache"]
 
+    cache_event("flashcards", topic_key in cache["flashcards"])
     if topic_key in cache["flashcards"]:
-        print(f"⚡ [CACHE] Returning cached flashcards for topic: '{topic_key}'")
+        log.info(f"⚡ [CACHE] Returning cached flashcards for topic: '{topic_key}'")
+        annotate(cache="flashcards")
         cached = cache["flashcards"][topic_key]
         return StreamingResponse(iter([cached]), media_type="text/plain")
 
+    require_llm()
     extra_context = ""
     if topic_key == "all":
         extra_context = "\n".join(cache.get("notes", {}).values())
@@ -556,19 +853,20 @@ async def generate_flashcards_endpoint(project_name: str, req: FlashcardRequest,
 
     async def stream_generator():
         full_response = []
-        with llm_lock:
+        async with scheduler.interactive():
             for chunk in generate_flashcards(llm, req.count, req.topic, extra_context=extra_context):
                 if await request.is_disconnected():
-                    print("🛑 [FLASHCARDS] Client disconnected, aborting generation.")
+                    log.info("🛑 [FLASHCARDS] Client disconnected, aborting generation.")
                     break
                 text = chunk["choices"][0].get("text", "")
                 if text:
                     full_response.append(text)
                     yield text
-        result = data.copy()
-        result["projects"][project_name]["cache"]["flashcards"][topic_key] = "".join(full_response)
-        save_projects_data(result)
-        print(f"💾 [CACHE] Saved flashcards for topic: '{topic_key}'")
+        # Reload: pregen or other requests may have saved while this was generating
+        with update_projects_data() as result:
+            if project_name in result["projects"]:
+                result["projects"][project_name]["cache"]["flashcards"][topic_key] = "".join(full_response)
+        log.info(f"💾 [CACHE] Saved flashcards for topic: '{topic_key}'")
 
     return StreamingResponse(stream_generator(), media_type="text/plain")
 
@@ -576,10 +874,7 @@ async def generate_flashcards_endpoint(project_name: str, req: FlashcardRequest,
 async def generate_notes_endpoint(project_name: str, req: NotesRequest, request: Request):
     """Generates study notes for the given topic. Caches result by topic."""
     from rag_core import generate_notes
-    print(f"\n📥 [REQUEST] POST /projects/{project_name}/notes | Topic: '{req.topic}'")
-    if not llm:
-        print("❌ [ERROR] LLM is not loaded.")
-        raise HTTPException(status_code=500, detail="LLM is not loaded.")
+    log.info(f"\n📥 [REQUEST] POST /projects/{project_name}/notes | Topic: '{req.topic}'")
     data = load_projects_data()
     if project_name not in data["projects"]:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -587,36 +882,37 @@ async def generate_notes_endpoint(project_name: str, req: NotesRequest, request:
     topic_key = req.topic.lower().strip()
     cache = data["projects"][project_name]["cache"]
 
+    cache_event("notes", topic_key in cache["notes"])
     if topic_key in cache["notes"]:
-        print(f"⚡ [CACHE] Returning cached notes for topic: '{topic_key}'")
+        log.info(f"⚡ [CACHE] Returning cached notes for topic: '{topic_key}'")
+        annotate(cache="notes")
         cached = cache["notes"][topic_key]
         return StreamingResponse(iter([cached]), media_type="text/plain")
 
+    require_llm()
+
     async def stream_generator():
         full_response = []
-        with llm_lock:
+        async with scheduler.interactive():
             for chunk in generate_notes(llm, req.topic):
                 if await request.is_disconnected():
-                    print("🛑 [NOTES] Client disconnected, aborting generation.")
+                    log.info("🛑 [NOTES] Client disconnected, aborting generation.")
                     break
                 text = chunk["choices"][0].get("text", "")
                 if text:
                     full_response.append(text)
                     yield text
-        result = load_projects_data() # Reload to avoid race conditions
-        result["projects"][project_name]["cache"]["notes"][topic_key] = "".join(full_response)
-        save_projects_data(result)
-        print(f"💾 [CACHE] Saved notes for topic: '{topic_key}'")
+        with update_projects_data() as result: # Reload to avoid race conditions
+            if project_name in result["projects"]:
+                result["projects"][project_name]["cache"]["notes"][topic_key] = "".join(full_response)
+        log.info(f"💾 [CACHE] Saved notes for topic: '{topic_key}'")
 
     return StreamingResponse(stream_generator(), media_type="text/plain")
 
 @app.get("/projects/{project_name}/topics")
 async def extract_topics_endpoint(project_name: str, request: Request, check_cached: bool = False):
     """Extracts key topics from the project memory. Caches result per project."""
-    print(f"\n📥 [REQUEST] GET /projects/{project_name}/topics | Check Cached: {check_cached}")
-    if not llm:
-        print("❌ [ERROR] LLM is not loaded.")
-        raise HTTPException(status_code=500, detail="LLM is not loaded.")
+    log.info(f"\n📥 [REQUEST] GET /projects/{project_name}/topics | Check Cached: {check_cached}")
     data = load_projects_data()
     if project_name not in data["projects"]:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -625,27 +921,37 @@ async def extract_topics_endpoint(project_name: str, request: Request, check_cac
 
     if check_cached:
         if cache["topics"] is not None:
-            print(f"⚡ [CACHE] Returning cached topics for project: '{project_name}'")
+            log.info(f"⚡ [CACHE] Returning cached topics for project: '{project_name}'")
             return StreamingResponse(iter([cache["topics"]]), media_type="application/json")
         else:
-            print(f"⏭️ [CACHE] No cached topics found for '{project_name}', returning empty list as check_cached=True")
+            log.info(f"⏭️ [CACHE] No cached topics found for '{project_name}', returning empty list as check_cached=True")
             return StreamingResponse(iter(["[]"]), media_type="application/json")
 
+    require_llm()
+
     async def stream_generator():
         full_response = []
-        with llm_lock:
-            for chunk in generate_topics(llm):
+        async with scheduler.interactive():
+            # Reduce over the section summaries pregen has written so far (none yet: raw chunks). Summarizing the
+            # missing sections here would hold the LLM for minutes before the first byte; pregen fills them in.
+            complete = next_missing(project_name) is None
+            section_summaries = await asyncio.to_thread(reduce_inputs, llm, project_name)
+            for chunk in generate_topics(llm, section_summaries=section_summaries):
                 if await request.is_disconnected():
-                    print("🛑 [TOPICS] Client disconnected, aborting generation.")
+                    log.info("🛑 [TOPICS] Client disconnected, aborting generation.")
                     break
                 text = chunk["choices"][0].get("text", "")
                 if text:
                     full_response.append(text)
                     yield text
-        result = load_projects_data()
-        result["projects"][project_name]["cache"]["topics"] = "".join(full_response)
-        save_projects_data(result)
-        print(f"💾 [CACHE] Saved topics for project: '{project_name}'")
+        if not complete:
+            # Partial coverage: the next request (and pregen, for topics) redoes it with every section
+            log.info(f"⏭️ [CACHE] Not caching topics for '{project_name}': some sections are not summarized yet.")
+            return
+        with update_projects_data() as result:
+            if project_name in result["projects"]:
+                result["projects"][project_name]["cache"]["topics"] = "".join(full_response)
+        log.info(f"💾 [CACHE] Saved topics for project: '{project_name}'")
 
     return StreamingResponse(stream_generator(), media_type="application/json")
 
@@ -654,87 +960,135 @@ async def extract_topics_endpoint(project_name: str, request: Request, check_cac
 async def generate_summary_endpoint(project_name: str, request: Request):
     """Generates a summary for all uploaded documents in a project. Caches the result."""
     from rag_core import generate_summary
-    print(f"\n📥 [REQUEST] POST /projects/{project_name}/summary")
-    if not llm:
-        print("❌ [ERROR] LLM is not loaded.")
-        raise HTTPException(status_code=500, detail="LLM is not loaded.")
+    log.info(f"\n📥 [REQUEST] POST /projects/{project_name}/summary")
     data = load_projects_data()
     if project_name not in data["projects"]:
         raise HTTPException(status_code=404, detail="Project not found")
 
     cache = data["projects"][project_name]["cache"]
 
+    cache_event("summary", bool(cache.get("summary")))
     if cache.get("summary"):
-        print(f"⚡ [CACHE] Returning cached summary for project: '{project_name}'")
+        log.info(f"⚡ [CACHE] Returning cached summary for project: '{project_name}'")
+        annotate(cache="summary")
         cached = cache["summary"]
         return StreamingResponse(iter([cached]), media_type="text/plain")
 
+    require_llm()
+
     async def stream_generator():
         full_response = []
-        with llm_lock:
-            for chunk in generate_summary(llm):
+        async with scheduler.interactive():
+            # Reduce over the section summaries pregen has written so far (none yet: raw chunks). Summarizing the
+            # missing sections here would hold the LLM for minutes before the first byte; pregen fills them in.
+            complete = next_missing(project_name) is None
+            section_summaries = await asyncio.to_thread(reduce_inputs, llm, project_name)
+            for chunk in generate_summary(llm, section_summaries=section_summaries):
                 if await request.is_disconnected():
-                    print("🛑 [SUMMARY] Client disconnected, aborting generation.")
+                    log.info("🛑 [SUMMARY] Client disconnected, aborting generation.")
                     break
                 text = chunk["choices"][0].get("text", "")
                 if text:
                     full_response.append(text)
                     yield text
-        result = load_projects_data()
-        result["projects"][project_name]["cache"]["summary"] = "".join(full_response)
-        save_projects_data(result)
-        print(f"💾 [CACHE] Saved summary for project: '{project_name}'")
+        if not complete:
+            # Partial coverage: the next request (and pregen, for topics) redoes it with every section
+            log.info(f"⏭️ [CACHE] Not caching summary for '{project_name}': some sections are not summarized yet.")
+            return
+        with update_projects_data() as result:
+            if project_name in result["projects"]:
+                result["projects"][project_name]["cache"]["summary"] = "".join(full_response)
+        log.info(f"💾 [CACHE] Saved summary for project: '{project_name}'")
 
     return StreamingResponse(stream_generator(), media_type="text/plain")
 
+@app.get("/projects/{project_name}/pregen")
+async def get_pregen_status(project_name: str):
+    """Returns the background pre-generation targets and how full each topic's caches are."""
+    data = load_projects_data()
+    if project_name not in data["projects"]:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    project = data["projects"][project_name]
+    cache = project["cache"]
+    pools = {}
+    for topic in parse_topics(cache.get("topics")):
+        key = topic.lower().strip()
+        pool = cache["quizzes"].get(key, [])
+        pools[key] = {
+            "quiz": len(pool) if isinstance(pool, list) else 0,
+            "flashcards": key in cache["flashcards"],
+            "notes": key in cache["notes"],
+        }
+    return {
+        "project": project_name,
+        "active": project_name == active_project,
+        "config": get_pregen_config(project),
+        "pools": pools,
+        "scheduler": scheduler.status(),
+    }
+
+@app.post("/projects/{project_name}/pregen")
+async def update_pregen_config(project_name: str, req: PregenConfigRequest):
+    """Updates the per-project pool targets used by the background pre-generation scheduler."""
+    with update_projects_data() as data:
+        if project_name not in data["projects"]:
+            raise HTTPException(status_code=404, detail="Project not found")
+        data["projects"][project_name]["pregen"] = req.model_dump()
+    return {"message": "Pre-generation settings saved.", "config": data["projects"][project_name]["pregen"]}
+
 @app.post("/projects/{project_name}/results")
 async def save_project_results(project_name: str, req: ResultSaveRequest):
-    """Saves a quiz result to the project's history."""
+    """Appends a quiz result to the project's history log and updates the mastery aggregate incrementally."""
     data = load_projects_data()
     if project_name not in data["projects"]:
         raise HTTPException(status_code=404, detail="Project not found")
-        
-    if "results" not in data["projects"][project_name]:
-        data["projects"][project_name]["results"] = []
-        
-    data["projects"][project_name]["results"].append(req.result)
-    
-    # Update Mastery Stats
-    if "breakdown" in req.result:
-        mastery = data["projects"][project_name].setdefault("mastery", {})
-        time_spent = req.result.get("time_spent", 0)
-        total_questions = req.result.get("total", 0)
-
-        for topic, stats in req.result["breakdown"].items():
-            if topic == "all": continue
-            
-            # Attribute time proportionally to number of questions per topic in multi-topic sessions
-            topic_time = (stats["total"] / total_questions) * time_spent if total_questions > 0 else 0
-            
-            t_data = mastery.setdefault(topic, {
-                "attempted": 0, "correct": 0, "accuracy": 0, 
-                "total_time": 0, "avg_speed": 0, "last_attempt": None
-            })
-            
-            t_data["attempted"] += stats["total"]
-            t_data["correct"] += stats["correct"]
-            t_data["accuracy"] = round((t_data["correct"] / t_data["attempted"]) * 100)
-            
-            # Update total time and speed (Questions per Minute)
-            t_data["total_time"] = round(t_data.get("total_time", 0) + topic_time)
-            if t_data["total_time"] > 0:
-                # Questions Per Minute calculation
-                current_speed = round((t_data["attempted"] / t_data["total_time"]) * 60, 1)
-                t_data["avg_speed"] = current_speed
-                
-                # Track best speed (peak performance)
-                t_data["best_speed"] = max(t_data.get("best_speed", 0), current_speed)
-                
-            t_data["last_attempt"] = datetime.datetime.now().isoformat()
-            
-    save_projects_data(data)
+
+    entry = {**req.result, "saved_at": datetime.datetime.now().isoformat()}
+    with span("persist", target="results"):
+        append_result(project_name, entry)
+        record_rollups(project_name, entry)
+
+    with update_projects_data() as data:
+        # Update Mastery Stats
+        project = data["projects"][project_name]
+        apply_result(project.setdefault("mastery", {}), req.result)
+
+        # Per-question spaced-repetition history for the adaptive sampler
+        record_attempts(project_name, project, req.result.get("questions", []))
     return {"message": "Result saved successfully"}
 
+@app.get("/projects/{project_name}/results")
+async def get_project_results(project_name: str, limit: int = 50):
+    """Returns the most recent quiz results from the project's history log."""
+    data = load_projects_data()
+    if project_name not in data["projects"]:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return {"project": project_name, "results": read_results(project_name, limit=limit if limit > 0 else None)}
+
+@app.get("/projects/{project_name}/analytics")
+async def get_project_analytics(
+    project_name: str,
+    start: str | None = Query(None, alias="from"),
+    end: str | None = Query(None, alias="to"),
+    bucket: str = "day",
+):
+    """Returns per-topic accuracy/speed trends from the pre-bucketed daily or weekly rollups."""
+    data = load_projects_data()
+    if project_name not in data["projects"]:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of: {', '.join(BUCKETS)}")
+    for value in (start, end):
+        if value:
+            try:
+                datetime.date.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected YYYY-MM-DD")
+
+    rollup = query_rollups(project_name, bucket, start, end)
+    return {"project": project_name, "bucket": bucket, "from": start, "to": end, **rollup}
+
 @app.get("/projects/{project_name}/mastery")
 async def get_project_mastery(project_name: str):
     """Returns the mastered topics and accuracy for the heatmap."""
@@ -759,6 +1113,10 @@ async def get_project_mastery(project_name: str):
         }
         
     return {"project": project_name, "mastery": enriched}
+# Time spent importing this module (FastAPI, numpy, project modules), reported on /health.
+# For a per-module breakdown run: python -X importtime server.py 2> importtime.log
+boot.record("server_import", time.perf_counter() - _import_started)
+
 # Optional: Run directly with `python server.py`
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,92 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from logs import get_logger
+
+log = get_logger("boot")
+
+PENDING, LOADING, READY, FAILED, SKIPPED = "pending", "loading", "ready", "failed", "skipped"
+
+
+class StartupOrchestrator:
+    """
+    Boots the heavy components (LLM, embedder, translator, vector DB) concurrently in background
+    threads so the server can accept requests immediately, and records per-component readiness
+    and per-phase timings (import vs. load) for the /health endpoint.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._components = {}
+        self._events = {}
+
+    def _update(self, name, **fields):
+        with self._lock:
+            self._components.setdefault(name, {"state": PENDING, "seconds": None, "phases": {}, "error": None}).update(fields)
+
+    def start(self, loaders: dict):
+        """Runs each loader in its own daemon thread. A loader returning False marks its component skipped."""
+        for name in loaders:
+            self._update(name, state=PENDING)
+            self._events[name] = threading.Event()
+        for name, loader in loaders.items():
+            threading.Thread(target=self._run, args=(name, loader), name=f"boot-{name}", daemon=True).start()
+
+    def _run(self, name, loader):
+        self._update(name, state=LOADING)
+        t0 = time.perf_counter()
+        try:
+            ok = loader()
+            state = SKIPPED if ok is False else READY
+            self._update(name, state=state, seconds=round(time.perf_counter() - t0, 2))
+            log.info(f"{'⏭️' if state == SKIPPED else '✅'} [BOOT] {name} {state} in {time.perf_counter() - t0:.1f}s")
+        except Exception as e:
+            self._update(name, state=FAILED, seconds=round(time.perf_counter() - t0, 2), error=str(e))
+            log.warning(f"⚠️ [BOOT] {name} failed to load: {e}")
+        finally:
+            self._events[name].set()
+
+    def record(self, name, seconds):
+        """Records an already-finished step (e.g. module import time) as a ready component."""
+        self._update(name, state=READY, seconds=round(seconds, 2))
+
+    @contextmanager
+    def phase(self, name, phase):
+        """Times one phase of a component's boot, e.g. `with boot.phase("llm", "import"): ...`."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._components[name]["phases"][phase] = round(time.perf_counter() - t0, 3)
+
+    def state(self, name) -> str:
+        return self._components.get(name, {}).get("state", PENDING)
+
+    def is_ready(self, name) -> bool:
+        return self.state(name) == READY
+
+    def is_loading(self, name) -> bool:
+        return self.state(name) in (PENDING, LOADING)
+
+    def wait(self, name, timeout=None) -> bool:
+        event = self._events.get(name)
+        return event.wait(timeout) if event else False
+
+    def status(self) -> dict:
+        with self._lock:
+            components = {name: dict(c, phases=dict(c["phases"])) for name, c in self._components.items()}
+        states = [c["state"] for c in components.values()]
+        if any(s in (PENDING, LOADING) for s in states):
+            overall = "starting"
+        elif any(s == FAILED for s in states):
+            overall = "degraded"
+        else:
+            overall = "ready"
+        return {
+            "status": overall,
+            "uptime": round(time.monotonic() - self.started_at, 1),
+            "components": components,
+        }
@@ -0,0 +1,270 @@
+"""
+Request-level tracing and hot-path timing.
+
+Every HTTP request gets a trace (TracingMiddleware). Code on the hot path opens spans with `span("embed")`;
+a span is attached to the current request's trace if there is one (background pregen work has none) and is
+always folded into a per-name latency histogram. LLM streams are wrapped with `traced_tokens` for the
+prompt_eval / first_token / decode spans and tokens/sec.
+
+A sample of finished traces (LETSLEARN_TRACE_SAMPLE, default 0.1) is kept in memory for /metrics/traces,
+dumped to traces/ on demand, and appended to LETSLEARN_TRACE_FILE if that is set.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import datetime
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+SAMPLE_RATE = float(os.environ.get("LETSLEARN_TRACE_SAMPLE", "0.1"))
+TRACE_FILE = os.environ.get("LETSLEARN_TRACE_FILE")
+TRACES_DIR = "traces"
+MAX_SAMPLED = 200
+# Histogram bucket upper bounds in milliseconds (the last bucket is open-ended)
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+TPS_BUCKETS = [1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200]
+
+_current = contextvars.ContextVar("letslearn_trace", default=None)
+_lock = threading.Lock()
+_started = time.monotonic()
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.bounds) and value > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (the max for the open-ended bucket)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return self.bounds[i] if i < len(self.bounds) else round(self.max, 1)
+        return round(self.max, 1)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 1) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 1),
+            "buckets": {(f"le_{b}" if i < len(self.bounds) else "inf"): c
+                        for i, (b, c) in enumerate(zip(self.bounds + [None], self.counts))},
+        }
+
+
+_span_histograms = {}   # span name -> Histogram (ms)
+_route_histograms = {}  # "METHOD /route" -> Histogram (ms)
+_route_errors = {}
+_tokens_per_second = Histogram(TPS_BUCKETS)
+_cache_events = {}      # cache name -> [hits, misses]
+_sampled = deque(maxlen=MAX_SAMPLED)
+_in_flight = 0
+
+
+class Trace:
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = datetime.datetime.now().isoformat()
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self.attrs = {}
+        self.finished = False
+
+    def add(self, name, start, seconds, attrs=None):
+        span = {"name": name, "start_ms": round((start - self.t0) * 1000, 2), "ms": round(seconds * 1000, 2)}
+        if attrs:
+            span["attrs"] = attrs
+        self.spans.append(span)
+
+    def to_dict(self, status, total_ms) -> dict:
+        return {"id": self.id, "name": self.name, "started_at": self.started_at, "status": status,
+                "ms": round(total_ms, 2), "attrs": self.attrs, "spans": self.spans}
+
+
+def current_trace():
+    return _current.get()
+
+
+def record_span(name, start, seconds, **attrs):
+    """Records an already-timed span (perf_counter `start`, duration in seconds)."""
+    with _lock:
+        _span_histograms.setdefault(name, Histogram(BUCKETS_MS)).observe(seconds * 1000)
+    trace = _current.get()
+    if trace is not None and not trace.finished:
+        trace.add(name, start, seconds, attrs)
+
+
+@contextmanager
+def span(name, **attrs):
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record_span(name, start, time.perf_counter() - start, **attrs)
+
+
+def annotate(**attrs):
+    """Adds attributes to the current request's trace (e.g. which cache served it)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def cache_event(cache, hit: bool):
+    with _lock:
+        events = _cache_events.setdefault(cache, [0, 0])
+        events[0 if hit else 1] += 1
+
+
+def traced_tokens(stream):
+    """
+    Wraps an LLM completion stream. The first chunk marks the end of prompt eval (prompt_eval: from the
+    first pull; first_token: from the request start); the rest is decode, reported as tokens/sec.
+    """
+    start = time.perf_counter()
+    first = last = None
+    n = 0
+    try:
+        for chunk in stream:
+            now = time.perf_counter()
+            if first is None:
+                first = now
+                record_span("prompt_eval", start, first - start)
+                trace = _current.get()
+                if trace is not None:
+                    record_span("first_token", trace.t0, first - trace.t0)
+            last = now
+            n += 1
+            yield chunk
+    finally:
+        if first is not None and last is not None and n > 1:
+            decode = last - first
+            tps = (n - 1) / decode if decode > 0 else None
+            record_span("decode", first, decode, tokens=n, tokens_per_second=round(tps, 1) if tps else None)
+            if tps:
+                with _lock:
+                    _tokens_per_second.observe(tps)
+
+
+# ---- Request lifecycle ----
+
+def _finish(trace, route, status):
+    if trace.finished:
+        return
+    trace.finished = True
+    total_ms = (time.perf_counter() - trace.t0) * 1000
+    key = f"{trace.name.split(' ')[0]} {route}"
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+        _route_histograms.setdefault(key, Histogram(BUCKETS_MS)).observe(total_ms)
+        if status >= 500:
+            _route_errors[key] = _route_errors.get(key, 0) + 1
+    if random.random() < SAMPLE_RATE:
+        record = trace.to_dict(status, total_ms)
+        record["route"] = route
+        with _lock:
+            _sampled.append(record)
+        if TRACE_FILE:
+            _append_jsonl(TRACE_FILE, [record])
+
+
+class TracingMiddleware:
+    """ASGI middleware that opens a trace per HTTP request and closes it after the last body chunk (streams included)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        global _in_flight
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        with _lock:
+            _in_flight += 1
+        token = _current.set(trace)
+        status = 500
+
+        def route():
+            r = scope.get("route")
+            return getattr(r, "path", None) or scope["path"]
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                _finish(trace, route(), status)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _finish(trace, route(), status)
+            _current.reset(token)
+
+
+# ---- Export ----
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "uptime": round(time.monotonic() - _started, 1),
+            "requests": {
+                "in_flight": _in_flight,
+                "routes": {k: {**h.snapshot(), "errors": _route_errors.get(k, 0)} for k, h in sorted(_route_histograms.items())},
+            },
+            "spans_ms": {k: h.snapshot() for k, h in sorted(_span_histograms.items())},
+            "tokens_per_second": _tokens_per_second.snapshot(),
+            "caches": {
+                name: {"hits": h, "misses": m, "hit_rate": round(h / (h + m), 3) if h + m else 0.0}
+                for name, (h, m) in sorted(_cache_events.items())
+            },
+            "traces": {"sample_rate": SAMPLE_RATE, "sampled": len(_sampled), "file": TRACE_FILE},
+        }
+
+
+def sampled_traces(limit=None) -> list:
+    with _lock:
+        traces = list(_sampled)
+    return traces[-limit:] if limit else traces
+
+
+def _append_jsonl(path, records):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def dump_traces(path=None) -> dict:
+    """Writes the sampled traces held in memory to a JSONL file (default: traces/traces_<timestamp>.jsonl)."""
+    traces = sampled_traces()
+    path = path or os.path.join(TRACES_DIR, f"traces_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    _append_jsonl(path, traces)
+    return {"path": path, "traces": len(traces)}
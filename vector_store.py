@@ -0,0 +1,386 @@
+"""
+In-process vector store, an alternative to Chroma for large projects (LETSLEARN_VECTOR_STORE=numpy).
+
+NumpyVectorStore implements the part of the Chroma collection API that rag_core uses (add / query / get / count),
+so add_docs, retrieve and clear_db work unchanged. Normalized bge vectors are stored as int8 (plus one float32
+scale per row) or float16 (LETSLEARN_VECTOR_DTYPE) in flat files that are memory-mapped on open. Opening a store
+only reads meta.json; the OS pages vectors in as queries touch them. Chunk texts and metadata live in a JSONL
+file with a memory-mapped offset table, so only the rows a query returns are ever read.
+
+Search is brute force in blocks, or IVF (LETSLEARN_VECTOR_INDEX=auto|flat|ivf; auto switches at IVF_MIN_ROWS).
+IVF partitions the rows with spherical k-means; a query scans the NPROBE closest lists plus any rows added since
+the last build.
+
+    python vector_store.py bench --sizes 10000,100000 --queries 200    # recall / latency against Chroma
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+import threading
+
+import numpy as np
+
+from logs import get_logger
+
+log = get_logger("vector_store")
+
+VECTOR_DTYPE = os.environ.get("LETSLEARN_VECTOR_DTYPE", "int8")
+VECTOR_INDEX = os.environ.get("LETSLEARN_VECTOR_INDEX", "auto")
+# Below this a full scan is a few milliseconds and IVF only costs recall
+IVF_MIN_ROWS = 50000
+# IVF is rebuilt once rows added after the last build exceed this share of the store
+IVF_REBUILD_FRACTION = 0.2
+IVF_NPROBE = int(os.environ.get("LETSLEARN_VECTOR_NPROBE", "0"))  # 0: nlist / 32, at least 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+# Rows per matmul block, so int8/float16 rows are widened to float32 a slice at a time
+SCAN_BLOCK = 65536
+STORE_VERSION = 1
+DTYPES = {"int8": np.int8, "float16": np.float16}
+
+
+def quantize(vectors: np.ndarray, dtype: str):
+    """(rows in `dtype`, per-row float32 scales or None). int8 scales each row by its largest component."""
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    raise ValueError(f"Unsupported vector dtype '{dtype}' (use int8 or float16)")
+
+
+class NumpyVectorStore:
+    def __init__(self, path: str, dtype: str | None = None, index: str | None = None):
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        meta = self._read_meta()
+        self.dtype = meta.get("dtype", dtype or VECTOR_DTYPE)
+        if self.dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype '{self.dtype}' (use int8 or float16)")
+        self.dim = meta.get("dim")
+        self._count = meta.get("count", 0)
+        self._docs_bytes = meta.get("docs_bytes", 0)
+        self._ivf_meta = meta.get("ivf")
+        self.index = index or VECTOR_INDEX
+        self._ivf = None
+        self._remap()
+
+    # ---- Files ----
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if meta.get("version") != STORE_VERSION:
+            log.info(f"🔁 [VECTORS] Store format changed, starting over: {self.path}")
+            return {}
+        return meta
+
+    def _write_meta(self):
+        meta = {"version": STORE_VERSION, "dtype": self.dtype, "dim": self.dim, "count": self._count,
+                "docs_bytes": self._docs_bytes, "ivf": self._ivf_meta}
+        tmp_path = self._file("meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._file("meta.json"))
+
+    def _remap(self):
+        self._vectors = self._scales = self._offsets = None
+        if not self._count:
+            return
+        self._vectors = np.memmap(self._file("vectors.bin"), dtype=DTYPES[self.dtype], mode="r", shape=(self._count, self.dim))
+        self._offsets = np.memmap(self._file("offsets.bin"), dtype=np.int64, mode="r", shape=(self._count,))
+        if self.dtype == "int8":
+            self._scales = np.memmap(self._file("scales.bin"), dtype=np.float32, mode="r", shape=(self._count,))
+
+    def _append(self, name, data: bytes, expected_size: int):
+        # Drop whatever a crashed add() left past the last committed row before appending
+        path = self._file(name)
+        with open(path, "ab") as f:
+            if f.seek(0, os.SEEK_END) != expected_size:
+                f.truncate(expected_size)
+            f.write(data)
+
+    # ---- Chroma collection API ----
+
+    def count(self) -> int:
+        return self._count
+
+    def add(self, documents, embeddings, metadatas=None, ids=None):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(documents):
+            raise ValueError("embeddings must be one vector per document")
+        metadatas = metadatas or [{}] * len(documents)
+        ids = ids or [f"doc_{self._count + i}" for i in range(len(documents))]
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store ({self.dim})")
+            rows, scales = quantize(vectors, self.dtype)
+            item_size = np.dtype(DTYPES[self.dtype]).itemsize
+
+            lines, offsets, position = [], [], self._docs_bytes
+            for doc_id, text, meta in zip(ids, documents, metadatas):
+                line = json.dumps({"id": doc_id, "document": text, "metadata": meta or {}}, ensure_ascii=False).encode("utf-8") + b"\n"
+                offsets.append(position)
+                lines.append(line)
+                position += len(line)
+
+            self._append("vectors.bin", rows.tobytes(), self._count * self.dim * item_size)
+            if scales is not None:
+                self._append("scales.bin", scales.tobytes(), self._count * 4)
+            self._append("offsets.bin", np.asarray(offsets, dtype=np.int64).tobytes(), self._count * 8)
+            self._append("docs.jsonl", b"".join(lines), self._docs_bytes)
+            # meta.json is the commit point: rows past its count are ignored and overwritten
+            self._count += len(documents)
+            self._docs_bytes = position
+            self._write_meta()
+            self._remap()
+            if self._wants_ivf_build():
+                self.build_ivf()
+
+    def query(self, query_embeddings, n_results=10, include=("documents", "metadatas", "distances"), **kwargs):
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for q in np.asarray(query_embeddings, dtype=np.float32):
+            rows, scores = self.search(q, n_results)
+            records = [self._read_row(r) for r in rows]
+            result["ids"].append([r["id"] for r in records])
+            result["documents"].append([r["document"] for r in records])
+            result["metadatas"].append([r["metadata"] for r in records])
+            result["distances"].append([float(1 - s) for s in scores])
+        return result
+
+    def get(self, limit=None, include=("documents", "metadatas"), **kwargs):
+        n = self._count if limit is None else min(limit, self._count)
+        records = [self._read_row(r) for r in range(n)]
+        return {"ids": [r["id"] for r in records], "documents": [r["document"] for r in records],
+                "metadatas": [r["metadata"] for r in records]}
+
+    def reset(self):
+        """Deletes every row (clear_db)."""
+        with self._lock:
+            self._vectors = self._scales = self._offsets = None
+            self._ivf = None
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.makedirs(self.path, exist_ok=True)
+            self.dim = None
+            self._count = 0
+            self._docs_bytes = 0
+            self._ivf_meta = None
+        return self
+
+    def _read_row(self, row) -> dict:
+        start = int(self._offsets[row])
+        end = int(self._offsets[row + 1]) if row + 1 < self._count else self._docs_bytes
+        with open(self._file("docs.jsonl"), "rb") as f:
+            f.seek(start)
+            return json.loads(f.read(end - start))
+
+    # ---- Search ----
+
+    def _scores(self, q, rows=None):
+        """Cosine similarity of `q` to the given rows (default: all), widening a block at a time."""
+        if rows is not None:
+            scores = self._vectors[rows].astype(np.float32) @ q
+            return scores * self._scales[rows] if self._scales is not None else scores
+        scores = np.empty(self._count, dtype=np.float32)
+        for start in range(0, self._count, SCAN_BLOCK):
+            end = min(start + SCAN_BLOCK, self._count)
+            scores[start:end] = self._vectors[start:end].astype(np.float32) @ q
+            if self._scales is not None:
+                scores[start:end] *= self._scales[start:end]
+        return scores
+
+    def search(self, q, k):
+        """(row numbers, similarities) of the top-k rows, best first."""
+        with self._lock:
+            if not self._count:
+                return [], []
+            rows = self._ivf_candidates(q) if self._ivf_meta and self.index != "flat" else None
+            scores = self._scores(q, rows)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return (rows[top] if rows is not None else top).tolist(), scores[top].tolist()
+
+    # ---- IVF ----
+
+    def _wants_ivf_build(self) -> bool:
+        if self.index == "flat" or (self.index == "auto" and self._count < IVF_MIN_ROWS):
+            return False
+        if not self._ivf_meta:
+            return True
+        return self._count - self._ivf_meta["rows"] > IVF_REBUILD_FRACTION * self._ivf_meta["rows"]
+
+    def _load_ivf(self):
+        if self._ivf is None:
+            self._ivf = (np.load(self._file("ivf_centroids.npy")),
+                         np.load(self._file("ivf_order.npy"), mmap_mode="r"),
+                         np.load(self._file("ivf_bounds.npy")))
+        return self._ivf
+
+    def _ivf_candidates(self, q):
+        centroids, order, bounds = self._load_ivf()
+        nprobe = min(len(centroids), IVF_NPROBE or max(8, len(centroids) // 32))
+        lists = np.argpartition(-(centroids @ q), nprobe - 1)[:nprobe]
+        parts = [order[bounds[l]:bounds[l + 1]] for l in lists]
+        # Rows added since the build aren't in any list yet
+        parts.append(np.arange(self._ivf_meta["rows"], self._count))
+        return np.concatenate(parts)
+
+    def _dequantize(self, rows):
+        vectors = self._vectors[rows].astype(np.float32)
+        return vectors * self._scales[rows][:, None] if self._scales is not None else vectors
+
+    def build_ivf(self, nlist=None, seed=0):
+        """Spherical k-means over a sample, then assigns every row to its closest centroid."""
+        with self._lock:
+            n = self._count
+            nlist = nlist or int(np.clip(round(np.sqrt(n)), 16, 4096))
+            if n < nlist * 4:
+                return
+            t0 = time.perf_counter()
+            rng = np.random.default_rng(seed)
+            sample = self._dequantize(np.sort(rng.choice(n, size=min(n, nlist * KMEANS_SAMPLE_PER_LIST), replace=False)))
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(KMEANS_ITERATIONS):
+                assign = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, sample)
+                empty = np.bincount(assign, minlength=nlist) == 0
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+                centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+
+            assign = np.empty(n, dtype=np.int32)
+            for start in range(0, n, SCAN_BLOCK):
+                end = min(start + SCAN_BLOCK, n)
+                assign[start:end] = np.argmax(self._dequantize(np.arange(start, end)) @ centroids.T, axis=1)
+            order = np.argsort(assign, kind="stable").astype(np.int64)
+            bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+
+            np.save(self._file("ivf_centroids.npy"), centroids.astype(np.float32))
+            np.save(self._file("ivf_order.npy"), order)
+            np.save(self._file("ivf_bounds.npy"), bounds)
+            self._ivf = None
+            self._ivf_meta = {"rows": n, "nlist": nlist}
+            self._write_meta()
+        log.info(f"🗂️ [VECTORS] Built IVF index: {n} rows in {nlist} lists ({time.perf_counter() - t0:.1f}s)")
+
+    def disk_bytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.path, f)) for f in os.listdir(self.path))
+
+
+# ---- Benchmark: recall / latency against Chroma ----
+
+def _clustered_vectors(rng, n, dim, centers, noise=0.35):
+    """Normalized vectors around random topic centres, a rough stand-in for bge embeddings of one corpus."""
+    picks = rng.integers(0, len(centers), size=n)
+    vectors = centers[picks] + rng.normal(0.0, noise / np.sqrt(dim), size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def bench(argv=None):
+    parser = argparse.ArgumentParser(prog="vector_store.py bench", description="Compare the NumPy vector store with Chroma.")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated corpus sizes (vectors)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=384, help="Vector size (bge-small is 384)")
+    parser.add_argument("--clusters", type=int, default=500, help="Topic centres the synthetic vectors are drawn around")
+    parser.add_argument("--configs", default="chroma,flat-float16,flat-int8,ivf-int8")
+    parser.add_argument("--out", default=None, help="JSON output path (default: bench_results/vector_store_<timestamp>.json)")
+    args = parser.parse_args(argv)
+    from bench import percentile
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    configs = [c.strip() for c in args.configs.split(",") if c.strip()]
+    report = {"created_at": datetime.datetime.now().isoformat(), "dim": args.dim, "k": args.k,
+              "queries": args.queries, "sizes": {}}
+
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        vectors = _clustered_vectors(rng, size, args.dim, centers)
+        # Queries are perturbed corpus vectors; ground truth is an exact float32 scan
+        queries = _clustered_vectors(rng, args.queries, args.dim, vectors[rng.integers(0, size, size=args.queries)], noise=0.5)
+        truth = [set(np.argsort(-(vectors @ q))[:args.k].tolist()) for q in queries]
+        ids = [f"doc_{i}" for i in range(size)]
+        documents = [f"chunk {i}" for i in range(size)]
+        metadatas = [{"source": "bench", "chunk": i} for i in range(size)]
+        results = {}
+        for config in configs:
+            path = tempfile.mkdtemp(prefix="vector_bench_")
+            t0 = time.perf_counter()
+            if config == "chroma":
+                import chromadb
+                client = chromadb.PersistentClient(path=path)
+                collection = client.get_or_create_collection("bench")
+                batch = min(5000, client.get_max_batch_size())
+            else:
+                index, dtype = config.split("-")
+                collection = NumpyVectorStore(path, dtype=dtype, index=index)
+                batch = 50000
+            for start in range(0, size, batch):
+                end = min(start + batch, size)
+                collection.add(documents=documents[start:end], embeddings=vectors[start:end].tolist(),
+                               metadatas=metadatas[start:end], ids=ids[start:end])
+            build_s = time.perf_counter() - t0
+
+            # Cold start: a fresh handle on the files just written, up to its first answer
+            t0 = time.perf_counter()
+            if config == "chroma":
+                collection = chromadb.PersistentClient(path=path).get_collection("bench")
+            else:
+                collection = NumpyVectorStore(path, index=index)
+            collection.query(query_embeddings=[queries[0].tolist()], n_results=args.k)
+            cold_ms = (time.perf_counter() - t0) * 1000
+
+            latencies, hits = [], 0
+            for q, expected in zip(queries, truth):
+                t0 = time.perf_counter()
+                res = collection.query(query_embeddings=[q.tolist()], n_results=args.k)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                hits += len(expected & {int(i.split("_")[-1]) for i in res["ids"][0]})
+            results[config] = {
+                "recall_at_k": round(hits / (args.k * len(queries)), 4),
+                "latency_ms": {"p50": round(percentile(latencies, 50), 3), "p95": round(percentile(latencies, 95), 3),
+                               "p99": round(percentile(latencies, 99), 3)},
+                "cold_start_ms": round(cold_ms, 1),
+                "build_s": round(build_s, 2),
+                "disk_mb": round(_dir_bytes(path) / 1e6, 1),
+            }
+            r = results[config]
+            print(f"📊 [BENCH] {size:>8} {config:<13} recall@{args.k} {r['recall_at_k']:.3f} | p50 {r['latency_ms']['p50']} ms, "
+                  f"p95 {r['latency_ms']['p95']} ms | cold {r['cold_start_ms']} ms | build {r['build_s']}s | {r['disk_mb']} MB")
+            del collection
+            shutil.rmtree(path, ignore_errors=True)
+        report["sizes"][str(size)] = results
+
+    out = args.out or os.path.join("bench_results", f"vector_store_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n💾 [BENCH] Results written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sys.exit(bench(sys.argv[2:]))
+    print("Usage: python vector_store.py bench [--sizes 10000,100000] [--queries 200] [--k 10]")